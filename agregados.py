@@ -0,0 +1,179 @@
+import argparse
+import datetime
+import sys
+
+import perfil
+import sequencias
+
+# Contagens de conclusões já somadas para o painel de estatísticas: total geral
+# e, por dia, semana (ISO) e mês, de todas as tarefas e de cada uma, mais as
+# conclusões de cada tarefa por dia da semana. Atualizadas a cada data que
+# entra ou sai do histórico, sem reler o resto; gravadas junto com o snapshot
+# e conferidas na carga (ver servico.Gestor._recarregar).
+
+# Formato das contagens gravadas; as de outra versão são recontadas na carga
+VERSAO = 2
+
+
+def _chaves(dia):
+    data = datetime.date.fromordinal(dia + sequencias.EPOCA)
+    ano, semana, dia_semana = data.isocalendar()
+    return data.isoformat(), f"{ano}-S{semana:02d}", data.isoformat()[:7], dia_semana - 1
+
+
+def _somar(contagens, chave, quantidade):
+    valor = contagens.get(chave, 0) + quantidade
+    if valor:
+        contagens[chave] = valor
+    else:
+        contagens.pop(chave, None)
+
+
+def _tarefa_vazia():
+    return {"total": 0, "dias": {}, "semanas": {}, "meses": {}, "dias_semana": [0] * 7}
+
+
+class Agregados:
+    def __init__(self, dados=None):
+        dados = dados or {}
+        self.total = dados.get("total", 0)
+        self.dias = dict(dados.get("dias", {}))
+        self.semanas = dict(dados.get("semanas", {}))
+        self.meses = dict(dados.get("meses", {}))
+        self.tarefas = {
+            tarefa_id: {
+                "total": contagens["total"],
+                "dias": dict(contagens.get("dias", {})),
+                "semanas": dict(contagens["semanas"]),
+                "meses": dict(contagens["meses"]),
+                "dias_semana": list(contagens["dias_semana"]),
+            }
+            for tarefa_id, contagens in dados.get("tarefas", {}).items()
+        }
+
+    # Soma (ou, com quantidade=-1, desconta) uma conclusão; dia como "AAAA-MM-DD" ou inteiro
+    def contar(self, tarefa_id, dia, quantidade=1):
+        if isinstance(dia, str):
+            dia = sequencias.dia_para_inteiro(dia)
+        chave_dia, semana, mes, dia_semana = _chaves(dia)
+        self.total += quantidade
+        _somar(self.dias, chave_dia, quantidade)
+        _somar(self.semanas, semana, quantidade)
+        _somar(self.meses, mes, quantidade)
+
+        tarefa = self.tarefas.get(tarefa_id)
+        if tarefa is None:
+            tarefa = self.tarefas[tarefa_id] = _tarefa_vazia()
+        tarefa["total"] += quantidade
+        _somar(tarefa["dias"], chave_dia, quantidade)
+        _somar(tarefa["semanas"], semana, quantidade)
+        _somar(tarefa["meses"], mes, quantidade)
+        tarefa["dias_semana"][dia_semana] += quantidade
+        if not tarefa["total"]:
+            del self.tarefas[tarefa_id]
+
+    def descontar(self, tarefa_id, dia):
+        self.contar(tarefa_id, dia, -1)
+
+    # Recontagem completa, percorrendo todo o histórico
+    @classmethod
+    def de_historico(cls, historico):
+        agregados = cls()
+        with perfil.trecho("recalcular agregados"):
+            for tarefa_id, info in historico.items():
+                datas = info.get("datas", []) if isinstance(info, dict) else info
+                if isinstance(datas, sequencias.Datas):
+                    for inicio, comprimento in datas.intervalos():
+                        for dia in range(inicio, inicio + comprimento):
+                            agregados.contar(tarefa_id, dia)
+                else:
+                    for data in set(datas):
+                        agregados.contar(tarefa_id, data)
+        return agregados
+
+    # Conferência barata na carga: os totais batem com o tamanho das datas
+    # (que no histórico em blocos vem dos resumos, sem ler os segmentos)
+    def confere_totais(self, historico):
+        total = 0
+        for tarefa_id, info in historico.items():
+            quantidade = len(info.get("datas", [])) if isinstance(info, dict) else len(info)
+            if quantidade != self.tarefas.get(tarefa_id, {}).get("total", 0):
+                return False
+            total += quantidade
+        return total == self.total and all(tarefa_id in historico for tarefa_id in self.tarefas)
+
+    def total_da_tarefa(self, tarefa_id):
+        return self.tarefas.get(tarefa_id, {}).get("total", 0)
+
+    # Conclusões da tarefa por dia ("AAAA-MM-DD")
+    def dias_da_tarefa(self, tarefa_id):
+        return self.tarefas.get(tarefa_id, {}).get("dias", {})
+
+    def dias_semana(self, tarefa_id):
+        return self.tarefas.get(tarefa_id, {}).get("dias_semana", [0] * 7)
+
+    def como_dict(self, seq=None):
+        dados = {
+            "versao": VERSAO,
+            "total": self.total,
+            "dias": dict(self.dias),
+            "semanas": dict(self.semanas),
+            "meses": dict(self.meses),
+            "tarefas": {
+                tarefa_id: {
+                    "total": contagens["total"],
+                    "dias": dict(contagens["dias"]),
+                    "semanas": dict(contagens["semanas"]),
+                    "meses": dict(contagens["meses"]),
+                    "dias_semana": list(contagens["dias_semana"]),
+                }
+                for tarefa_id, contagens in self.tarefas.items()
+            },
+        }
+        if seq is not None:
+            dados["seq"] = seq
+        return dados
+
+    # O que difere de outra contagem (ex.: a recontagem completa); vazio = iguais
+    def diferencas(self, outro):
+        diferencas = []
+        if self.total != outro.total:
+            diferencas.append(f"total: {self.total} != {outro.total}")
+        for nome in ("dias", "semanas", "meses"):
+            meus, deles = getattr(self, nome), getattr(outro, nome)
+            for chave in sorted(set(meus) | set(deles)):
+                if meus.get(chave, 0) != deles.get(chave, 0):
+                    diferencas.append(f"{nome}[{chave}]: {meus.get(chave, 0)} != {deles.get(chave, 0)}")
+        for tarefa_id in sorted(set(self.tarefas) | set(outro.tarefas)):
+            minha, dela = self.tarefas.get(tarefa_id, _tarefa_vazia()), outro.tarefas.get(tarefa_id, _tarefa_vazia())
+            for campo in ("total", "dias", "semanas", "meses", "dias_semana"):
+                if minha[campo] != dela[campo]:
+                    diferencas.append(f"tarefas[{tarefa_id}].{campo}: {minha[campo]} != {dela[campo]}")
+        return diferencas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregados de conclusões do Gestor de Tarefas")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser("verificar", help="Compara os agregados mantidos com uma recontagem completa do histórico")
+    subparsers.add_parser("recalcular", help="Recalcula os agregados e grava um novo snapshot")
+    args = parser.parse_args()
+
+    import servico
+
+    gestor = servico.Gestor()
+    gestor.carregar(virar_dia=False)
+    if args.comando == "verificar":
+        diferencas = gestor.agregados.diferencas(Agregados.de_historico(gestor.historico))
+        for diferenca in diferencas:
+            print(diferenca)
+        print(f"{len(diferencas)} diferenças em {gestor.agregados.total} conclusões")
+        sys.exit(1 if diferencas else 0)
+    if args.comando == "recalcular":
+        with gestor.edicao_direta("recalcular_agregados"):
+            pass
+        print(f"{gestor.agregados.total} conclusões recontadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import recorrencia
+import sequencias
+
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+# Tabelas da aba Estatísticas. As que cobrem todo o histórico (dias da semana,
+# curva móvel) saem dos agregados (ver agregados.py): o custo depende do número
+# de tarefas e de dias, não do tamanho do histórico. As taxas de conclusão por
+# tarefa precisam dos dias de cada uma, mas só dos blocos da maior janela.
+
+
+def _hoje(hoje):
+    return np.datetime64(hoje or datetime.date.today(), "D")
+
+
+# Blocos de dias consecutivos das tarefas em colunas (posição da tarefa em
+# tarefa_ids, primeiro e último dia), só os que chegam até desde: os anos
+# anteriores nem são lidos (ver sequencias.Datas.intervalos)
+def _blocos(historico, tarefa_ids, desde):
+    posicoes, inicios, comprimentos = [], [], []
+    for posicao, tarefa_id in enumerate(tarefa_ids):
+        info = historico.get(tarefa_id)
+        datas = info.get("datas", []) if isinstance(info, dict) else info
+        if not datas:
+            continue
+        if not isinstance(datas, sequencias.Datas):
+            datas = sequencias.Datas.de_lista(datas)
+        intervalos = datas.intervalos(desde)
+        posicoes.extend([posicao] * len(intervalos))
+        for inicio, comprimento in intervalos:
+            inicios.append(inicio)
+            comprimentos.append(comprimento)
+    inicios = np.array(inicios, dtype=np.int64)
+    return np.array(posicoes, dtype=np.int64), inicios, inicios + np.array(comprimentos, dtype=np.int64) - 1
+
+
+# Fração das ocorrências previstas nos últimos N dias que cada tarefa
+# concluiu, para cada janela. Nas diárias (sem regra em regras, um dicionário
+# id -> regra), uma passada vetorizada sobre os blocos soma a parte de cada um
+# na janela, sobre N dias; nas demais, como nas sequências (ver recorrencia),
+# só contam as conclusões em dias devidos, sobre as ocorrências da regra na
+# janela. Sem nenhuma ocorrência prevista, a taxa fica NaN.
+def taxa_conclusao(historico, tarefa_ids, janelas=(7, 30, 90), hoje=None, regras=None):
+    hoje = int(_hoje(hoje).astype(np.int64))
+    desde = hoje - max(janelas, default=1) + 1
+    posicoes, inicios, fins = _blocos(historico, tarefa_ids, desde)
+    regras = [(regras or {}).get(tarefa_id) for tarefa_id in tarefa_ids]
+    diarias = np.array([recorrencia.e_diaria(regra) for regra in regras], dtype=bool)
+    bloco_diario = diarias[posicoes]
+
+    # Tarefas com regra: os dias devidos concluídos dentro da maior janela, um a um
+    posicoes_devidas, dias_devidos = [], []
+    for posicao, inicio, fim in zip(posicoes[~bloco_diario], inicios[~bloco_diario], fins[~bloco_diario]):
+        for dia in range(max(int(inicio), desde), min(int(fim), hoje) + 1):
+            if recorrencia.devida(regras[posicao], dia):
+                posicoes_devidas.append(posicao)
+                dias_devidos.append(dia)
+    posicoes_devidas = np.array(posicoes_devidas, dtype=np.int64)
+    dias_devidos = np.array(dias_devidos, dtype=np.int64)
+
+    taxas = pd.DataFrame(index=pd.Index(tarefa_ids, name="tarefa_id"))
+    for janela in janelas:
+        primeiro = hoje - janela + 1
+        na_janela = np.clip(np.minimum(fins, hoje) - np.maximum(inicios, primeiro) + 1, 0, None) * bloco_diario
+        feitas = (np.bincount(posicoes, weights=na_janela, minlength=len(tarefa_ids))
+                  + np.bincount(posicoes_devidas, weights=dias_devidos >= primeiro, minlength=len(tarefa_ids)))
+        previstas = np.array([janela if diaria else recorrencia.contar(regra, primeiro, hoje)
+                              for diaria, regra in zip(diarias, regras)], dtype=np.float64)
+        taxas[f"{janela} dias"] = np.divide(feitas, previstas, out=np.full(len(tarefa_ids), np.nan), where=previstas > 0)
+    return taxas
+
+
+# Conclusões por tarefa e dia da semana
+def mapa_dias_semana(agregados, tarefa_ids):
+    return pd.DataFrame(
+        [agregados.dias_semana(tarefa_id) for tarefa_id in tarefa_ids],
+        index=pd.Index(tarefa_ids, name="tarefa_id"),
+        columns=pd.Index(DIAS_SEMANA, name="Dia da semana"),
+        dtype="int64",
+    )
+
+
+# Conclusões por dia (todas as tarefas) e suas somas móveis de 7 e 30 dias
+def curva_movel(agregados, janelas=(7, 30), hoje=None):
+    if not agregados.dias:
+        return pd.DataFrame(columns=["Conclusões"] + [f"{janela} dias" for janela in janelas])
+
+    por_dia = pd.Series(agregados.dias, dtype="int64")
+    por_dia.index = pd.to_datetime(por_dia.index)
+    por_dia = por_dia.sort_index()
+    periodo = pd.date_range(por_dia.index.min(), max(por_dia.index.max(), pd.Timestamp(_hoje(hoje))), freq="D")
+    por_dia = por_dia.reindex(periodo, fill_value=0)
+
+    curva = pd.DataFrame({"Conclusões": por_dia})
+    for janela in janelas:
+        curva[f"{janela} dias"] = por_dia.rolling(janela, min_periods=1).sum()
+    return curva
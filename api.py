@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import json
+import os
+import re
+import urllib.parse
+
+import armazenamento
+import espacos
+import servico
+
+# Tamanho máximo do corpo de uma requisição
+LIMITE_CORPO = 1024 * 1024
+
+MOTIVOS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ErroHTTP(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+def _campo_texto(corpo, campo):
+    valor = corpo.get(campo)
+    if not isinstance(valor, str) or not valor.strip():
+        raise ErroHTTP(400, f"Campo obrigatório: {campo}")
+    return valor.strip()
+
+
+# Rotas: as funções rodam na thread do gestor e recebem (gestor, parâmetros, consulta, corpo)
+
+def listar_dia(gestor, parametros, consulta, corpo):
+    tarefas = []
+    for tarefa in gestor.tarefas_dia["tarefas"]:
+        item = dict(tarefa)
+        if tarefa["tipo"] == "recorrente":
+            item.update(gestor.resumo(tarefa["id"]))
+        tarefas.append(item)
+    return 200, {"data": gestor.tarefas_dia["data"], "tarefas": tarefas}
+
+
+def incluir_no_dia(gestor, parametros, consulta, corpo):
+    ids = corpo.get("ids")
+    if not isinstance(ids, list):
+        raise ErroHTTP(400, "Campo obrigatório: ids (lista)")
+    return 200, {"adicionadas": gestor.adicionar_ao_dia(ids)}
+
+
+def marcar(gestor, parametros, consulta, corpo):
+    concluida = corpo.get("concluida", True)
+    if not isinstance(concluida, bool):
+        raise ErroHTTP(400, "concluida deve ser true ou false")
+    tarefa = dict(gestor.marcar(parametros["id"], concluida))
+    if tarefa["tipo"] == "recorrente":
+        tarefa.update(gestor.resumo(tarefa["id"]))
+    return 200, tarefa
+
+
+def listar_recorrentes(gestor, parametros, consulta, corpo):
+    return 200, [dict(tarefa, **gestor.resumo(tarefa["id"])) for tarefa in gestor.tarefas_recorrentes]
+
+
+def criar_recorrente(gestor, parametros, consulta, corpo):
+    return 201, gestor.adicionar_recorrente(_campo_texto(corpo, "descricao"), corpo.get("regra"))
+
+
+# Corpo: a regra (ver recorrencia); vazio para todos os dias
+def definir_regra(gestor, parametros, consulta, corpo):
+    return 200, gestor.definir_regra(parametros["id"], corpo or None)
+
+
+def remover_recorrente(gestor, parametros, consulta, corpo):
+    return 200, gestor.remover_recorrente(parametros["id"])
+
+
+# Corpo: {id: {"sequencia_atual": n, "recorde_sequencia": n} ou {"automatica": true}}
+def editar_sequencias(gestor, parametros, consulta, corpo):
+    if not all(isinstance(alteracao, dict) for alteracao in corpo.values()):
+        raise ErroHTTP(400, "Cada tarefa deve ter um objeto com a alteração")
+    return 200, {"alteradas": gestor.editar_sequencias(corpo)}
+
+
+def listar_backlog(gestor, parametros, consulta, corpo):
+    projeto = False
+    if "projeto" in consulta:
+        projeto = consulta["projeto"] or None
+    tarefas = gestor.buscar_backlog(consulta.get("busca", ""), projeto)
+    try:
+        limite = int(consulta.get("limite", 100))
+        inicio = int(consulta.get("inicio", 0))
+    except ValueError:
+        raise ErroHTTP(400, "limite e inicio devem ser números")
+    return 200, {"total": len(tarefas), "tarefas": tarefas[inicio:inicio + limite]}
+
+
+def criar_backlog(gestor, parametros, consulta, corpo):
+    return 201, gestor.adicionar_backlog(_campo_texto(corpo, "descricao"), corpo.get("projeto") or None)
+
+
+def remover_backlog(gestor, parametros, consulta, corpo):
+    return 200, gestor.remover_backlog(parametros["id"])
+
+
+def listar_projetos(gestor, parametros, consulta, corpo):
+    return 200, [dict(projeto, tarefas=gestor.indice.contar_projeto(projeto["nome"])) for projeto in gestor.projetos]
+
+
+def criar_projeto(gestor, parametros, consulta, corpo):
+    return 201, gestor.adicionar_projeto(_campo_texto(corpo, "nome"))
+
+
+def remover_projeto(gestor, parametros, consulta, corpo):
+    return 200, gestor.remover_projeto(parametros["id"])
+
+
+def desfazer(gestor, parametros, consulta, corpo):
+    evento = gestor.desfazer()
+    return 200, {"desfeito": servico.descrever(evento), "evento": evento}
+
+
+def refazer(gestor, parametros, consulta, corpo):
+    evento = gestor.refazer()
+    return 200, {"refeito": servico.descrever(evento), "evento": evento}
+
+
+# Alterações recentes, da mais nova para a mais antiga
+def listar_diario(gestor, parametros, consulta, corpo):
+    desfazer, refazer = gestor.pilhas()
+    eventos = [dict(evento, descricao_evento=servico.descrever(evento)) for evento in reversed(gestor.eventos)]
+    return 200, {
+        "eventos": eventos,
+        "desfazer": servico.descrever(desfazer[-1]) if desfazer else None,
+        "refazer": servico.descrever(refazer[-1]) if refazer else None,
+    }
+
+
+ROTAS = [
+    ("GET", r"/dia", listar_dia),
+    ("POST", r"/dia", incluir_no_dia),
+    ("POST", r"/dia/(?P<id>[^/]+)", marcar),
+    ("GET", r"/recorrentes", listar_recorrentes),
+    ("POST", r"/recorrentes", criar_recorrente),
+    ("DELETE", r"/recorrentes/(?P<id>[^/]+)", remover_recorrente),
+    ("PUT", r"/recorrentes/(?P<id>[^/]+)/regra", definir_regra),
+    ("PUT", r"/sequencias", editar_sequencias),
+    ("GET", r"/backlog", listar_backlog),
+    ("POST", r"/backlog", criar_backlog),
+    ("DELETE", r"/backlog/(?P<id>[^/]+)", remover_backlog),
+    ("GET", r"/projetos", listar_projetos),
+    ("POST", r"/projetos", criar_projeto),
+    ("DELETE", r"/projetos/(?P<id>[^/]+)", remover_projeto),
+    ("GET", r"/diario", listar_diario),
+    ("POST", r"/desfazer", desfazer),
+    ("POST", r"/refazer", refazer),
+    ("GET", r"/metricas", None),
+]
+ROTAS = [(metodo, re.compile(padrao + r"/?"), funcao) for metodo, padrao, funcao in ROTAS]
+
+
+def encontrar_rota(metodo, caminho):
+    caminho_existe = False
+    for metodo_rota, padrao, funcao in ROTAS:
+        casamento = padrao.fullmatch(caminho)
+        if casamento is None:
+            continue
+        caminho_existe = True
+        if metodo_rota == metodo:
+            parametros = {chave: urllib.parse.unquote(valor) for chave, valor in casamento.groupdict().items()}
+            return funcao, parametros
+    if caminho_existe:
+        raise ErroHTTP(405, "Método não permitido")
+    raise ErroHTTP(404, "Rota inexistente")
+
+
+# Servidor HTTP/1.1 mínimo sobre asyncio, com conexões persistentes.
+# Os gestores vivem em uma única thread: as operações ficam em fila, sem travas,
+# e a gravação em disco não bloqueia o laço que atende as conexões.
+# Serve um único conjunto de dados (loja) ou, com um cache de espaços de
+# trabalho, o espaço escolhido em cada requisição (?espaco=nome).
+class Servidor:
+    def __init__(self, loja=None, cache_espacos=None):
+        self.gestor = servico.Gestor(loja) if cache_espacos is None else None
+        self.cache_espacos = cache_espacos
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="gestor")
+        self.requisicoes = 0
+
+    def gestor_do_espaco(self, nome):
+        if self.cache_espacos is None:
+            if nome:
+                raise ErroHTTP(400, "Espaços de trabalho desativados")
+            return self.gestor
+        try:
+            espaco = self.cache_espacos.obter(nome or espacos.ESPACO_PADRAO)
+        except ValueError as erro:
+            raise ErroHTTP(400, str(erro))
+        if espaco.gestor is None:
+            espaco.gestor = servico.Gestor(espaco.loja)
+        return espaco.gestor
+
+    def executar(self, funcao, parametros, consulta, corpo):
+        gestor = self.gestor_do_espaco(consulta.pop("espaco", None))
+        gestor.atualizar()
+        return funcao(gestor, parametros, consulta, corpo)
+
+    # Respondida fora da fila dos gestores, para medir o atraso mesmo com ela ocupada
+    def metricas(self):
+        if self.cache_espacos is not None:
+            return 200, {"requisicoes": self.requisicoes, "espacos": self.cache_espacos.metricas()}
+        return 200, {"requisicoes": self.requisicoes, "gravacao": self.gestor.loja.metricas_gravacao()}
+
+    async def atender(self, metodo, alvo, corpo_bruto):
+        url = urllib.parse.urlsplit(alvo)
+        consulta = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        funcao, parametros = encontrar_rota(metodo, url.path)
+        if funcao is None:
+            return self.metricas()
+
+        corpo = {}
+        if corpo_bruto:
+            try:
+                corpo = json.loads(corpo_bruto)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                raise ErroHTTP(400, "JSON inválido")
+            if not isinstance(corpo, dict):
+                raise ErroHTTP(400, "O corpo deve ser um objeto JSON")
+
+        laco = asyncio.get_running_loop()
+        try:
+            return await laco.run_in_executor(self.executor, self.executar, funcao, parametros, consulta, corpo)
+        except KeyError as erro:
+            raise ErroHTTP(404, f"Não encontrado: {erro.args[0]}")
+        except ValueError as erro:
+            raise ErroHTTP(400, str(erro))
+
+    async def conexao(self, leitor, escritor):
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha.strip():
+                    break
+                try:
+                    metodo, alvo, versao = linha.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                cabecalhos = {}
+                while True:
+                    linha = await leitor.readline()
+                    if linha in (b"\r\n", b"\n", b""):
+                        break
+                    nome, _, valor = linha.decode("latin-1").partition(":")
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+
+                manter = cabecalhos.get("connection", "").lower() != "close" and versao == "HTTP/1.1"
+                try:
+                    tamanho = int(cabecalhos.get("content-length", 0))
+                    if tamanho > LIMITE_CORPO:
+                        manter = False
+                        raise ErroHTTP(413, "Corpo grande demais")
+                    corpo = await leitor.readexactly(tamanho) if tamanho else b""
+                    status, resposta = await self.atender(metodo.upper(), alvo, corpo)
+                except ErroHTTP as erro:
+                    status, resposta = erro.status, {"erro": erro.mensagem}
+                except Exception as erro:
+                    status, resposta = 500, {"erro": f"{type(erro).__name__}: {erro}"}
+                self.requisicoes += 1
+
+                dados = json.dumps(resposta, ensure_ascii=False).encode("utf-8")
+                escritor.write(
+                    f"HTTP/1.1 {status} {MOTIVOS[status]}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(dados)}\r\n"
+                    f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n".encode("latin-1") + dados
+                )
+                await escritor.drain()
+                if not manter:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    async def servir(self, host, porta):
+        servidor = await asyncio.start_server(self.conexao, host, porta)
+        enderecos = ", ".join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in servidor.sockets)
+        print(f"API do Gestor de Tarefas em {enderecos}")
+        async with servidor:
+            await servidor.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON do Gestor de Tarefas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--dados", default=None, help="Pasta de dados (padrão: GESTOR_DADOS ou a pasta atual)")
+    parser.add_argument("--gravacao", choices=("imediata", "adiada"), default=None,
+                        help="Gravação em disco (padrão: GESTOR_GRAVACAO ou imediata)")
+    parser.add_argument("--janela", type=float, default=None, help="Janela da gravação adiada, em segundos")
+    parser.add_argument("--espacos", default=None,
+                        help="Pasta com um espaço de trabalho por subpasta (padrão: GESTOR_ESPACOS; sem ela, só --dados)")
+    parser.add_argument("--limite-espacos", type=int, default=espacos.LIMITE_ESPACOS, help="Espaços mantidos em memória")
+    parser.add_argument("--limite-cache-mb", type=float, default=espacos.LIMITE_BYTES / 1024 / 1024,
+                        help="Tamanho máximo dos espaços em memória")
+    args = parser.parse_args()
+
+    gravacao_adiada = None if args.gravacao is None else args.gravacao == "adiada"
+    criar = functools.partial(armazenamento.criar_armazenamento, gravacao_adiada=gravacao_adiada, janela=args.janela)
+    raiz_espacos = args.espacos or os.environ.get("GESTOR_ESPACOS")
+    if raiz_espacos:
+        cache = espacos.CacheEspacos(
+            raiz_espacos, limite=args.limite_espacos, limite_bytes=int(args.limite_cache_mb * 1024 * 1024),
+            criar=lambda pasta: criar(raiz=pasta),
+        )
+        servidor = Servidor(cache_espacos=cache)
+    else:
+        servidor = Servidor(criar(raiz=args.dados))
+    try:
+        asyncio.run(servidor.servir(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
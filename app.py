@@ -1,233 +1,220 @@
 import streamlit as st
-import pandas as pd
-import datetime
+import contextlib
+import io
 import json
-import os
+import math
+from collections import Counter
+
+import espacos
+import importacao
+import perfil
+import recorrencia
+import servico
+
+# Máximo de opções no seletor de tarefas do backlog
+LIMITE_OPCOES = 200
+
+# Execuções guardadas para o painel de desempenho
+LIMITE_EXECUCOES = 20
+
+# Alterações mostradas na barra lateral
+LIMITE_ALTERACOES = 15
+
+# Tipos de regra de recorrência oferecidos na interface
+TIPOS_REGRA = {"Todos os dias": "diaria", "Dias da semana": "semanal", "A cada N dias": "intervalo", "Todo mês": "mensal"}
 
 # Configuração da página
 st.set_page_config(page_title="Gestor de Tarefas", layout="wide")
 
-# Função para carregar dados
-def carregar_dados():
-    # Verificar se os arquivos existem
-    if not os.path.exists("tarefas_recorrentes.json"):
-        with open("tarefas_recorrentes.json", "w") as f:
-            json.dump([], f)
-    
-    if not os.path.exists("backlog.json"):
-        with open("backlog.json", "w") as f:
-            json.dump([], f)
-    
-    if not os.path.exists("historico.json"):
-        with open("historico.json", "w") as f:
-            json.dump({}, f)
-    
-    if not os.path.exists("tarefas_dia.json"):
-        with open("tarefas_dia.json", "w") as f:
-            json.dump({"data": "", "tarefas": []}, f)
-    
-    if not os.path.exists("projetos.json"):
-        with open("projetos.json", "w") as f:
-            json.dump([], f)
-    
-    # Carregar dados
-    with open("tarefas_recorrentes.json", "r") as f:
-        tarefas_recorrentes = json.load(f)
+# Função para paginar listas longas: só a fatia visível vira widgets
+def paginar(itens, chave, tamanhos=(25, 50, 100, 250)):
+    total = len(itens)
+    col1, col2, col3 = st.columns([0.3, 0.3, 1.4])
     
-    with open("backlog.json", "r") as f:
-        backlog = json.load(f)
+    with col1:
+        tamanho = st.selectbox("Itens por página:", tamanhos, index=1, key=f"{chave}_tamanho")
     
-    with open("historico.json", "r") as f:
-        historico = json.load(f)
+    paginas = max(1, math.ceil(total / tamanho))
+    # Se a lista encolheu (filtro, remoção), voltar para a última página existente
+    if st.session_state.get(f"{chave}_pagina", 1) > paginas:
+        st.session_state[f"{chave}_pagina"] = paginas
     
-    with open("tarefas_dia.json", "r") as f:
-        tarefas_dia = json.load(f)
+    with col2:
+        pagina = st.number_input("Página:", min_value=1, max_value=paginas, value=1, step=1, key=f"{chave}_pagina")
     
-    with open("projetos.json", "r") as f:
-        projetos = json.load(f)
+    inicio = (pagina - 1) * tamanho
+    with col3:
+        st.caption(f"Mostrando {inicio + 1}–{min(inicio + tamanho, total)} de {total}")
     
-    # Converter histórico antigo para o novo formato se necessário
-    historico_atualizado = {}
-    for tarefa_id, dados in historico.items():
-        if isinstance(dados, list):  # Formato muito antigo (só datas)
-            sequencia = calcular_sequencia_antiga(dados)
-            historico_atualizado[tarefa_id] = {
-                "datas": dados,
-                "sequencia_atual": sequencia,
-                "sequencia_editada": False,
-                "recorde_sequencia": sequencia
-            }
-        elif isinstance(dados, dict) and "recorde_sequencia" not in dados:  # Formato antigo sem recorde
-            dados["recorde_sequencia"] = dados.get("sequencia_atual", 0)
-            historico_atualizado[tarefa_id] = dados
-        else:  # Já está no formato novo
-            historico_atualizado[tarefa_id] = dados
-    
-    return tarefas_recorrentes, backlog, historico_atualizado, tarefas_dia, projetos
+    return itens[inicio:inicio + tamanho], inicio
 
-# Função auxiliar para calcular sequência no formato antigo
-def calcular_sequencia_antiga(datas):
-    if not datas:
-        return 0
-    
-    datas_obj = [datetime.datetime.strptime(data, "%Y-%m-%d") for data in datas]
-    datas_obj.sort()
-    
-    data_atual = datetime.datetime.now().date()
-    ultima_data = datas_obj[-1].date()
-    
-    # Se a última conclusão não foi hoje nem ontem, a sequência foi quebrada
-    if (data_atual - ultima_data).days > 1:
-        return 0
-    
-    # Calcular sequência atual
-    sequencia = 1
-    for i in range(len(datas_obj) - 1, 0, -1):
-        dias_diff = (datas_obj[i].date() - datas_obj[i-1].date()).days
-        if dias_diff == 1:
-            sequencia += 1
-        else:
-            break
+# Painel de desempenho: trechos da última execução e exportação das recentes
+def painel_desempenho():
+    execucoes = st.session_state.get("perfil_execucoes", [])
+    if not execucoes:
+        st.caption("As medições aparecem a partir da próxima execução.")
+        return
     
-    return sequencia
+    ultima = execucoes[-1]
+    st.metric("Última execução", f"{ultima.duracao * 1000:.0f} ms")
+    contadores = ultima.contadores
+    st.caption(
+        f"Lidos: {contadores.get('bytes_lidos', 0):,} bytes · "
+        f"Gravados: {contadores.get('bytes_gravados', 0):,} bytes"
+        + (f" · {contadores['linhas_gravadas']} linhas" if "linhas_gravadas" in contadores else "")
+    )
+    # Espaços de trabalho carregados no processo
+    cache = espacos.compartilhado()
+    if cache is not None:
+        metricas = cache.metricas()
+        st.caption(
+            f"Espaços em cache: {metricas['espacos']}/{metricas['limite']} · "
+            f"{metricas['bytes'] / 1024 / 1024:.1f} de {metricas['limite_bytes'] / 1024 / 1024:.0f} MB · "
+            f"acertos {metricas['acertos']} · falhas {metricas['falhas']} · despejos {metricas['despejos']}"
+            f" ({metricas['despejos_por_tamanho']} por tamanho)"
+        )
+    # Com a gravação adiada: quanto do que foi alterado ainda não chegou ao disco
+    gestor = st.session_state.get("gestor")
+    gravacao = gestor.loja.metricas_gravacao() if gestor is not None else None
+    if gravacao is not None:
+        st.caption(
+            f"Gravação adiada (janela {gravacao['janela_s']:g}s): atraso {gravacao['atraso_s'] * 1000:.0f} ms · "
+            f"última descarga {gravacao['ultimo_atraso_s'] * 1000:.0f} ms · "
+            f"{gravacao['eventos_pendentes']} eventos e {gravacao['snapshots_pendentes']} snapshots pendentes"
+            + (f" · erro: {gravacao['erro']}" if gravacao["erro"] else "")
+        )
+    import pandas as pd
 
-# Função para salvar dados
-def salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos):
-    with open("tarefas_recorrentes.json", "w") as f:
-        json.dump(tarefas_recorrentes, f)
-    
-    with open("backlog.json", "w") as f:
-        json.dump(backlog, f)
-    
-    with open("historico.json", "w") as f:
-        json.dump(historico, f)
-    
-    with open("tarefas_dia.json", "w") as f:
-        json.dump(tarefas_dia, f)
-    
-    with open("projetos.json", "w") as f:
-        json.dump(projetos, f)
+    trechos = pd.DataFrame(perfil.tabela(ultima))
+    contagens = trechos.columns.drop(["Trecho", "ms"])
+    trechos[contagens] = trechos[contagens].fillna(0).astype(int)
+    st.dataframe(trechos, hide_index=True, use_container_width=True)
+    
+    st.download_button(
+        "Exportar (Chrome trace)",
+        data=json.dumps(perfil.chrome_trace(execucoes)),
+        file_name="gestor_trace.json",
+        mime="application/json"
+    )
+    st.download_button(
+        "Exportar (JSON)",
+        data=json.dumps([execucao.como_dict() for execucao in execucoes], ensure_ascii=False),
+        file_name="gestor_perfil.json",
+        mime="application/json"
+    )
 
-# Função para calcular sequência atual
-def calcular_sequencia(historico, tarefa_id):
-    if tarefa_id not in historico:
-        return 0
-    
-    info_tarefa = historico[tarefa_id]
-    
-    # Se a sequência foi editada manualmente, usar esse valor
-    if info_tarefa.get("sequencia_editada", False):
-        return info_tarefa.get("sequencia_atual", 0)
-    
-    # Caso contrário, calcular com base nas datas
-    datas = info_tarefa.get("datas", [])
-    if not datas:
-        return 0
-    
-    datas_obj = [datetime.datetime.strptime(data, "%Y-%m-%d") for data in datas]
-    datas_obj.sort()
-    
-    data_atual = datetime.datetime.now().date()
-    ultima_data = datas_obj[-1].date()
-    
-    # Se a última conclusão não foi hoje nem ontem, a sequência foi quebrada
-    if (data_atual - ultima_data).days > 1:
-        return 0
-    
-    # Calcular sequência atual
-    sequencia = 1
-    for i in range(len(datas_obj) - 1, 0, -1):
-        dias_diff = (datas_obj[i].date() - datas_obj[i-1].date()).days
-        if dias_diff == 1:
-            sequencia += 1
-        else:
-            break
-    
-    return sequencia
+# Gestor da sessão, guardado entre execuções: carregado uma vez e depois só
+# atualizado com as alterações gravadas desde então, por esta ou outras sessões.
+# O espaço de trabalho vem da URL (?espaco=nome); se ele mudou ou saiu do
+# cache de espaços, o gestor é carregado de novo.
+def gestor_da_sessao():
+    loja = espacos.obter_loja(st.query_params.get("espaco"))
+    gestor = st.session_state.get("gestor")
+    if gestor is None or gestor.loja is not loja:
+        gestor = servico.Gestor(loja)
+        gestor.carregar()
+        st.session_state["gestor"] = gestor
+    else:
+        gestor.atualizar()
+    return gestor
 
-# Função para atualizar o recorde de sequência
-def atualizar_recorde(historico, tarefa_id):
-    if tarefa_id not in historico:
+# Gestor de um fragmento: na execução completa, o que main já resolveu (e
+# atualizou) nesta execução; quando o fragmento roda sozinho, o da sessão,
+# trazendo as alterações gravadas desde então
+def gestor_do_fragmento(gestor):
+    if st.session_state.get("execucao_completa"):
+        return gestor
+    return gestor_da_sessao()
+
+# Escolha do espaço de trabalho, guardada na URL para poder ser compartilhada
+def seletor_de_espaco():
+    cache = espacos.compartilhado()
+    if cache is None:
         return
-    
-    sequencia_atual = historico[tarefa_id].get("sequencia_atual", 0)
-    recorde_atual = historico[tarefa_id].get("recorde_sequencia", 0)
-    
-    if sequencia_atual > recorde_atual:
-        historico[tarefa_id]["recorde_sequencia"] = sequencia_atual
+    atual = st.query_params.get("espaco", espacos.ESPACO_PADRAO)
+    nome = st.text_input("Espaço de trabalho", value=atual).strip()
+    if nome and nome != atual:
+        try:
+            espacos.validar_nome(nome)
+        except ValueError as erro:
+            st.error(str(erro))
+            return
+        st.query_params["espaco"] = nome
+        st.rerun()
 
-# Função principal
-def main():
-    st.title("Gestor de Tarefas")
-    
-    # Carregar dados
-    tarefas_recorrentes, backlog, historico, tarefas_dia, projetos = carregar_dados()
-    
-    # Data atual
-    hoje = datetime.datetime.now().strftime("%Y-%m-%d")
-    
-    # Se for um novo dia, resetar as tarefas do dia
-    if tarefas_dia["data"] != hoje:
-        tarefas_dia = {
-            "data": hoje,
-            "tarefas": [{"id": tarefa["id"], "descricao": tarefa["descricao"], "tipo": "recorrente", "concluida": False} 
-                       for tarefa in tarefas_recorrentes]
-        }
-        salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
-    
-    # Sidebar com abas
-    with st.sidebar:
-        aba = st.radio("Menu", ["Tarefas do Dia", "Tarefas Recorrentes", "Backlog", "Projetos", "Estatísticas", "Editar Sequências"])
-    
-    # Aba de tarefas do dia
-    if aba == "Tarefas do Dia":
-        st.header(f"Tarefas do Dia ({hoje})")
+# Campos da regra de recorrência; devolve a regra escolhida. Dentro de um
+# formulário os campos não mudam antes do envio, então todos aparecem e só os
+# do tipo escolhido valem.
+def editor_de_regra(chave, regra=None, hoje=None):
+    regra = regra or recorrencia.DIARIA
+    tipos = list(TIPOS_REGRA.values())
+    rotulo = st.selectbox("Repetição:", list(TIPOS_REGRA), index=tipos.index(regra["tipo"]), key=f"{chave}_tipo")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        dias = st.multiselect(
+            "Dias da semana:", list(range(7)), default=regra.get("dias", [0]) if regra["tipo"] == "semanal" else [0],
+            format_func=lambda dia: recorrencia.NOMES_DIAS[dia], key=f"{chave}_dias",
+        )
+    with col2:
+        intervalo = st.number_input(
+            "A cada N dias:", min_value=2, value=regra["dias"] if regra["tipo"] == "intervalo" else 2, key=f"{chave}_intervalo"
+        )
+    with col3:
+        dia_mes = st.number_input("Dia do mês:", min_value=1, max_value=31, value=regra.get("dia", 1), key=f"{chave}_dia")
+
+    tipo = TIPOS_REGRA[rotulo]
+    if tipo == "semanal":
+        return {"tipo": "semanal", "dias": list(dias)}
+    if tipo == "intervalo":
+        return {"tipo": "intervalo", "dias": int(intervalo), "inicio": regra.get("inicio") or hoje}
+    if tipo == "mensal":
+        return {"tipo": "mensal", "dia": int(dia_mes)}
+    return None
+
+# Guarda uma execução medida para o painel de desempenho
+def guardar_execucao(coleta):
+    execucoes = st.session_state.setdefault("perfil_execucoes", [])
+    execucoes.append(coleta)
+    del execucoes[:-LIMITE_EXECUCOES]
+
+# Fragmentos reexecutados sozinhos também aparecem no painel de desempenho
+@contextlib.contextmanager
+def medir_fragmento(nome):
+    if not st.session_state.get("perfil_ativo") or perfil.atual() is not None:
+        with perfil.trecho(nome):
+            yield
+        return
+    with perfil.coletar(nome) as coleta:
+        try:
+            yield
+        finally:
+            guardar_execucao(coleta)
+
+# Lista de tarefas do dia: marcar uma tarefa reexecuta só este fragmento, sobre
+# o gestor da sessão (grava um evento, sem reler nem regravar os dados)
+@st.fragment
+def lista_do_dia(gestor):
+    with medir_fragmento("lista do dia"):
+        gestor = gestor_do_fragmento(gestor)
+        tarefas_dia = gestor.tarefas_dia
+        indice = gestor.indice
+        
+        # Ocorrências que ficaram para trás na última virada do dia
+        virada = next((evento for evento in reversed(gestor.eventos)
+                       if evento["tipo"] == "virar_dia" and evento["data"] == tarefas_dia["data"]), None)
+        if virada and virada.get("perdidas"):
+            st.warning(f"{sum(virada['perdidas'].values())} ocorrência(s) de tarefas recorrentes não concluída(s) desde {virada['anterior']}.")
         
         # Mostrar tarefas do dia
         if not tarefas_dia["tarefas"]:
             st.info("Não há tarefas para hoje. Adicione tarefas recorrentes ou selecione do backlog.")
         
-        for i, tarefa in enumerate(tarefas_dia["tarefas"]):
+        for tarefa in tarefas_dia["tarefas"]:
             col1, col2, col3, col4 = st.columns([0.1, 1.6, 0.2, 0.1])
             with col1:
-                concluida = st.checkbox("", tarefa["concluida"], key=f"tarefa_dia_{i}")
+                concluida = st.checkbox("", tarefa["concluida"], key=f"tarefa_dia_{tarefa['id']}")
                 if concluida != tarefa["concluida"]:
-                    tarefa["concluida"] = concluida
-                    
-                    # Atualizar histórico se marcou como concluída
-                    if concluida and tarefa["tipo"] == "recorrente":
-                        if tarefa["id"] not in historico:
-                            historico[tarefa["id"]] = {
-                                "datas": [],
-                                "sequencia_atual": 0,
-                                "sequencia_editada": False,
-                                "recorde_sequencia": 0
-                            }
-                        
-                        if hoje not in historico[tarefa["id"]]["datas"]:
-                            historico[tarefa["id"]]["datas"].append(hoje)
-                            # Recalcular a sequência
-                            if not historico[tarefa["id"]]["sequencia_editada"]:
-                                historico[tarefa["id"]]["sequencia_atual"] = calcular_sequencia(historico, tarefa["id"])
-                            else:
-                                # Se editada manualmente, incrementar
-                                historico[tarefa["id"]]["sequencia_atual"] += 1
-                            
-                            # Atualizar recorde se necessário
-                            atualizar_recorde(historico, tarefa["id"])
-                    
-                    # Remover do histórico se desmarcou
-                    elif not concluida and tarefa["tipo"] == "recorrente":
-                        if tarefa["id"] in historico and hoje in historico[tarefa["id"]]["datas"]:
-                            historico[tarefa["id"]]["datas"].remove(hoje)
-                            # Recalcular a sequência
-                            if not historico[tarefa["id"]]["sequencia_editada"]:
-                                historico[tarefa["id"]]["sequencia_atual"] = calcular_sequencia(historico, tarefa["id"])
-                            else:
-                                # Se editada manualmente, decrementar (mas não abaixo de 0)
-                                historico[tarefa["id"]]["sequencia_atual"] = max(0, historico[tarefa["id"]]["sequencia_atual"] - 1)
-                    
-                    salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
+                    gestor.marcar(tarefa["id"], concluida)
             
             with col2:
                 st.write(f"**{tarefa['descricao']}**" if not concluida else f"~~{tarefa['descricao']}~~")
@@ -235,13 +222,21 @@ def main():
             with col3:
                 # Mostrar projeto se for tarefa do backlog
                 if tarefa["tipo"] == "backlog":
-                    backlog_task = next((t for t in backlog if t["id"] == tarefa["id"]), None)
+                    backlog_task = indice.tarefa(tarefa["id"])
                     if backlog_task and "projeto" in backlog_task:
                         st.write(f"📂 {backlog_task['projeto']}")
             
             with col4:
                 tipo_tag = "🔄" if tarefa["tipo"] == "recorrente" else "📋"
                 st.write(tipo_tag)
+
+# Seletor do backlog: filtro e busca reexecutam só este fragmento; ao adicionar,
+# a página inteira é atualizada para a lista do dia mostrar as novas tarefas
+@st.fragment
+def seletor_do_backlog(gestor):
+    with medir_fragmento("seletor do backlog"):
+        gestor = gestor_do_fragmento(gestor)
+        backlog, projetos, indice = gestor.backlog, gestor.projetos, gestor.indice
         
         # Adicionar tarefas do backlog
         st.subheader("Adicionar tarefas do backlog")
@@ -249,12 +244,13 @@ def main():
         if not backlog:
             st.info("Não há tarefas no backlog.")
         else:
-            tarefas_disponiveis = [t for t in backlog if t["id"] not in [task["id"] for task in tarefas_dia["tarefas"]]]
+            tarefas_disponiveis = [t for t in backlog if not indice.esta_no_dia(t["id"])]
             
             if not tarefas_disponiveis:
                 st.info("Todas as tarefas do backlog já foram adicionadas ao dia.")
             else:
                 # Filtro por projeto
+                projeto = False
                 if projetos:
                     projeto_filtro = st.selectbox(
                         "Filtrar por projeto:",
@@ -262,359 +258,484 @@ def main():
                     )
                 
                     if projeto_filtro != "Todos":
-                        tarefas_disponiveis = [t for t in tarefas_disponiveis if t.get("projeto") == projeto_filtro]
+                        projeto = projeto_filtro
+                        tarefas_disponiveis = [t for t in indice.do_projeto(projeto_filtro) if not indice.esta_no_dia(t["id"])]
+                
+                # Busca por texto, tolerante a erros de digitação
+                consulta = st.text_input("Buscar no backlog:", key="busca_dia")
+                if consulta:
+                    tarefas_disponiveis = [t for t in gestor.buscar_backlog(consulta, projeto) if not indice.esta_no_dia(t["id"])]
+                
+                if len(tarefas_disponiveis) > LIMITE_OPCOES:
+                    st.caption(f"Mostrando {LIMITE_OPCOES} de {len(tarefas_disponiveis)} tarefas. Use a busca para refinar.")
+                    tarefas_disponiveis = tarefas_disponiveis[:LIMITE_OPCOES]
+                
+                # Opções pelo id; descrições repetidas ganham o id no rótulo para não se confundirem
+                repetidas = {d for d, n in Counter(t["descricao"] for t in tarefas_disponiveis).items() if n > 1}
+                
+                def rotulo(tarefa_id):
+                    descricao = indice.tarefa(tarefa_id)["descricao"]
+                    return f"{descricao} ({tarefa_id})" if descricao in repetidas else descricao
                 
                 selected_backlog = st.multiselect(
                     "Selecione tarefas do backlog para adicionar ao dia:",
-                    options=[t["descricao"] for t in tarefas_disponiveis],
-                    format_func=lambda x: x
+                    options=[t["id"] for t in tarefas_disponiveis],
+                    format_func=rotulo
                 )
                 
                 if st.button("Adicionar Selecionadas"):
-                    for descricao in selected_backlog:
-                        tarefa = next((t for t in tarefas_disponiveis if t["descricao"] == descricao), None)
-                        if tarefa:
-                            tarefas_dia["tarefas"].append({
-                                "id": tarefa["id"],
-                                "descricao": tarefa["descricao"],
-                                "tipo": "backlog",
-                                "concluida": False
-                            })
-                    
-                    salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
+                    gestor.adicionar_ao_dia(selected_backlog)
                     st.rerun()
+
+# Função principal
+def main():
+    st.title("Gestor de Tarefas")
+    
+    with st.sidebar:
+        seletor_de_espaco()
     
-    # Aba de tarefas recorrentes
-    elif aba == "Tarefas Recorrentes":
-        st.header("Tarefas Recorrentes")
+    # Carregar dados (já com as tarefas do dia renovadas se for um novo dia)
+    try:
+        gestor = gestor_da_sessao()
+    except ValueError as erro:
+        # Espaço inválido na URL
+        st.error(str(erro))
+        st.stop()
+    tarefas_recorrentes, backlog, historico, tarefas_dia, projetos = gestor.estado
+    hoje = tarefas_dia["data"]
+    
+    # Índices por id, projeto e tarefas do dia
+    indice = gestor.indice
+    
+    # Sidebar com abas
+    with st.sidebar:
+        aba = st.radio("Menu", ["Tarefas do Dia", "Tarefas Recorrentes", "Backlog", "Projetos", "Estatísticas", "Editar Sequências"])
         
-        # Formulário para adicionar nova tarefa recorrente
-        with st.form(key="form_tarefa_recorrente"):
-            nova_tarefa = st.text_input("Nova tarefa recorrente:")
-            submit_button = st.form_submit_button("Adicionar")
-            
-            if submit_button and nova_tarefa:
-                # Criar ID para a tarefa
-                task_id = f"rec_{len(tarefas_recorrentes) + 1}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
-                
-                # Adicionar à lista de tarefas recorrentes
-                tarefas_recorrentes.append({
-                    "id": task_id,
-                    "descricao": nova_tarefa
-                })
-                
-                # Adicionar às tarefas do dia
-                tarefas_dia["tarefas"].append({
-                    "id": task_id,
-                    "descricao": nova_tarefa,
-                    "tipo": "recorrente",
-                    "concluida": False
-                })
-                
-                # Inicializar histórico desta tarefa
-                historico[task_id] = {
-                    "datas": [],
-                    "sequencia_atual": 0,
-                    "sequencia_editada": False,
-                    "recorde_sequencia": 0
-                }
-                
-                salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
+        # Desfazer e refazer a última alteração, de qualquer sessão
+        pilha_desfazer, pilha_refazer = gestor.pilhas()
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("↩️ Desfazer", disabled=not pilha_desfazer, use_container_width=True,
+                         help=servico.descrever(pilha_desfazer[-1]) if pilha_desfazer else None):
+                gestor.desfazer()
+                st.rerun()
+        with col2:
+            if st.button("↪️ Refazer", disabled=not pilha_refazer, use_container_width=True,
+                         help=servico.descrever(pilha_refazer[-1]) if pilha_refazer else None):
+                gestor.refazer()
                 st.rerun()
         
-        # Listar tarefas recorrentes
-        if not tarefas_recorrentes:
-            st.info("Não há tarefas recorrentes cadastradas.")
-        else:
-            for i, tarefa in enumerate(tarefas_recorrentes):
-                col1, col2, col3, col4 = st.columns([1.2, 0.3, 0.3, 0.2])
-                
-                with col1:
-                    st.write(f"{i+1}. {tarefa['descricao']}")
-                
-                with col2:
-                    # Mostrar sequência atual
-                    seq = calcular_sequencia(historico, tarefa["id"])
-                    st.write(f"Sequência: {seq} dias")
-                
-                with col3:
-                    # Mostrar recorde de sequência
-                    rec = historico.get(tarefa["id"], {}).get("recorde_sequencia", 0)
-                    st.write(f"Recorde: {rec} dias")
-                
-                with col4:
-                    # Total de vezes concluída
-                    total = len(historico.get(tarefa["id"], {}).get("datas", []))
-                    st.write(f"Total: {total}")
-                
-                if st.button("Remover", key=f"rem_rec_{i}"):
-                    # Remover da lista de tarefas recorrentes
-                    tarefas_recorrentes.pop(i)
+        with st.expander("Últimas alterações"):
+            if not gestor.eventos:
+                st.caption("Nenhuma alteração recente.")
+            for evento in reversed(gestor.eventos[-LIMITE_ALTERACOES:]):
+                st.caption(f"{evento.get('quando', '')[-8:]} · {servico.descrever(evento)}")
+        
+        if st.checkbox("Painel de desempenho", key="perfil_ativo"):
+            with st.expander("Desempenho", expanded=True):
+                painel_desempenho()
+    
+    # Cada aba é um trecho medido no painel de desempenho
+    with perfil.trecho(f"aba {aba}"):
+        # Aba de tarefas do dia
+        if aba == "Tarefas do Dia":
+            st.header(f"Tarefas do Dia ({hoje})")
+            
+            lista_do_dia(gestor)
+            
+            seletor_do_backlog(gestor)
+        
+        # Aba de tarefas recorrentes
+        elif aba == "Tarefas Recorrentes":
+            st.header("Tarefas Recorrentes")
+            
+            # Formulário para adicionar nova tarefa recorrente
+            with st.form(key="form_tarefa_recorrente"):
+                nova_tarefa = st.text_input("Nova tarefa recorrente:")
+                nova_regra = editor_de_regra("nova_regra", hoje=hoje)
+                submit_button = st.form_submit_button("Adicionar")
+                
+                if submit_button and nova_tarefa:
+                    try:
+                        gestor.adicionar_recorrente(nova_tarefa, nova_regra)
+                        st.rerun()
+                    except ValueError as erro:
+                        st.error(str(erro))
+            
+            # Listar tarefas recorrentes
+            if not tarefas_recorrentes:
+                st.info("Não há tarefas recorrentes cadastradas.")
+            else:
+                ordem = st.selectbox(
+                    "Ordenar por:",
+                    ["Ordem de criação", "Descrição", "Sequência", "Total"],
+                    key="ordem_recorrentes"
+                )
+                
+                tarefas_ordenadas = tarefas_recorrentes
+                if ordem == "Descrição":
+                    tarefas_ordenadas = sorted(tarefas_recorrentes, key=lambda t: t["descricao"].lower())
+                elif ordem == "Sequência":
+                    tarefas_ordenadas = sorted(tarefas_recorrentes, key=lambda t: servico.calcular_sequencia(historico, t["id"], t.get("regra")), reverse=True)
+                elif ordem == "Total":
+                    tarefas_ordenadas = sorted(tarefas_recorrentes, key=lambda t: len(historico.get(t["id"], {}).get("datas", [])), reverse=True)
+                
+                pagina, inicio = paginar(tarefas_ordenadas, "pagina_recorrentes")
+                
+                for i, tarefa in enumerate(pagina, start=inicio):
+                    regra = tarefa.get("regra")
+                    # Fora das diárias, a sequência conta ocorrências da regra
+                    unidade = "dias" if recorrencia.e_diaria(regra) else "vezes"
+                    col1, col2, col3, col4 = st.columns([1.2, 0.3, 0.3, 0.2])
                     
-                    # Remover das tarefas do dia se estiver lá
-                    tarefas_dia["tarefas"] = [t for t in tarefas_dia["tarefas"] if t["id"] != tarefa["id"]]
+                    with col1:
+                        st.write(f"{i+1}. {tarefa['descricao']}")
+                        st.caption(recorrencia.descrever(regra))
                     
-                    salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
-                    st.rerun()
-    
-    # Aba de backlog
-    elif aba == "Backlog":
-        st.header("Backlog de Tarefas")
+                    with col2:
+                        # Mostrar sequência atual
+                        seq = servico.calcular_sequencia(historico, tarefa["id"], regra)
+                        st.write(f"Sequência: {seq} {unidade}")
+                    
+                    with col3:
+                        # Mostrar recorde de sequência
+                        rec = servico.calcular_recorde(historico, tarefa["id"], regra)
+                        st.write(f"Recorde: {rec} {unidade}")
+                    
+                    with col4:
+                        # Total de vezes concluída
+                        total = len(historico.get(tarefa["id"], {}).get("datas", []))
+                        st.write(f"Total: {total}")
+                    
+                    with st.expander("Repetição"):
+                        nova_regra = editor_de_regra(f"regra_{tarefa['id']}", regra, hoje)
+                        if st.button("Salvar repetição", key=f"salvar_regra_{tarefa['id']}"):
+                            try:
+                                gestor.definir_regra(tarefa["id"], nova_regra)
+                                st.rerun()
+                            except ValueError as erro:
+                                st.error(str(erro))
+                    
+                    # Chave pelo id: continua apontando para a mesma tarefa em qualquer página
+                    if st.button("Remover", key=f"rem_rec_{tarefa['id']}"):
+                        gestor.remover_recorrente(tarefa["id"])
+                        st.rerun()
         
-        # Formulário para adicionar nova tarefa ao backlog
-        with st.form(key="form_backlog"):
-            nova_tarefa = st.text_input("Nova tarefa para o backlog:")
+        # Aba de backlog
+        elif aba == "Backlog":
+            st.header("Backlog de Tarefas")
             
-            # Seleção de projeto
-            projeto_options = ["Sem projeto"] + [p["nome"] for p in projetos]
-            projeto_selecionado = st.selectbox("Projeto:", projeto_options)
+            # Resultado da última importação (a página é recarregada depois dela)
+            if "resultado_importacao" in st.session_state:
+                total, erros = st.session_state.pop("resultado_importacao")
+                st.success(f"{total} registros importados.")
+                if erros:
+                    st.warning(f"{len(erros)} linhas ignoradas:\n\n" + "\n\n".join(erros[:20]))
             
-            submit_button = st.form_submit_button("Adicionar")
+            # Importação e exportação em lote
+            with st.expander("Importar e exportar"):
+                tipo_arquivo = st.radio("Dados:", ["backlog", "historico"], horizontal=True,
+                                        format_func=lambda t: "Backlog" if t == "backlog" else "Histórico")
+                
+                envio = st.file_uploader("Arquivo para importar (.csv ou .jsonl):", type=["csv", "jsonl", "json"])
+                if envio is not None and st.button("Importar arquivo"):
+                    # Uma única gravação para o arquivo inteiro; um erro no meio não grava nada
+                    try:
+                        with gestor.edicao_direta("importar", dados=tipo_arquivo, arquivo=envio.name) as estado:
+                            total, erros = importacao.importar(
+                                estado, tipo_arquivo, importacao.texto_do_envio(envio), importacao.formato_de(envio.name)
+                            )
+                    except ValueError as erro:
+                        st.error(f"Importação cancelada: {erro}")
+                    else:
+                        st.session_state["resultado_importacao"] = (total, erros)
+                        st.rerun()
+                
+                formato_exportacao = st.radio("Formato da exportação:", list(importacao.FORMATOS), horizontal=True)
+                # O arquivo só é gerado quando pedido, não a cada execução da página
+                if st.button("Gerar arquivo para exportar"):
+                    arquivo = io.BytesIO()
+                    texto = io.TextIOWrapper(arquivo, encoding="utf-8", newline="", write_through=True)
+                    importacao.exportar(
+                        gestor.estado, tipo_arquivo, texto, formato_exportacao
+                    )
+                    texto.detach()
+                    st.download_button(
+                        "Baixar arquivo",
+                        data=arquivo.getvalue(),
+                        file_name=f"{tipo_arquivo}.{formato_exportacao}",
+                        mime="text/csv" if formato_exportacao == "csv" else "application/jsonl"
+                    )
             
-            if submit_button and nova_tarefa:
-                # Criar ID para a tarefa
-                task_id = f"back_{len(backlog) + 1}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+            # Formulário para adicionar nova tarefa ao backlog
+            with st.form(key="form_backlog"):
+                nova_tarefa = st.text_input("Nova tarefa para o backlog:")
                 
-                # Adicionar ao backlog
-                tarefa_nova = {
-                    "id": task_id,
-                    "descricao": nova_tarefa
-                }
+                # Seleção de projeto
+                projeto_options = ["Sem projeto"] + [p["nome"] for p in projetos]
+                projeto_selecionado = st.selectbox("Projeto:", projeto_options)
                 
-                # Adicionar projeto se selecionado
-                if projeto_selecionado != "Sem projeto":
-                    tarefa_nova["projeto"] = projeto_selecionado
+                submit_button = st.form_submit_button("Adicionar")
                 
-                backlog.append(tarefa_nova)
+                if submit_button and nova_tarefa:
+                    gestor.adicionar_backlog(nova_tarefa, None if projeto_selecionado == "Sem projeto" else projeto_selecionado)
+                    st.rerun()
+            
+            # Filtro de projeto para visualização
+            if projetos:
+                filtro_projeto = st.selectbox(
+                    "Filtrar por projeto:",
+                    ["Todos"] + [p["nome"] for p in projetos] + ["Sem projeto"],
+                    key="filtro_backlog"
+                )
                 
-                salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
-                st.rerun()
-        
-        # Filtro de projeto para visualização
-        if projetos:
-            filtro_projeto = st.selectbox(
-                "Filtrar por projeto:",
-                ["Todos"] + [p["nome"] for p in projetos] + ["Sem projeto"],
-                key="filtro_backlog"
-            )
+                projeto = {"Todos": False, "Sem projeto": None}.get(filtro_projeto, filtro_projeto)
+            else:
+                projeto = False
             
-            if filtro_projeto != "Todos":
-                if filtro_projeto == "Sem projeto":
-                    backlog_filtrado = [t for t in backlog if "projeto" not in t]
-                else:
-                    backlog_filtrado = [t for t in backlog if t.get("projeto") == filtro_projeto]
+            # Busca por texto, tolerante a erros de digitação
+            consulta = st.text_input("Buscar:", key="busca_backlog")
+            backlog_filtrado = gestor.buscar_backlog(consulta, projeto)
+            
+            # Listar tarefas do backlog
+            if not backlog_filtrado:
+                st.info("Não há tarefas no backlog com este filtro.")
             else:
-                backlog_filtrado = backlog
-        else:
-            backlog_filtrado = backlog
-        
-        # Listar tarefas do backlog
-        if not backlog_filtrado:
-            st.info("Não há tarefas no backlog com este filtro.")
-        else:
-            for i, tarefa in enumerate(backlog_filtrado):
-                col1, col2, col3 = st.columns([1.5, 0.3, 0.2])
+                ordem = st.selectbox(
+                    "Ordenar por:",
+                    ["Ordem de criação", "Descrição (A-Z)", "Descrição (Z-A)", "Projeto"],
+                    key="ordem_backlog"
+                )
                 
-                with col1:
-                    st.write(f"{i+1}. {tarefa['descricao']}")
+                if ordem == "Descrição (A-Z)":
+                    backlog_filtrado = sorted(backlog_filtrado, key=lambda t: t["descricao"].lower())
+                elif ordem == "Descrição (Z-A)":
+                    backlog_filtrado = sorted(backlog_filtrado, key=lambda t: t["descricao"].lower(), reverse=True)
+                elif ordem == "Projeto":
+                    # Tarefas sem projeto por último
+                    backlog_filtrado = sorted(backlog_filtrado, key=lambda t: ("projeto" not in t, t.get("projeto", "").lower()))
                 
-                with col2:
-                    if "projeto" in tarefa:
-                        st.write(f"📂 {tarefa['projeto']}")
-                    else:
-                        st.write("📂 Sem projeto")
-                
-                with col3:
-                    if st.button("Remover", key=f"rem_back_{i}"):
-                        # Encontrar o índice real no backlog completo
-                        idx_real = next((j for j, t in enumerate(backlog) if t["id"] == tarefa["id"]), None)
-                        if idx_real is not None:
-                            # Remover do backlog
-                            backlog.pop(idx_real)
-                            
-                            # Remover das tarefas do dia se estiver lá
-                            tarefas_dia["tarefas"] = [t for t in tarefas_dia["tarefas"] if t["id"] != tarefa["id"]]
-                            
-                            salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
-                            st.rerun()
-    
-    # Aba de projetos
-    elif aba == "Projetos":
-        st.header("Gerenciar Projetos")
+                pagina, inicio = paginar(backlog_filtrado, "pagina_backlog")
+                
+                for i, tarefa in enumerate(pagina, start=inicio):
+                    col1, col2, col3 = st.columns([1.5, 0.3, 0.2])
+                    
+                    with col1:
+                        st.write(f"{i+1}. {tarefa['descricao']}")
+                    
+                    with col2:
+                        if "projeto" in tarefa:
+                            st.write(f"📂 {tarefa['projeto']}")
+                        else:
+                            st.write("📂 Sem projeto")
+                    
+                    with col3:
+                        if st.button("Remover", key=f"rem_back_{tarefa['id']}"):
+                            if indice.tarefa(tarefa["id"]) is not None:
+                                gestor.remover_backlog(tarefa["id"])
+                                st.rerun()
         
-        # Formulário para adicionar novo projeto
-        with st.form(key="form_projeto"):
-            novo_projeto = st.text_input("Nome do novo projeto:")
-            submit_button = st.form_submit_button("Adicionar Projeto")
+        # Aba de projetos
+        elif aba == "Projetos":
+            st.header("Gerenciar Projetos")
             
-            if submit_button and novo_projeto:
-                # Verificar se já existe
-                if not any(p["nome"] == novo_projeto for p in projetos):
-                    # Adicionar à lista de projetos
-                    projetos.append({
-                        "id": f"proj_{len(projetos) + 1}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
-                        "nome": novo_projeto
-                    })
+            # Formulário para adicionar novo projeto
+            with st.form(key="form_projeto"):
+                novo_projeto = st.text_input("Nome do novo projeto:")
+                submit_button = st.form_submit_button("Adicionar Projeto")
+                
+                if submit_button and novo_projeto:
+                    try:
+                        gestor.adicionar_projeto(novo_projeto)
+                    except ValueError as erro:
+                        st.error(str(erro))
+                    else:
+                        st.rerun()
+            
+            # Listar projetos
+            if not projetos:
+                st.info("Não há projetos cadastrados.")
+            else:
+                st.subheader("Projetos Existentes")
+                for i, projeto in enumerate(projetos):
+                    col1, col2 = st.columns([1.8, 0.2])
                     
-                    salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
-                    st.rerun()
-                else:
-                    st.error("Já existe um projeto com este nome.")
-        
-        # Listar projetos
-        if not projetos:
-            st.info("Não há projetos cadastrados.")
-        else:
-            st.subheader("Projetos Existentes")
-            for i, projeto in enumerate(projetos):
-                col1, col2 = st.columns([1.8, 0.2])
-                
-                with col1:
-                    st.write(f"{i+1}. {projeto['nome']}")
-                
-                with col2:
-                    # Contagem de tarefas neste projeto
-                    count = sum(1 for t in backlog if t.get("projeto") == projeto["nome"])
-                    st.write(f"{count} tarefas")
-                
-                if st.button("Remover", key=f"rem_proj_{i}"):
-                    # Remover projeto e atualizar tarefas
-                    for tarefa in backlog:
-                        if tarefa.get("projeto") == projeto["nome"]:
-                            tarefa.pop("projeto", None)
+                    with col1:
+                        st.write(f"{i+1}. {projeto['nome']}")
                     
-                    projetos.pop(i)
-                    salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
-                    st.rerun()
-    
-    # Aba de estatísticas
-    elif aba == "Estatísticas":
-        st.header("Estatísticas")
-        
-        # Estatísticas gerais
-        col1, col2 = st.columns(2)
+                    with col2:
+                        # Contagem de tarefas neste projeto
+                        count = indice.contar_projeto(projeto["nome"])
+                        st.write(f"{count} tarefas")
+                    
+                    if st.button("Remover", key=f"rem_proj_{i}"):
+                        # Remover projeto; as tarefas dele ficam sem projeto
+                        gestor.remover_projeto(projeto["id"])
+                        st.rerun()
         
-        with col1:
-            # Total de tarefas no backlog
-            total_backlog = len(backlog)
-            st.metric(label="Tarefas no Backlog", value=total_backlog)
+        # Aba de estatísticas
+        elif aba == "Estatísticas":
+            st.header("Estatísticas")
+            # pandas e numpy (via analise) só são importados na primeira vez que
+            # uma aba usa tabelas: a partida do app não espera por eles
+            import pandas as pd
+            import analise
             
-            # Tarefas no backlog por projeto
-            if projetos:
-                st.subheader("Tarefas por Projeto")
-                dados_projetos = []
-                for projeto in projetos:
-                    count = sum(1 for t in backlog if t.get("projeto") == projeto["nome"])
-                    dados_projetos.append({"Projeto": projeto["nome"], "Tarefas": count})
-                
-                # Adicionar "Sem projeto"
-                count_sem_projeto = sum(1 for t in backlog if "projeto" not in t)
-                dados_projetos.append({"Projeto": "Sem projeto", "Tarefas": count_sem_projeto})
-                
-                df_projetos = pd.DataFrame(dados_projetos)
-                st.dataframe(df_projetos, use_container_width=True)
-        
-        with col2:
-            # Total geral de conclusões
-            total_geral = sum(len(info.get("datas", [])) for info in historico.values())
-            st.metric(label="Total de Tarefas Concluídas", value=total_geral)
+            # Contagens mantidas a cada conclusão: nada aqui percorre o histórico inteiro
+            contagens = gestor.agregados
             
-            # Tarefas concluídas hoje
-            tarefas_hoje = sum(1 for t in tarefas_dia["tarefas"] if t["concluida"])
-            total_tarefas_hoje = len(tarefas_dia["tarefas"])
-            st.metric(
-                label="Tarefas Concluídas Hoje",
-                value=f"{tarefas_hoje}/{total_tarefas_hoje}",
-                delta=f"{int(tarefas_hoje/total_tarefas_hoje*100)}%" if total_tarefas_hoje > 0 else "0%"
-            )
-        
-        # Estatísticas das tarefas recorrentes
-        if tarefas_recorrentes:
-            st.subheader("Desempenho de Tarefas Recorrentes")
+            # Estatísticas gerais
+            col1, col2 = st.columns(2)
             
-            # Tabela simplificada com os dados solicitados
-            dados_stats = []
-            for tarefa in tarefas_recorrentes:
-                info_tarefa = historico.get(tarefa["id"], {})
-                total = len(info_tarefa.get("datas", []))
-                sequencia = info_tarefa.get("sequencia_atual", 0)
-                recorde = info_tarefa.get("recorde_sequencia", 0)
-                
-                dados_stats.append({
-                    "Tarefa": tarefa["descricao"],
-                    "Total de Dias": total,
-                    "Dias Consecutivos": sequencia,
-                    "Recorde de Dias Consecutivos": recorde
-                })
+            with col1:
+                # Total de tarefas no backlog
+                total_backlog = len(backlog)
+                st.metric(label="Tarefas no Backlog", value=total_backlog)
+                
+                # Tarefas no backlog por projeto
+                if projetos:
+                    st.subheader("Tarefas por Projeto")
+                    df_projetos = pd.DataFrame(
+                        [{"Projeto": p["nome"], "Tarefas": indice.contar_projeto(p["nome"])} for p in projetos]
+                        + [{"Projeto": "Sem projeto", "Tarefas": indice.contar_projeto(None)}]
+                    )
+                    st.dataframe(df_projetos, use_container_width=True)
             
-            if dados_stats:
-                df_stats = pd.DataFrame(dados_stats)
+            with col2:
+                # Total geral de conclusões
+                total_geral = contagens.total
+                st.metric(label="Total de Tarefas Concluídas", value=total_geral)
+                
+                # Tarefas concluídas hoje
+                tarefas_hoje = sum(1 for t in tarefas_dia["tarefas"] if t["concluida"])
+                total_tarefas_hoje = len(tarefas_dia["tarefas"])
+                st.metric(
+                    label="Tarefas Concluídas Hoje",
+                    value=f"{tarefas_hoje}/{total_tarefas_hoje}",
+                    delta=f"{int(tarefas_hoje/total_tarefas_hoje*100)}%" if total_tarefas_hoje > 0 else "0%"
+                )
+            
+            # Estatísticas das tarefas recorrentes
+            if tarefas_recorrentes:
+                st.subheader("Desempenho de Tarefas Recorrentes")
+                
+                janelas = st.multiselect(
+                    "Janelas da taxa de conclusão (dias):",
+                    options=[7, 14, 30, 90, 365],
+                    default=[7, 30, 90]
+                )
+                
+                ids = [tarefa["id"] for tarefa in tarefas_recorrentes]
+                descricoes = [tarefa["descricao"] for tarefa in tarefas_recorrentes]
+                # Tarefas com regra: taxa sobre as ocorrências previstas, não sobre todos os dias
+                taxas = analise.taxa_conclusao(historico, ids, sorted(janelas),
+                                               regras={t["id"]: t.get("regra") for t in tarefas_recorrentes})
+                maiores = [servico.calcular_maior_sequencia(historico, t["id"], t.get("regra")) for t in tarefas_recorrentes]
+                
+                df_stats = pd.DataFrame({
+                    "Tarefa": descricoes,
+                    "Total de Dias": [contagens.total_da_tarefa(i) for i in ids],
+                    "Dias Consecutivos": [historico.get(i, {}).get("sequencia_atual", 0) for i in ids],
+                    "Maior Sequência no Histórico": maiores,
+                    # Recorde gravado (pode ter sido editado) ou a maior sequência real
+                    "Recorde de Dias Consecutivos": [
+                        max(historico.get(i, {}).get("recorde_sequencia", 0), maior) for i, maior in zip(ids, maiores)
+                    ],
+                })
+                for coluna in taxas.columns:
+                    df_stats[f"Taxa {coluna}"] = (taxas[coluna].to_numpy() * 100).round(1)
                 st.dataframe(df_stats, use_container_width=True)
-    
-    # Aba para editar sequências
-    elif aba == "Editar Sequências":
-        st.header("Editar Sequências de Tarefas")
+                
+                st.subheader("Conclusões por Dia da Semana")
+                mapa = analise.mapa_dias_semana(contagens, ids)
+                mapa.index = descricoes
+                st.dataframe(mapa, use_container_width=True)
+                
+                st.subheader("Conclusões nos Últimos 7 e 30 Dias")
+                curva = analise.curva_movel(contagens)
+                if curva.empty:
+                    st.info("Ainda não há conclusões registradas.")
+                else:
+                    st.line_chart(curva[["7 dias", "30 dias"]])
         
-        if not tarefas_recorrentes:
-            st.info("Não há tarefas recorrentes cadastradas.")
-        else:
-            st.write("Aqui você pode editar manualmente a sequência de dias consecutivos para tarefas que já vêm sendo realizadas há algum tempo.")
-            st.write("Use esta funcionalidade para registrar históricos anteriores ao uso do sistema.")
+        # Aba para editar sequências
+        elif aba == "Editar Sequências":
+            st.header("Editar Sequências de Tarefas")
             
-            for i, tarefa in enumerate(tarefas_recorrentes):
-                st.subheader(f"{i+1}. {tarefa['descricao']}")
-                
-                # Inicializar no histórico se não existir
-                if tarefa["id"] not in historico:
-                    historico[tarefa["id"]] = {
-                        "datas": [],
-                        "sequencia_atual": 0,
-                        "sequencia_editada": False,
-                        "recorde_sequencia": 0
-                    }
-                
-                info_tarefa = historico[tarefa["id"]]
-                sequencia_atual = info_tarefa.get("sequencia_atual", 0)
-                sequencia_editada = info_tarefa.get("sequencia_editada", False)
-                
-                col1, col2, col3 = st.columns([1, 1, 1])
-                
-                with col1:
-                    nova_sequencia = st.number_input(
-                        f"Sequência atual de dias consecutivos",
-                        min_value=0,
-                        value=sequencia_atual,
-                        step=1,
-                        key=f"edit_seq_{i}"
-                    )
+            if not tarefas_recorrentes:
+                st.info("Não há tarefas recorrentes cadastradas.")
+            else:
+                st.write("Aqui você pode editar manualmente a sequência de dias consecutivos para tarefas que já vêm sendo realizadas há algum tempo.")
+                st.write("Use esta funcionalidade para registrar históricos anteriores ao uso do sistema. Com \"Manual\" marcado, a sequência e o recorde digitados são gravados; desmarcado, a tarefa volta ao cálculo automático (e números digitados na mesma linha são descartados).")
                 
-                with col2:
-                    novo_recorde = st.number_input(
-                        f"Recorde de dias consecutivos",
-                        min_value=0,
-                        value=info_tarefa.get("recorde_sequencia", 0),
-                        step=1,
-                        key=f"edit_rec_{i}"
+                # Uma grade para todas as tarefas; ao salvar, só as linhas alteradas
+                # viram um único evento (ver servico.Gestor.editar_sequencias)
+                import pandas as pd
+
+                original = pd.DataFrame(
+                    [
+                        {
+                            "Tarefa": tarefa["descricao"],
+                            "Sequência": historico.get(tarefa["id"], {}).get("sequencia_atual", 0),
+                            "Recorde": historico.get(tarefa["id"], {}).get("recorde_sequencia", 0),
+                            "Manual": historico.get(tarefa["id"], {}).get("sequencia_editada", False),
+                        }
+                        for tarefa in tarefas_recorrentes
+                    ],
+                    index=[tarefa["id"] for tarefa in tarefas_recorrentes],
+                )
+                
+                with st.form(key="form_sequencias"):
+                    editado = st.data_editor(
+                        original,
+                        hide_index=True,
+                        disabled=["Tarefa"],
+                        column_config={
+                            "Sequência": st.column_config.NumberColumn("Sequência", min_value=0, step=1, required=True),
+                            "Recorde": st.column_config.NumberColumn("Recorde", min_value=0, step=1, required=True),
+                            "Manual": st.column_config.CheckboxColumn("Manual"),
+                        },
+                        use_container_width=True,
+                        # Nova chave depois de salvar: a grade recomeça dos valores gravados
+                        key=f"grade_sequencias_{st.session_state.get('versao_grade', 0)}",
                     )
+                    salvar = st.form_submit_button("Salvar alterações")
+                
+                if salvar:
+                    colunas = ["Sequência", "Recorde", "Manual"]
+                    mudou = (editado[colunas] != original[colunas]).any(axis=1)
+                    alteracoes = {}
+                    for tarefa_id, linha in editado[mudou].iterrows():
+                        # Sem "Manual", a sequência volta a ser calculada, mesmo que os números tenham mudado
+                        if not linha["Manual"]:
+                            alteracoes[tarefa_id] = {"automatica": True}
+                        else:
+                            alteracoes[tarefa_id] = {"sequencia_atual": int(linha["Sequência"]), "recorde_sequencia": int(linha["Recorde"])}
+                    try:
+                        alteradas = gestor.editar_sequencias(alteracoes)
+                    except ValueError as erro:
+                        st.error(str(erro))
+                    else:
+                        st.session_state["sequencias_salvas"] = alteradas
+                        st.session_state["versao_grade"] = st.session_state.get("versao_grade", 0) + 1
+                        st.rerun()
                 
-                with col3:
-                    if st.button("Salvar", key=f"save_seq_{i}"):
-                        historico[tarefa["id"]]["sequencia_atual"] = nova_sequencia
-                        historico[tarefa["id"]]["sequencia_editada"] = True
-                        historico[tarefa["id"]]["recorde_sequencia"] = novo_recorde
-                        st.success(f"Dados atualizados com sucesso!")
-                        salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
-                
-                # Botão para reset (voltar ao cálculo automático)
-                if sequencia_editada:
-                    if st.button("Voltar ao cálculo automático", key=f"reset_seq_{i}"):
-                        historico[tarefa["id"]]["sequencia_editada"] = False
-                        historico[tarefa["id"]]["sequencia_atual"] = calcular_sequencia(historico, tarefa["id"])
-                        st.success("Sequência voltou a ser calculada automaticamente.")
-                        salvar_dados(tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
-                
-                st.divider()
+                if "sequencias_salvas" in st.session_state:
+                    st.success(f"{st.session_state.pop('sequencias_salvas')} tarefa(s) atualizada(s).")
 
 # Executar a aplicação
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Enquanto a página inteira roda, os fragmentos usam o gestor já resolvido (ver gestor_do_fragmento)
+    st.session_state["execucao_completa"] = True
+    try:
+        if st.session_state.get("perfil_ativo"):
+            # Medição desta execução
+            with perfil.coletar("execução") as coleta:
+                try:
+                    main()
+                finally:
+                    guardar_execucao(coleta)
+        else:
+            main()
+    finally:
+        st.session_state["execucao_completa"] = False
\ No newline at end of file
@@ -0,0 +1,1370 @@
+import argparse
+import contextlib
+import datetime
+import functools
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import uuid
+
+import concorrencia
+import gravacao
+import perfil
+import sequencias
+
+# Coleções persistidas, na mesma ordem usada por carregar_dados/salvar_dados
+COLECOES = ("tarefas_recorrentes", "backlog", "historico", "tarefas_dia", "projetos")
+
+# Valor inicial de cada coleção quando ainda não existe nada salvo
+VALORES_PADRAO = {
+    "tarefas_recorrentes": [],
+    "backlog": [],
+    "historico": {},
+    "tarefas_dia": {"data": "", "tarefas": []},
+    "projetos": [],
+}
+
+
+# Cópia rápida para estruturas vindas de JSON (dicts, listas e valores simples)
+def copiar_estado(valor):
+    if isinstance(valor, dict):
+        return {chave: copiar_estado(item) for chave, item in valor.items()}
+    if isinstance(valor, list):
+        return [copiar_estado(item) for item in valor]
+    if isinstance(valor, tuple):
+        return tuple(copiar_estado(item) for item in valor)
+    if isinstance(valor, sequencias.Datas):
+        return valor.copia()
+    return valor
+
+
+# Base comum: agrupa várias chamadas de salvar em uma única gravação e
+# guarda, por sessão, o estado carregado (base para detectar o que ela mudou)
+class Armazenamento:
+    def __init__(self):
+        self._lote = threading.local()
+        self._sessao = threading.local()
+        # Contadores do cache de carga (acertos = coleções servidas sem reler o disco)
+        self.acertos = 0
+        self.falhas = 0
+        # Gravações em que outra sessão tinha alterado a mesma coleção
+        self.mesclagens = 0
+        # Gravação adiada (ver ativar_gravacao_adiada)
+        self.escritor = None
+        # Trava do diário nesta thread e descargas que esperam ela ser solta
+        self._travado = threading.local()
+        # A versão só sobe: depois de vista na atual, não é relida a cada carga
+        self._esquema_atual = False
+
+    def estatisticas_cache(self):
+        return {"acertos": self.acertos, "falhas": self.falhas}
+
+    @contextlib.contextmanager
+    def lote(self):
+        nivel = getattr(self._lote, "nivel", 0)
+        self._lote.nivel = nivel + 1
+        try:
+            yield self
+        except Exception:
+            # Erro no meio de uma alteração: não gravar um estado pela metade
+            if nivel == 0:
+                self._lote.pendente = None
+            raise
+        finally:
+            self._lote.nivel = nivel
+            # Interrupções do Streamlit (st.rerun, st.stop) também gravam
+            if nivel == 0:
+                pendente = getattr(self._lote, "pendente", None)
+                self._lote.pendente = None
+                if pendente is not None:
+                    self._gravar_sessao(*pendente)
+
+    def salvar(self, tarefas_recorrentes, backlog, historico, tarefas_dia, projetos):
+        estado = (tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
+        base = getattr(self._sessao, "base", None)
+        if getattr(self._lote, "nivel", 0) > 0:
+            self._lote.pendente = (estado, base)
+        else:
+            self._gravar_sessao(estado, base)
+
+    def _gravar_sessao(self, estado, base):
+        with perfil.trecho("gravar"):
+            self._sessao.base = self._gravar(estado, base)
+
+    # Base da sessão nesta thread: o que ela carregou ou gravou por último
+    def base(self):
+        return getattr(self._sessao, "base", None)
+
+    # Muda sempre que alguém grava; None quando não dá para saber sem reler tudo
+    def assinatura(self):
+        return None
+
+    # Diário de alterações (ver servico.Gestor): eventos numerados anexados um a
+    # um e, no estado salvo, o número do último evento que ele já inclui.
+    # Os backends implementam _trava_diario, seq_snapshot, eventos_desde,
+    # anexar_evento e _marcar_snapshot.
+    # A base é passada por quem mantém o estado entre execuções (que podem rodar
+    # em threads diferentes); devolve a nova base. Com a gravação adiada, o
+    # snapshot vai para a fila do escritor, a não ser que imediata=True (quando
+    # o estado tem alterações que não estão em nenhum evento).
+    # Os agregados (ver agregados.py), marcados com o seq, são gravados antes
+    # do estado: quem ler um estado novo nunca lê agregados antigos com o
+    # mesmo seq do snapshot.
+    def compactar(self, estado, seq, base, imediata=False, agregados=None):
+        # Lido uma vez: fechar() pode trocá-lo por None em outra thread
+        escritor = self.escritor
+        if escritor is not None and not imediata:
+            escritor.snapshot(copiar_estado(estado), seq, agregados)
+            return base
+        if agregados is not None:
+            self.gravar_agregados(agregados)
+        with perfil.trecho("gravar"):
+            base = self._gravar(estado, base)
+        self._marcar_snapshot(seq)
+        self._gravar_binario()
+        self._arquivar_diario(seq - EVENTOS_MANTIDOS)
+        return base
+
+    # Trava do diário (entre processos). A de arquivo não é reentrante: uma
+    # descarga pedida enquanto esta thread a segura (escritor já parado, ver
+    # gravacao.Escritor) fica para quando ela for solta, já que gravar o
+    # snapshot precisa da trava de novo
+    @contextlib.contextmanager
+    def trava_diario(self):
+        self._travado.nivel = getattr(self._travado, "nivel", 0) + 1
+        try:
+            with self._trava_diario():
+                yield
+        finally:
+            self._travado.nivel -= 1
+            if self._travado.nivel == 0:
+                pendentes = getattr(self._travado, "descargas", None) or []
+                self._travado.descargas = None
+                for escritor in pendentes:
+                    escritor.descarregar()
+
+    def _trava_diario(self):
+        return contextlib.nullcontext()
+
+    # Se esta thread segura a trava do diário
+    def com_trava_diario(self):
+        return getattr(self._travado, "nivel", 0) > 0
+
+    # Descarga do escritor feita nesta thread, mas só fora da trava do diário
+    def descarregar_fora_da_trava(self, escritor):
+        if not self.com_trava_diario():
+            escritor.descarregar()
+            return
+        pendentes = getattr(self._travado, "descargas", None) or []
+        if escritor not in pendentes:
+            pendentes.append(escritor)
+        self._travado.descargas = pendentes
+
+    # Snapshot gravado pelo escritor. Com a trava do diário, para nenhuma
+    # compactação acontecer no meio; a base é o que está em disco agora, já
+    # que outras sessões podem ter compactado depois de o snapshot entrar na fila
+    def gravar_snapshot_adiado(self, estado, seq, agregados=None):
+        with self.trava_diario():
+            if self.seq_snapshot() >= seq:
+                return
+            self.carregar()
+            if agregados is not None:
+                self.gravar_agregados(agregados)
+            self._gravar(estado, self.base())
+            self._marcar_snapshot(seq)
+            self._gravar_binario()
+            self._arquivar_diario(seq - EVENTOS_MANTIDOS)
+
+    # Versão do formato dos dados (ver VERSAO_ESQUEMA)
+    def esquema(self):
+        if self._esquema_atual:
+            return VERSAO_ESQUEMA
+        versao = self._ler_esquema()
+        self._esquema_atual = versao >= VERSAO_ESQUEMA
+        return versao
+
+    def _ler_esquema(self):
+        return 0
+
+    def marcar_esquema(self, versao):
+        pass
+
+    # Agregados gravados com o último snapshot; None se não houver
+    def ler_agregados(self):
+        return None
+
+    def gravar_agregados(self, agregados):
+        pass
+
+    # Grava em segundo plano (ver gravacao.Escritor)
+    def ativar_gravacao_adiada(self, janela=gravacao.JANELA_PADRAO):
+        if self.escritor is None:
+            self.escritor = gravacao.Escritor(self, janela)
+        return self.escritor
+
+    # Atraso de durabilidade da gravação adiada; None quando a gravação é imediata
+    def metricas_gravacao(self):
+        return self.escritor.metricas() if self.escritor is not None else None
+
+    # Garante em disco os eventos já escritos no diário
+    def sincronizar_diario(self):
+        pass
+
+    # Bytes em disco do que está no cache de carga (aproxima a memória ocupada)
+    def tamanho_cache(self):
+        return 0
+
+    def _limpar_cache(self):
+        pass
+
+    # Armazenamento que sai de uso (ex.: espaço de trabalho fora do cache):
+    # grava o pendente e libera o cache; continua utilizável, relendo do disco
+    def fechar(self):
+        escritor, self.escritor = self.escritor, None
+        if escritor is not None:
+            escritor.parar()
+        self._limpar_cache()
+
+    # Eventos já incluídos no snapshot que podem sair do diário lido na carga
+    def _arquivar_diario(self, ate):
+        pass
+
+    # Cópia binária do snapshot, para a próxima carga (ver ArmazenamentoJSON)
+    def _gravar_binario(self):
+        pass
+
+
+# Eventos anteriores ao snapshot que continuam no diário, para poderem ser desfeitos
+EVENTOS_MANTIDOS = 50
+
+
+# Grava um arquivo JSON de forma atômica (arquivo temporário + rename)
+def gravar_json_atomico(caminho, valor):
+    gravar_atomico(caminho, lambda f: json.dump(valor, f))
+
+
+# Um objeto JSON por linha, também de forma atômica
+def gravar_jsonl_atomico(caminho, valores):
+    def escrever(f):
+        for valor in valores:
+            f.write(json.dumps(valor, ensure_ascii=False))
+            f.write("\n")
+    gravar_atomico(caminho, escrever)
+
+
+def gravar_atomico(caminho, escrever, binario=False):
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    descritor, temporario = tempfile.mkstemp(dir=pasta, prefix=f".{os.path.basename(caminho)}.", suffix=".tmp")
+    try:
+        with (os.fdopen(descritor, "wb") if binario else os.fdopen(descritor, "w", encoding="utf-8")) as f:
+            escrever(f)
+            f.flush()
+            os.fsync(f.fileno())
+            perfil.contar("bytes_gravados", f.tell())
+        os.replace(temporario, caminho)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temporario)
+        raise
+
+
+# Assinatura de um arquivo: muda sempre que ele é regravado
+def assinatura_arquivo(caminho):
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size, info.st_ino)
+
+
+# Ler o arquivo de versões; sem ele, todas as coleções estão na versão 0
+def ler_versoes(caminho):
+    try:
+        with open(caminho, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+# Formato do historico.json com as datas em segmentos anuais
+FORMATO_HISTORICO = 2
+
+# Versão do formato dos dados, gravada junto com eles. Dados sem versão (0)
+# podem ter entradas do histórico nos formatos antigos e são convertidos a
+# cada leitura, até rodar a migração (python migracao.py); na versão atual a
+# carga não confere formato nenhum. Espaços novos já nascem na versão atual.
+VERSAO_ESQUEMA = 1
+
+# Formato do estado.bin (ver ArmazenamentoJSON.snapshot_binario)
+FORMATO_BINARIO = 1
+
+
+# Entrada de uma tarefa no índice do historico.json: tudo menos as datas,
+# que ficam nos segmentos, mais o resumo de cada ano
+def _resumo_da_tarefa(info, datas):
+    resumo = {chave: valor for chave, valor in info.items() if chave != "datas"}
+    resumo["anos"] = {str(ano): list(datas.resumos[ano]) for ano in datas.anos()}
+    return resumo
+
+
+# Armazenamento original: um arquivo JSON por coleção.
+# Cada coleção tem um número de versão (versoes.json). Ao salvar, se outra
+# sessão gravou a coleção depois que esta a carregou, as alterações desta
+# sessão são mescladas sobre o que está em disco; a troca só acontece se as
+# versões não mudaram desde a mescla (senão, tenta de novo). A trava entre
+# processos cobre só a gravação, e leituras nunca esperam por ela.
+#
+# As datas do histórico ficam fora do historico.json: em cada ano, os blocos de
+# dias consecutivos de todas as tarefas vão para um segmento historico/AAAA.*.json
+# que nunca é alterado depois de escrito (uma gravação cria outro e o
+# historico.json passa a apontar para ele). Só o segmento do ano atual é lido na
+# carga; os outros, quando alguém precisa deles. Gravar uma conclusão reescreve
+# o historico.json (resumos por tarefa) e o segmento do ano atual. Um segmento
+# antigo só é apagado quando nenhum processo o reserva mais: cada um lista em
+# historico/reservas os segmentos que as sessões dele ainda podem ler.
+#
+# Com snapshot_binario, cada compactação grava também estado.bin: o valor já
+# lido e preparado de cada coleção (pickle), com a assinatura do arquivo JSON
+# correspondente. A carga usa dele as coleções cujo arquivo não mudou desde
+# então, sem decodificar o JSON; as outras são lidas do JSON como sempre. Os
+# JSON continuam sendo os dados; o estado.bin pode ser apagado a qualquer hora.
+# O pickle executa código ao ser lido: só serve para a pasta de dados do app.
+class ArmazenamentoJSON(Armazenamento):
+    TENTATIVAS = 5
+
+    def __init__(self, raiz=".", snapshot_binario=False):
+        super().__init__()
+        self.raiz = raiz
+        self.snapshot_binario = snapshot_binario
+        # Cache por coleção: (assinatura do arquivo, valor já preparado, versão,
+        # valor em pickle ou None). Os valores em cache nunca são alterados, só
+        # substituídos; com o pickle, as cópias entregues saem dele.
+        self._cache = {}
+        self._preparar = {}
+        self._trava = threading.Lock()
+        # Segmentos do histórico já lidos: nome -> ({tarefa: blocos}, bytes). Não mudam em disco.
+        self._segmentos = {}
+        # Segmentos do historico.json atual: (assinatura do arquivo, {ano: nome})
+        self._indice_segmentos = None
+        # Último diário lido: (assinatura do arquivo, eventos)
+        self._diario = None
+        # Últimos agregados lidos: (assinatura do arquivo, valor)
+        self._agregados = None
+        # Último estado.bin lido: (assinatura do arquivo, conteúdo)
+        self._binario = None
+        # Últimos agregados gravados, em pickle: (assinatura do arquivo, pickle)
+        self._agregados_gravados = None
+
+    def caminho(self, colecao):
+        return os.path.join(self.raiz, f"{colecao}.json")
+
+    def pasta_historico(self):
+        return os.path.join(self.raiz, "historico")
+
+    def _segmento(self, nome):
+        with self._trava:
+            em_cache = self._segmentos.get(nome)
+        if em_cache is not None:
+            return em_cache[0]
+
+        caminho = os.path.join(self.pasta_historico(), nome)
+        with perfil.trecho(f"ler segmento {nome}"):
+            with open(caminho, "r") as f:
+                bruto = json.load(f)
+            tamanho = os.path.getsize(caminho)
+            perfil.contar("bytes_lidos", tamanho)
+        segmento = {
+            tarefa_id: tuple((sequencias.dia_para_inteiro(inicio), comprimento) for inicio, comprimento in blocos)
+            for tarefa_id, blocos in bruto.items()
+        }
+        with self._trava:
+            self._segmentos[nome] = (segmento, tamanho)
+        return segmento
+
+    # Leitor das Datas: blocos de uma tarefa num ano e o segmento de onde vieram.
+    # Se o segmento já foi apagado (a sessão ficou num snapshot antigo), o ano
+    # vem do snapshot atual; a próxima sincronização da sessão relê tudo.
+    def _blocos_do_segmento(self, tarefa_id, ano, nome):
+        for _ in range(self.TENTATIVAS):
+            try:
+                return self._segmento(nome).get(tarefa_id, ()), nome
+            except FileNotFoundError:
+                nome = self._segmentos_atuais().get(ano)
+                if nome is None:
+                    return (), None
+        return self._segmento(nome).get(tarefa_id, ()), nome
+
+    def _segmentos_atuais(self):
+        caminho = self.caminho("historico")
+        assinatura = assinatura_arquivo(caminho)
+        with self._trava:
+            if self._indice_segmentos is not None and self._indice_segmentos[0] == assinatura:
+                return self._indice_segmentos[1]
+        with open(caminho, "r") as f:
+            segmentos = {int(ano): nome for ano, nome in json.load(f).get("segmentos", {}).items()}
+        self._reservar_segmentos(segmentos.values())
+        with self._trava:
+            self._indice_segmentos = (assinatura, segmentos)
+        return segmentos
+
+    # Atualiza a reserva deste processo: os segmentos ainda usados pelas Datas
+    # vivas, mais os que estão para ser lidos. Retorna o que foi reservado.
+    def _reservar_segmentos(self, lendo=()):
+        reserva = concorrencia.reserva(os.path.join(self.pasta_historico(), "reservas"))
+        reservados = sequencias.segmentos_em_uso() | set(lendo)
+        reserva.gravar(reservados)
+        return reservados
+
+    # historico.json no formato com segmentos; no formato antigo, volta como está
+    def _abrir_historico(self, bruto):
+        if not isinstance(bruto, dict) or bruto.get("formato") != FORMATO_HISTORICO:
+            return bruto
+
+        segmentos = {int(ano): nome for ano, nome in bruto["segmentos"].items()}
+        self._reservar_segmentos(segmentos.values())
+        ano_atual = datetime.date.today().year
+        try:
+            atual = self._segmento(segmentos[ano_atual]) if ano_atual in segmentos else {}
+        except FileNotFoundError:
+            # Outro processo gravou e apagou o segmento depois deste índice ser
+            # lido: o ano atual fica para o leitor, que busca o snapshot novo
+            atual = None
+
+        historico = {}
+        for tarefa_id, info in bruto["tarefas"].items():
+            info = dict(info)
+            resumos = {int(ano): tuple(resumo) for ano, resumo in info.pop("anos", {}).items()}
+            carregados = {ano_atual: atual.get(tarefa_id, ())} if ano_atual in resumos and atual is not None else {}
+            info["datas"] = sequencias.Datas(
+                carregados, resumos, {ano: segmentos[ano] for ano in resumos},
+                leitor=functools.partial(self._blocos_do_segmento, tarefa_id),
+            )
+            historico[tarefa_id] = info
+        return historico
+
+    # Grava os segmentos dos anos alterados e depois o historico.json.
+    # Retorna o histórico como ficou em disco, para o cache.
+    def _gravar_historico(self, historico, geracao):
+        gravado = {}
+        origens_por_ano = {}
+        for tarefa_id, info in historico.items():
+            info = copiar_estado(info) if isinstance(info, dict) else {"datas": info}
+            if not isinstance(info.get("datas"), sequencias.Datas):
+                info["datas"] = sequencias.Datas.de_lista(info.get("datas", []))
+            gravado[tarefa_id] = info
+            for ano in info["datas"].resumos:
+                origens_por_ano.setdefault(ano, set()).add(info["datas"].origens.get(ano))
+
+        pasta = self.pasta_historico()
+        os.makedirs(pasta, exist_ok=True)
+        segmentos = {}
+        for ano, origens in sorted(origens_por_ano.items()):
+            # Ano sem alterações, todo vindo do mesmo segmento: continua nele
+            if len(origens) == 1 and None not in origens:
+                segmentos[ano] = origens.pop()
+                continue
+            conteudo = {
+                tarefa_id: [[sequencias.inteiro_para_dia(inicio), comprimento] for inicio, comprimento in info["datas"].blocos(ano)]
+                for tarefa_id, info in gravado.items()
+                if info["datas"].resumos.get(ano, (0,))[0]
+            }
+            if not conteudo:
+                continue
+            # Nome único: um segmento nunca é sobrescrito
+            nome = f"{ano}.{geracao}.{uuid.uuid4().hex[:8]}.json"
+            gravar_json_atomico(os.path.join(pasta, nome), conteudo)
+            segmentos[ano] = nome
+
+        tarefas = {}
+        for tarefa_id, info in gravado.items():
+            datas = info["datas"].com_origens(segmentos)
+            info["datas"] = datas
+            tarefas[tarefa_id] = _resumo_da_tarefa(info, datas)
+
+        self._gravar_indice_historico(segmentos, tarefas)
+        return gravado
+
+    # Segmentos de um histórico que chega uma tarefa por vez (ex.: a migração):
+    # os blocos de cada tarefa vão direto para os segmentos dos anos dela,
+    # abertos até o fim, e só o resumo fica em memória. Todos os anos ganham
+    # segmentos novos. Retorna (segmentos, resumos) para _gravar_indice_historico.
+    def _gravar_segmentos_aos_poucos(self, entradas, geracao):
+        pasta = self.pasta_historico()
+        os.makedirs(pasta, exist_ok=True)
+        # ano -> [arquivo, temporário, nome, tarefas já escritas]
+        abertos = {}
+        tarefas = {}
+        try:
+            for tarefa_id, info in entradas:
+                info = dict(info) if isinstance(info, dict) else {"datas": info}
+                datas = info.get("datas", [])
+                if not isinstance(datas, sequencias.Datas):
+                    datas = sequencias.Datas.de_lista(datas)
+                for ano in datas.anos():
+                    if ano not in abertos:
+                        nome = f"{ano}.{geracao}.{uuid.uuid4().hex[:8]}.json"
+                        descritor, temporario = tempfile.mkstemp(dir=pasta, prefix=f".{nome}.", suffix=".tmp")
+                        abertos[ano] = [os.fdopen(descritor, "w", encoding="utf-8"), temporario, nome, 0]
+                    aberto = abertos[ano]
+                    blocos = [[sequencias.inteiro_para_dia(inicio), comprimento] for inicio, comprimento in datas.blocos(ano)]
+                    aberto[0].write(("{" if not aberto[3] else ", ") + f"{json.dumps(tarefa_id)}: {json.dumps(blocos)}")
+                    aberto[3] += 1
+                tarefas[tarefa_id] = _resumo_da_tarefa(info, datas)
+
+            # Cada segmento só aparece com o nome final depois de completo em disco
+            segmentos = {}
+            for ano, (arquivo, temporario, nome, _) in sorted(abertos.items()):
+                arquivo.write("}")
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+                perfil.contar("bytes_gravados", arquivo.tell())
+                arquivo.close()
+                os.replace(temporario, os.path.join(pasta, nome))
+                segmentos[ano] = nome
+        except BaseException:
+            for arquivo, temporario, _, _ in abertos.values():
+                arquivo.close()
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(temporario)
+            raise
+        return segmentos, tarefas
+
+    # historico.json com o formato como primeira chave (a migração lê só ela
+    # para saber o formato); depois, os segmentos que deixaram de ser usados
+    def _gravar_indice_historico(self, segmentos, tarefas):
+        gravar_json_atomico(self.caminho("historico"), {
+            "formato": FORMATO_HISTORICO,
+            "segmentos": {str(ano): nome for ano, nome in segmentos.items()},
+            "tarefas": tarefas,
+        })
+        self._descartar_segmentos(set(segmentos.values()))
+
+    # Apaga os segmentos que ninguém mais usa: nem o índice gravado (em_uso), nem
+    # as sessões deste processo, nem as dos outros processos (pelas reservas deles)
+    def _descartar_segmentos(self, em_uso):
+        self._reservar_segmentos()
+        reservados = concorrencia.nomes_reservados(os.path.join(self.pasta_historico(), "reservas"))
+        if reservados is None:
+            return
+        em_uso = set(em_uso) | reservados
+        with os.scandir(self.pasta_historico()) as entradas:
+            descartados = [entrada for entrada in entradas if entrada.name.endswith(".json") and entrada.name not in em_uso]
+        for entrada in descartados:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(entrada.path)
+            with self._trava:
+                self._segmentos.pop(entrada.name, None)
+
+    def caminho_versoes(self):
+        return os.path.join(self.raiz, "versoes.json")
+
+    # Não alterar o valor devolvido: fica em cache até o arquivo mudar
+    def ler_agregados(self):
+        caminho = os.path.join(self.raiz, "agregados.json")
+        assinatura = assinatura_arquivo(caminho)
+        if assinatura is None:
+            return None
+        with self._trava:
+            if self._agregados is not None and self._agregados[0] == assinatura:
+                return self._agregados[1]
+        salvo = self._ler_binario().get("agregados")
+        if salvo is not None and salvo[0] == assinatura:
+            agregados = pickle.loads(salvo[1])
+            with self._trava:
+                self._agregados = (assinatura, agregados)
+            return agregados
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                agregados = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        perfil.contar("bytes_lidos", assinatura[1])
+        with self._trava:
+            self._agregados = (assinatura, agregados)
+        return agregados
+
+    def gravar_agregados(self, agregados):
+        caminho = os.path.join(self.raiz, "agregados.json")
+        gravar_json_atomico(caminho, agregados)
+        if self.snapshot_binario:
+            # Para o estado.bin da compactação em andamento (ver _gravar_binario)
+            with self._trava:
+                self._agregados_gravados = (assinatura_arquivo(caminho), pickle.dumps(agregados, pickle.HIGHEST_PROTOCOL))
+
+    def tamanho_cache(self):
+        with self._trava:
+            tamanho = sum(entrada[0][1] for entrada in self._cache.values())
+            tamanho += sum(bytes_segmento for _, bytes_segmento in self._segmentos.values())
+            for em_cache in (self._diario, self._agregados, self._binario):
+                if em_cache is not None and em_cache[0] is not None:
+                    tamanho += em_cache[0][1]
+        return tamanho
+
+    def _limpar_cache(self):
+        with self._trava:
+            self._cache = {}
+            self._segmentos = {}
+            self._diario = None
+            self._agregados = None
+            self._binario = None
+            self._agregados_gravados = None
+
+    def assinatura(self):
+        return tuple(assinatura_arquivo(self.caminho(colecao)) for colecao in COLECOES)
+
+    def caminho_binario(self):
+        return os.path.join(self.raiz, "estado.bin")
+
+    # Conteúdo do estado.bin: {"colecoes": {colecao: (assinatura, versão, pickle)},
+    # "agregados": (assinatura, pickle)}; vazio se desligado, ausente ou ilegível
+    def _ler_binario(self):
+        if not self.snapshot_binario:
+            return {}
+        caminho = self.caminho_binario()
+        assinatura = assinatura_arquivo(caminho)
+        if assinatura is None:
+            return {}
+        with self._trava:
+            if self._binario is not None and self._binario[0] == assinatura:
+                return self._binario[1]
+        try:
+            with perfil.trecho("ler estado.bin"):
+                with open(caminho, "rb") as f:
+                    conteudo = f.read()
+                perfil.contar("bytes_lidos", len(conteudo))
+                # Os valores continuam em pickle: só as coleções usadas são abertas
+                binario = pickle.loads(conteudo)
+        except FileNotFoundError:
+            return {}
+        except (pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError):
+            binario = {}
+        if not isinstance(binario, dict) or binario.get("formato") != FORMATO_BINARIO:
+            binario = {}
+        with self._trava:
+            self._binario = (assinatura, binario)
+        return binario
+
+    # Valor de uma coleção a partir do pickle; o histórico volta a ler os
+    # outros anos dos segmentos, como o aberto do JSON (ver _abrir_historico)
+    def _abrir_binario(self, colecao, dados):
+        valor = pickle.loads(dados)
+        if colecao == "historico":
+            for tarefa_id, info in valor.items():
+                if isinstance(info, dict) and isinstance(info.get("datas"), sequencias.Datas):
+                    info["datas"].ligar_leitor(functools.partial(self._blocos_do_segmento, tarefa_id))
+        return valor
+
+    # Depois de uma compactação: o que está no cache e ainda é o conteúdo dos
+    # arquivos (outra sessão pode ter gravado depois) vai para o estado.bin
+    def _gravar_binario(self):
+        if not self.snapshot_binario:
+            return
+        with self._trava:
+            entradas = dict(self._cache)
+            gravados = self._agregados_gravados
+            lidos = self._agregados
+        binario = {"formato": FORMATO_BINARIO, "colecoes": {}}
+        with perfil.trecho("gravar estado.bin"):
+            for colecao, (assinatura, valor, versao, dados) in entradas.items():
+                # Valores migrados na leitura dependem de quem lê
+                if colecao in self._preparar or assinatura != assinatura_arquivo(self.caminho(colecao)):
+                    continue
+                if dados is None:
+                    dados = pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+                binario["colecoes"][colecao] = (assinatura, versao, dados)
+            assinatura_agregados = assinatura_arquivo(os.path.join(self.raiz, "agregados.json"))
+            if gravados is not None and gravados[0] == assinatura_agregados:
+                binario["agregados"] = gravados
+            elif lidos is not None and lidos[0] == assinatura_agregados:
+                binario["agregados"] = (lidos[0], pickle.dumps(lidos[1], pickle.HIGHEST_PROTOCOL))
+            conteudo = pickle.dumps(binario, pickle.HIGHEST_PROTOCOL)
+            gravar_atomico(self.caminho_binario(), lambda f: f.write(conteudo), binario=True)
+
+    # Diário: diario.jsonl com os eventos recentes; os já compactados há tempo
+    # vão para diario_arquivo.jsonl, que nunca é lido na carga
+    def caminho_diario(self):
+        return os.path.join(self.raiz, "diario.jsonl")
+
+    def _trava_diario(self):
+        return concorrencia.trava_processos(os.path.join(self.raiz, ".diario.lock"))
+
+    def seq_snapshot(self):
+        return ler_versoes(self.caminho_versoes()).get("diario", 0)
+
+    def _ler_esquema(self):
+        return ler_versoes(self.caminho_versoes()).get("esquema", 0)
+
+    def marcar_esquema(self, versao):
+        caminho_versoes = self.caminho_versoes()
+        with concorrencia.trava_processos(concorrencia.caminho_trava(self.raiz)):
+            versoes = ler_versoes(caminho_versoes)
+            versoes["esquema"] = versao
+            gravar_json_atomico(caminho_versoes, versoes)
+        self._esquema_atual = versao >= VERSAO_ESQUEMA
+
+    def _ler_diario(self):
+        caminho = self.caminho_diario()
+        assinatura = assinatura_arquivo(caminho)
+        if assinatura is None:
+            return []
+        with self._trava:
+            if self._diario is not None and self._diario[0] == assinatura:
+                return self._diario[1]
+
+        eventos = []
+        with perfil.trecho("ler diario"):
+            with open(caminho, "rb") as f:
+                conteudo = f.read()
+            perfil.contar("bytes_lidos", len(conteudo))
+            for linha in conteudo.splitlines():
+                try:
+                    eventos.append(json.loads(linha))
+                except ValueError:
+                    # Linha cortada por uma queda no meio da gravação
+                    continue
+        with self._trava:
+            self._diario = (assinatura, eventos)
+        return eventos
+
+    # Cópias: quem recebe os eventos pode guardá-los no estado
+    def eventos_desde(self, seq):
+        return [copiar_estado(evento) for evento in self._ler_diario() if evento["seq"] > seq]
+
+    # Com a gravação adiada, o fsync fica para o escritor
+    def anexar_evento(self, evento):
+        linha = (json.dumps(evento, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.caminho_diario(), "a+b") as f:
+            # Depois de uma linha cortada, começar uma nova
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    linha = b"\n" + linha
+            f.write(linha)
+            f.flush()
+            escritor = self.escritor
+            if escritor is None:
+                os.fsync(f.fileno())
+        perfil.contar("bytes_gravados", len(linha))
+        if escritor is not None:
+            escritor.evento_escrito()
+
+    def sincronizar_diario(self):
+        with contextlib.suppress(FileNotFoundError):
+            with open(self.caminho_diario(), "r+b") as f:
+                os.fsync(f.fileno())
+
+    def _marcar_snapshot(self, seq):
+        caminho_versoes = self.caminho_versoes()
+        with concorrencia.trava_processos(concorrencia.caminho_trava(self.raiz)):
+            versoes = ler_versoes(caminho_versoes)
+            versoes["diario"] = seq
+            gravar_json_atomico(caminho_versoes, versoes)
+
+    def _arquivar_diario(self, ate):
+        eventos = self._ler_diario()
+        antigos = [evento for evento in eventos if evento["seq"] <= ate]
+        if not antigos:
+            return
+        # Primeiro o arquivo morto: uma queda no meio repete eventos lá, mas não perde nenhum
+        with open(os.path.join(self.raiz, "diario_arquivo.jsonl"), "a", encoding="utf-8") as f:
+            for evento in antigos:
+                f.write(json.dumps(evento, ensure_ascii=False))
+                f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        gravar_jsonl_atomico(self.caminho_diario(), [evento for evento in eventos if evento["seq"] > ate])
+
+    # Entradas do cache para as coleções pedidas, relendo só os arquivos alterados
+    def _entradas(self, colecoes):
+        assinaturas = {}
+        criadas = 0
+        for colecao in colecoes:
+            caminho = self.caminho(colecao)
+            assinatura = assinatura_arquivo(caminho)
+            # Verificar se o arquivo existe
+            if assinatura is None:
+                gravar_json_atomico(caminho, VALORES_PADRAO[colecao])
+                assinatura = assinatura_arquivo(caminho)
+                criadas += 1
+            assinaturas[colecao] = assinatura
+        # Espaço novo (nenhum arquivo existia): já está na versão atual
+        if criadas == len(COLECOES):
+            self.marcar_esquema(VERSAO_ESQUEMA)
+
+        entradas = {}
+        with self._trava:
+            for colecao in colecoes:
+                em_cache = self._cache.get(colecao)
+                if em_cache is not None and em_cache[0] == assinaturas[colecao]:
+                    self.acertos += 1
+                    entradas[colecao] = em_cache
+
+        faltando = [colecao for colecao in colecoes if colecao not in entradas]
+        if faltando:
+            # Versões lidas antes dos arquivos: o valor lido é no mínimo tão novo quanto a versão
+            versoes = ler_versoes(self.caminho_versoes())
+            binario = self._ler_binario().get("colecoes", {})
+            for colecao in faltando:
+                self.falhas += 1
+                salvo = binario.get(colecao)
+                # Do estado.bin, com a versão de quando ele foi gravado, se o arquivo não mudou desde então
+                if salvo is not None and salvo[0] == assinaturas[colecao] and colecao not in self._preparar:
+                    with perfil.trecho(f"abrir {colecao} do estado.bin"):
+                        entradas[colecao] = (assinaturas[colecao], self._abrir_binario(colecao, salvo[2]), salvo[1], salvo[2])
+                    with self._trava:
+                        self._cache[colecao] = entradas[colecao]
+                    continue
+                with perfil.trecho(f"ler {colecao}"):
+                    with open(self.caminho(colecao), "r") as f:
+                        valor = json.load(f)
+                    perfil.contar("bytes_lidos", assinaturas[colecao][1])
+                    if colecao == "historico":
+                        valor = self._abrir_historico(valor)
+                if colecao in self._preparar:
+                    with perfil.trecho(f"migrar {colecao}"):
+                        valor = self._preparar[colecao](valor)
+                entradas[colecao] = (assinaturas[colecao], valor, versoes.get(colecao, 0), None)
+                with self._trava:
+                    self._cache[colecao] = entradas[colecao]
+        return entradas
+
+    # preparar: funções por coleção aplicadas só quando o arquivo é relido (ex.: migrações)
+    def carregar(self, preparar=None):
+        if preparar is not None:
+            self._preparar = preparar
+        entradas = self._entradas(COLECOES)
+        self._sessao.base = {colecao: (entradas[colecao][2], entradas[colecao][1]) for colecao in COLECOES}
+        # O valor em cache nunca é entregue diretamente, pois quem chama o altera
+        return tuple(
+            copiar_estado(entradas[colecao][1]) if entradas[colecao][3] is None
+            else self._abrir_binario(colecao, entradas[colecao][3])
+            for colecao in COLECOES
+        )
+
+    # Decide o que gravar: o valor da sessão ou a mescla dele com o que está em disco
+    def _planejar(self, estado, base, versoes):
+        plano = {}
+        for colecao, valor in zip(COLECOES, estado):
+            if base is None:
+                # Sem base (ex.: importação): comparar com o que está em disco
+                if self._entradas([colecao])[colecao][1] != valor:
+                    plano[colecao] = (valor, False)
+                continue
+
+            versao_base, valor_base = base[colecao]
+            if valor == valor_base:
+                continue
+            if versoes.get(colecao, 0) == versao_base:
+                plano[colecao] = (valor, False)
+            else:
+                deles = self._entradas([colecao])[colecao][1]
+                plano[colecao] = (concorrencia.mesclar(colecao, valor_base, valor, deles), True)
+        return plano
+
+    def _gravar(self, estado, base):
+        caminho_versoes = self.caminho_versoes()
+        for tentativa in range(self.TENTATIVAS):
+            ultima = tentativa == self.TENTATIVAS - 1
+            versoes = ler_versoes(caminho_versoes)
+            plano = None if ultima else self._planejar(estado, base, versoes)
+            if plano == {}:
+                return base
+
+            with concorrencia.trava_processos(concorrencia.caminho_trava(self.raiz)):
+                atuais = ler_versoes(caminho_versoes)
+                if ultima:
+                    # Muitas disputas seguidas: planejar já com a trava, sem mais tentativas
+                    versoes = atuais
+                    plano = self._planejar(estado, base, versoes)
+                elif any(atuais.get(colecao, 0) != versoes.get(colecao, 0) for colecao in plano):
+                    continue
+
+                nova_base = dict(base or {})
+                for colecao, (valor, mesclado) in plano.items():
+                    caminho = self.caminho(colecao)
+                    atuais[colecao] = atuais.get(colecao, 0) + 1
+                    if colecao == "historico":
+                        gravado = self._gravar_historico(valor, atuais[colecao])
+                    else:
+                        gravar_json_atomico(caminho, valor)
+                        gravado = copiar_estado(valor)
+                    entrada = (assinatura_arquivo(caminho), gravado, atuais[colecao], None)
+                    with self._trava:
+                        self._cache[colecao] = entrada
+                    if mesclado:
+                        self.mesclagens += 1
+                    # Depois de uma mescla, o que a sessão tem em memória não é o que
+                    # foi gravado: a próxima gravação dela deve mesclar de novo
+                    nova_base[colecao] = (-1, copiar_estado(estado[COLECOES.index(colecao)])) if mesclado else (atuais[colecao], entrada[1])
+                # Versões gravadas depois dos arquivos
+                gravar_json_atomico(caminho_versoes, atuais)
+
+            return nova_base if base is not None else None
+
+
+# Esquema do banco SQLite: uma tabela por coleção e uma linha por item
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS projetos (
+    id TEXT PRIMARY KEY,
+    nome TEXT NOT NULL,
+    ordem INTEGER NOT NULL,
+    extras TEXT
+);
+CREATE TABLE IF NOT EXISTS tarefas_recorrentes (
+    id TEXT PRIMARY KEY,
+    descricao TEXT NOT NULL,
+    ordem INTEGER NOT NULL,
+    extras TEXT
+);
+CREATE TABLE IF NOT EXISTS backlog (
+    id TEXT PRIMARY KEY,
+    descricao TEXT NOT NULL,
+    projeto TEXT,
+    ordem INTEGER NOT NULL,
+    extras TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_backlog_projeto ON backlog (projeto);
+CREATE TABLE IF NOT EXISTS tarefas_dia (
+    id TEXT PRIMARY KEY,
+    descricao TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    concluida INTEGER NOT NULL,
+    ordem INTEGER NOT NULL,
+    extras TEXT
+);
+CREATE TABLE IF NOT EXISTS metadados (
+    chave TEXT PRIMARY KEY,
+    valor TEXT
+);
+CREATE TABLE IF NOT EXISTS sequencias (
+    tarefa_id TEXT PRIMARY KEY,
+    sequencia_atual INTEGER,
+    sequencia_editada INTEGER,
+    recorde_sequencia INTEGER,
+    extras TEXT
+);
+CREATE TABLE IF NOT EXISTS conclusoes (
+    tarefa_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (tarefa_id, data)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_conclusoes_data ON conclusoes (data);
+CREATE TABLE IF NOT EXISTS eventos (
+    seq INTEGER PRIMARY KEY,
+    evento TEXT NOT NULL
+);
+"""
+
+# Colunas próprias de cada tabela de itens; o restante vai para "extras"
+COLUNAS_ITENS = {
+    "projetos": ("id", "nome"),
+    "tarefas_recorrentes": ("id", "descricao"),
+    "backlog": ("id", "descricao", "projeto"),
+    "tarefas_dia": ("id", "descricao", "tipo", "concluida"),
+}
+
+CAMPOS_SEQUENCIA = ("sequencia_atual", "sequencia_editada", "recorde_sequencia")
+
+
+# Armazenamento em SQLite que grava apenas as linhas alteradas.
+# A comparação é feita com o estado que a sessão carregou, então sessões
+# concorrentes só sobrescrevem as linhas que elas mesmas mudaram. Gravações
+# usam BEGIN IMMEDIATE (uma por vez) e o modo WAL não bloqueia leituras.
+class ArmazenamentoSQLite(Armazenamento):
+    def __init__(self, caminho="gestor.db"):
+        super().__init__()
+        self.caminho = caminho
+        # Cache de carga: último estado lido, sua assinatura e as versões das coleções
+        self._cache = None
+        self._trava = threading.Lock()
+        # Banco novo: já nasce na versão atual do formato
+        if not os.path.exists(caminho):
+            self.marcar_esquema(VERSAO_ESQUEMA)
+
+    @contextlib.contextmanager
+    def conectar(self):
+        conexao = sqlite3.connect(self.caminho)
+        try:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            conexao.executescript(ESQUEMA_SQLITE)
+            with conexao:
+                yield conexao
+        finally:
+            conexao.close()
+
+    # Assinatura do banco e do seu arquivo WAL, onde ficam as gravações recentes
+    def _assinatura(self):
+        return (assinatura_arquivo(self.caminho), assinatura_arquivo(f"{self.caminho}-wal"))
+
+    def assinatura(self):
+        return self._assinatura()
+
+    def tamanho_cache(self):
+        with self._trava:
+            cache = self._cache
+        if cache is None:
+            return 0
+        return sum(arquivo[1] for arquivo in cache[1] if arquivo)
+
+    def _limpar_cache(self):
+        with self._trava:
+            self._cache = None
+
+    def _ler_versoes(self, conexao):
+        cursor = conexao.execute("SELECT chave, valor FROM metadados WHERE chave LIKE 'versao.%'")
+        return {chave: int(valor) for chave, valor in cursor}
+
+    def carregar(self, preparar=None):
+        preparar = preparar or {}
+        assinatura = self._assinatura()
+        with self._trava:
+            cache = self._cache
+        if cache is not None and cache[1] == assinatura:
+            self.acertos += 1
+            self._sessao.base = (cache[0], cache[2])
+            return copiar_estado(cache[0])
+
+        if cache is not None:
+            # Eventos do diário mudam o arquivo mas não as tabelas: valem as versões
+            with self.conectar() as conexao:
+                versoes = self._ler_versoes(conexao)
+            if versoes == cache[2]:
+                self.acertos += 1
+                with self._trava:
+                    if self._cache is cache:
+                        self._cache = (cache[0], assinatura, versoes)
+                self._sessao.base = (cache[0], cache[2])
+                return copiar_estado(cache[0])
+
+        self.falhas += 1
+        with perfil.trecho("ler banco"), self.conectar() as conexao:
+            versoes = self._ler_versoes(conexao)
+            projetos = self._ler_itens(conexao, "projetos")
+            tarefas_recorrentes = self._ler_itens(conexao, "tarefas_recorrentes")
+            backlog = self._ler_itens(conexao, "backlog")
+            tarefas_dia = {
+                "data": self._ler_metadado(conexao, "tarefas_dia.data", ""),
+                "tarefas": self._ler_itens(conexao, "tarefas_dia"),
+            }
+            historico = self._ler_historico(conexao)
+            # Tudo é lido: o tamanho do banco e do WAL dá a ordem de grandeza
+            perfil.contar("bytes_lidos", sum(arquivo[1] for arquivo in assinatura if arquivo))
+
+        if "historico" in preparar:
+            with perfil.trecho("migrar historico"):
+                historico = preparar["historico"](historico)
+        estado = (tarefas_recorrentes, backlog, historico, tarefas_dia, projetos)
+        with self._trava:
+            # Assinatura lida antes da leitura: se algo gravar no meio, a próxima carga relê
+            self._cache = (estado, assinatura, versoes)
+        # Base da sessão: o estado carregado e as versões em que ele estava
+        self._sessao.base = (estado, versoes)
+        return copiar_estado(estado)
+
+    # Diário: tabela eventos, que também serve de registro completo das alterações
+    def _trava_diario(self):
+        return concorrencia.trava_processos(f"{self.caminho}.lock")
+
+    def seq_snapshot(self):
+        with self.conectar() as conexao:
+            return int(self._ler_metadado(conexao, "diario", 0))
+
+    def eventos_desde(self, seq):
+        with perfil.trecho("ler diario"), self.conectar() as conexao:
+            cursor = conexao.execute("SELECT seq, evento FROM eventos WHERE seq > ? ORDER BY seq", (seq,))
+            return [dict(json.loads(evento), seq=numero) for numero, evento in cursor]
+
+    def anexar_evento(self, evento):
+        texto = json.dumps({chave: valor for chave, valor in evento.items() if chave != "seq"}, ensure_ascii=False)
+        with self.conectar() as conexao:
+            conexao.execute("INSERT INTO eventos (seq, evento) VALUES (?, ?)", (evento["seq"], texto))
+        perfil.contar("bytes_gravados", len(texto))
+
+    def _marcar_snapshot(self, seq):
+        with self.conectar() as conexao:
+            conexao.execute("INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)", ("diario", str(seq)))
+
+    def _ler_esquema(self):
+        with self.conectar() as conexao:
+            return int(self._ler_metadado(conexao, "esquema", 0))
+
+    def marcar_esquema(self, versao):
+        with self.conectar() as conexao:
+            conexao.execute("INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)", ("esquema", str(versao)))
+        self._esquema_atual = versao >= VERSAO_ESQUEMA
+
+    def ler_agregados(self):
+        with self.conectar() as conexao:
+            valor = self._ler_metadado(conexao, "agregados", None)
+        if valor is None:
+            return None
+        perfil.contar("bytes_lidos", len(valor))
+        return json.loads(valor)
+
+    def gravar_agregados(self, agregados):
+        valor = json.dumps(agregados, ensure_ascii=False)
+        with self.conectar() as conexao:
+            conexao.execute("INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)", ("agregados", valor))
+
+    def _gravar(self, estado, base):
+        tarefas_recorrentes, backlog, historico, tarefas_dia, projetos = estado
+        if base is None:
+            base = (([], [], {}, {"data": "", "tarefas": []}, []), None)
+        base, versoes_base = base
+
+        with self.conectar() as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            versoes = self._ler_versoes(conexao)
+            alteradas = [
+                self._gravar_itens(conexao, "tarefas_recorrentes", base[0], tarefas_recorrentes),
+                self._gravar_itens(conexao, "backlog", base[1], backlog),
+                self._gravar_historico(conexao, base[2], historico),
+                self._gravar_tarefas_dia(conexao, base[3], tarefas_dia),
+                self._gravar_itens(conexao, "projetos", base[4], projetos),
+            ]
+
+            novas_versoes = dict(versoes)
+            for colecao, alterada in zip(COLECOES, alteradas):
+                if alterada:
+                    chave = f"versao.{colecao}"
+                    novas_versoes[chave] = versoes.get(chave, 0) + 1
+                    conexao.execute(
+                        "INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)",
+                        (chave, str(novas_versoes[chave])),
+                    )
+            perfil.contar("linhas_gravadas", conexao.total_changes)
+
+        nova_base = copiar_estado(estado)
+        with self._trava:
+            # Se ninguém mais gravou desde que a sessão carregou, o banco agora é exatamente este estado
+            if versoes_base == versoes:
+                self._cache = (nova_base, self._assinatura(), novas_versoes)
+            else:
+                self._cache = None
+        # Versões de base diferentes das atuais quando houve outras gravações: a
+        # comparação por linha continua valendo, só o cache precisa ser relido
+        return (nova_base, novas_versoes if versoes_base == versoes else None)
+
+    def _gravar_tarefas_dia(self, conexao, antigo, novo):
+        alterada = False
+        if antigo.get("data") != novo.get("data"):
+            conexao.execute(
+                "INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)",
+                ("tarefas_dia.data", novo.get("data", "")),
+            )
+            alterada = True
+        return self._gravar_itens(conexao, "tarefas_dia", antigo.get("tarefas", []), novo.get("tarefas", [])) or alterada
+
+    def _ler_metadado(self, conexao, chave, padrao):
+        linha = conexao.execute("SELECT valor FROM metadados WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else padrao
+
+    def _ler_itens(self, conexao, tabela):
+        colunas = COLUNAS_ITENS[tabela]
+        cursor = conexao.execute(f"SELECT {', '.join(colunas)}, extras FROM {tabela} ORDER BY ordem")
+        itens = []
+        for linha in cursor:
+            item = {}
+            for coluna, valor in zip(colunas, linha):
+                if valor is None:
+                    continue
+                item[coluna] = bool(valor) if coluna == "concluida" else valor
+            if linha[-1]:
+                item.update(json.loads(linha[-1]))
+            itens.append(item)
+        return itens
+
+    def _ler_historico(self, conexao):
+        datas_por_tarefa = {}
+        for tarefa_id, data in conexao.execute("SELECT tarefa_id, data FROM conclusoes ORDER BY tarefa_id, data"):
+            datas_por_tarefa.setdefault(tarefa_id, []).append(data)
+
+        historico = {}
+        cursor = conexao.execute(
+            "SELECT tarefa_id, sequencia_atual, sequencia_editada, recorde_sequencia, extras FROM sequencias"
+        )
+        for tarefa_id, sequencia_atual, sequencia_editada, recorde_sequencia, extras in cursor:
+            info = {
+                "datas": sequencias.Datas.de_lista(datas_por_tarefa.pop(tarefa_id, [])),
+                "sequencia_atual": sequencia_atual or 0,
+                "sequencia_editada": bool(sequencia_editada),
+            }
+            # Sem recorde gravado: deixa a migração preencher
+            if recorde_sequencia is not None:
+                info["recorde_sequencia"] = recorde_sequencia
+            if extras:
+                info.update(json.loads(extras))
+            historico[tarefa_id] = info
+
+        # Tarefas só com datas ficam no formato antigo (lista) para serem migradas
+        historico.update(datas_por_tarefa)
+        return historico
+
+    def _linha_item(self, tabela, item, ordem):
+        colunas = COLUNAS_ITENS[tabela]
+        valores = [item.get(coluna) for coluna in colunas]
+        extras = {chave: valor for chave, valor in item.items() if chave not in colunas}
+        return valores + [ordem, json.dumps(extras) if extras else None]
+
+    def _gravar_itens(self, conexao, tabela, antigos, novos):
+        colunas = COLUNAS_ITENS[tabela]
+        anteriores = {item["id"]: (ordem, item) for ordem, item in enumerate(antigos)}
+        atuais = set()
+        alteradas = []
+        for ordem, item in enumerate(novos):
+            atuais.add(item["id"])
+            if anteriores.get(item["id"]) != (ordem, item):
+                alteradas.append(self._linha_item(tabela, item, ordem))
+
+        removidas = [(tarefa_id,) for tarefa_id in anteriores if tarefa_id not in atuais]
+        if removidas:
+            conexao.executemany(f"DELETE FROM {tabela} WHERE id = ?", removidas)
+        if alteradas:
+            marcadores = ", ".join("?" * (len(colunas) + 2))
+            conexao.executemany(
+                f"INSERT OR REPLACE INTO {tabela} ({', '.join(colunas)}, ordem, extras) VALUES ({marcadores})",
+                alteradas,
+            )
+        return bool(removidas or alteradas)
+
+    def _gravar_historico(self, conexao, antigo, novo):
+        alterada = antigo != novo
+        for tarefa_id in antigo.keys() - novo.keys():
+            conexao.execute("DELETE FROM sequencias WHERE tarefa_id = ?", (tarefa_id,))
+            conexao.execute("DELETE FROM conclusoes WHERE tarefa_id = ?", (tarefa_id,))
+
+        for tarefa_id, info in novo.items():
+            info_antiga = antigo.get(tarefa_id)
+            if info_antiga == info:
+                continue
+
+            datas_antigas = _datas_de(info_antiga)
+            datas_novas = _datas_de(info)
+            removidas = datas_antigas - datas_novas
+            adicionadas = datas_novas - datas_antigas
+            if removidas:
+                conexao.executemany(
+                    "DELETE FROM conclusoes WHERE tarefa_id = ? AND data = ?",
+                    [(tarefa_id, data) for data in removidas],
+                )
+            if adicionadas:
+                conexao.executemany(
+                    "INSERT OR IGNORE INTO conclusoes (tarefa_id, data) VALUES (?, ?)",
+                    [(tarefa_id, data) for data in adicionadas],
+                )
+
+            if not isinstance(info, dict):
+                continue
+            campos = {chave: valor for chave, valor in info.items() if chave != "datas"}
+            campos_antigos = {}
+            if isinstance(info_antiga, dict):
+                campos_antigos = {chave: valor for chave, valor in info_antiga.items() if chave != "datas"}
+            if campos != campos_antigos or not isinstance(info_antiga, dict):
+                extras = {chave: valor for chave, valor in campos.items() if chave not in CAMPOS_SEQUENCIA}
+                conexao.execute(
+                    "INSERT OR REPLACE INTO sequencias "
+                    "(tarefa_id, sequencia_atual, sequencia_editada, recorde_sequencia, extras) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        tarefa_id,
+                        campos.get("sequencia_atual", 0),
+                        int(bool(campos.get("sequencia_editada", False))),
+                        campos.get("recorde_sequencia"),
+                        json.dumps(extras) if extras else None,
+                    ),
+                )
+        return alterada
+
+
+# Datas de conclusão de uma entrada do histórico, em qualquer formato
+def _datas_de(info):
+    if info is None:
+        return set()
+    if isinstance(info, list):
+        return set(info)
+    return set(info.get("datas", []))
+
+
+# Importação única dos arquivos JSON atuais para um banco SQLite
+def importar_json_para_sqlite(raiz=".", destino="gestor.db"):
+    origem = ArmazenamentoJSON(raiz)
+    seq = origem.seq_snapshot()
+    estado = origem.carregar()
+    sqlite = ArmazenamentoSQLite(destino)
+    # Os dados vão como estão: a versão do formato é a da origem
+    sqlite.marcar_esquema(origem.esquema())
+    # Sem base: todas as linhas são gravadas como novas
+    sqlite._gravar(estado, None)
+    # O diário vem junto: os eventos posteriores ao snapshot são repetidos na carga
+    sqlite._marcar_snapshot(seq)
+    for evento in origem.eventos_desde(0):
+        sqlite.anexar_evento(evento)
+    return sqlite
+
+
+# Escolhe o armazenamento pelas variáveis de ambiente GESTOR_ARMAZENAMENTO e
+# GESTOR_DADOS; GESTOR_GRAVACAO=adiada liga a gravação em segundo plano, com a
+# janela (em segundos) de GESTOR_JANELA_GRAVACAO, e GESTOR_SNAPSHOT=binario
+# liga o estado.bin (só no JSON; o SQLite já lê só o que precisa)
+def criar_armazenamento(tipo=None, raiz=None, gravacao_adiada=None, janela=None, snapshot_binario=None):
+    tipo = tipo or os.environ.get("GESTOR_ARMAZENAMENTO", "json")
+    raiz = raiz or os.environ.get("GESTOR_DADOS", ".")
+    if gravacao_adiada is None:
+        gravacao_adiada = os.environ.get("GESTOR_GRAVACAO", "imediata") == "adiada"
+    if janela is None:
+        janela = float(os.environ.get("GESTOR_JANELA_GRAVACAO", gravacao.JANELA_PADRAO))
+    if snapshot_binario is None:
+        snapshot_binario = os.environ.get("GESTOR_SNAPSHOT", "json") == "binario"
+
+    if tipo == "json":
+        loja = ArmazenamentoJSON(raiz, snapshot_binario=snapshot_binario)
+    elif tipo == "sqlite":
+        caminho = os.path.join(raiz, "gestor.db")
+        # Na primeira execução, importar os dados que já estão em JSON
+        json_existente = os.path.exists(os.path.join(raiz, "tarefas_recorrentes.json"))
+        if not os.path.exists(caminho) and json_existente:
+            loja = importar_json_para_sqlite(raiz, caminho)
+        else:
+            loja = ArmazenamentoSQLite(caminho)
+    else:
+        raise ValueError(f"Armazenamento desconhecido: {tipo}")
+
+    if gravacao_adiada:
+        loja.ativar_gravacao_adiada(janela)
+    return loja
+
+
+_armazenamento = None
+_trava_armazenamento = threading.Lock()
+
+
+# Instância compartilhada pelo processo (o app.py é reexecutado a cada interação)
+def obter():
+    global _armazenamento
+    with _trava_armazenamento:
+        if _armazenamento is None:
+            _armazenamento = criar_armazenamento()
+        return _armazenamento
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ferramentas de armazenamento do Gestor de Tarefas")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    importar = subparsers.add_parser("importar", help="Importa os arquivos JSON para um banco SQLite")
+    importar.add_argument("--origem", default=".", help="Pasta com os arquivos JSON")
+    importar.add_argument("--destino", default="gestor.db", help="Arquivo do banco SQLite")
+
+    args = parser.parse_args()
+    if args.comando == "importar":
+        if os.path.exists(args.destino):
+            parser.error(f"{args.destino} já existe; a importação é feita uma única vez")
+        importar_json_para_sqlite(args.origem, args.destino)
+        print(f"Dados importados para {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
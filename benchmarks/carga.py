@@ -0,0 +1,313 @@
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ_REPOSITORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPOSITORIO)
+
+import armazenamento
+import servico
+from executar import ABAS, versao_do_codigo
+from gerador import gerar_espaco, gravar_espaco
+
+# Teste de carga: várias sessões do app, cada uma um AppTest do Streamlit,
+# usando a mesma pasta de dados ao mesmo tempo. Cada sessão marca e desmarca
+# a sua tarefa recorrente, põe e tira tarefas do backlog e troca de aba; no
+# fim, os dados gravados são comparados com o que cada sessão fez, e o que
+# faltar é uma alteração perdida. Obs.: o AppTest executa o script inteiro a
+# cada ação, inclusive onde o servidor reexecutaria só um fragmento.
+
+# Peso de cada ação no sorteio das sessões
+MISTURA = {"marcar": 5, "adicionar_backlog": 2, "remover_backlog": 1, "trocar_aba": 2}
+
+ROTULO_NOVA_BACKLOG = "Nova tarefa para o backlog:"
+ROTULO_NOVA_RECORRENTE = "Nova tarefa recorrente:"
+
+
+class ErroSessao(Exception):
+    pass
+
+
+# Uma sessão simulada; guarda as latências de cada ação e o que ela alterou
+class Sessao:
+    def __init__(self, numero, acoes, semente, pausa=0.0):
+        self.numero = numero
+        self.acoes = acoes
+        self.aleatorio = random.Random(semente * 1000 + numero)
+        self.pausa = pausa
+        self.latencias = {}
+        self.erros = []
+        self.aba = None
+        self.at = None
+        self.tarefa_id = None
+        self.marcada = False
+        self.backlog = {}
+        self.removidas = []
+        self._contador = 0
+        self.inicio = None
+        self.fim = None
+
+    def _executar(self, acao, elemento):
+        inicio = time.perf_counter()
+        elemento.run()
+        self.latencias.setdefault(acao, []).append(time.perf_counter() - inicio)
+        if self.at.exception:
+            raise ErroSessao(f"{acao}: {self.at.exception[0].message}")
+
+    def _ir_para(self, aba, acao="trocar_aba"):
+        if self.aba != aba:
+            self._executar(acao, self.at.sidebar.radio[0].set_value(aba))
+            self.aba = aba
+
+    def _entrada(self, rotulo):
+        return next(entrada for entrada in self.at.text_input if entrada.label == rotulo)
+
+    def _botao(self, rotulo):
+        return next(botao for botao in self.at.button if botao.label == rotulo)
+
+    def _gestor(self):
+        return self.at.session_state["gestor"]
+
+    def _id_do_backlog(self, descricao):
+        return next((tarefa["id"] for tarefa in self._gestor().backlog if tarefa["descricao"] == descricao), None)
+
+    def abrir(self):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(os.path.join(RAIZ_REPOSITORIO, "app.py"), default_timeout=300)
+        self._executar("abrir", self.at)
+        self.aba = ABAS[0]
+
+        # Tarefa recorrente desta sessão, marcada e desmarcada só por ela
+        descricao = f"Carga sessão {self.numero}"
+        self._ir_para("Tarefas Recorrentes")
+        self._entrada(ROTULO_NOVA_RECORRENTE).input(descricao)
+        self._executar("adicionar_recorrente", self._botao("Adicionar").click())
+        self.tarefa_id = next(t["id"] for t in self._gestor().tarefas_recorrentes if t["descricao"] == descricao)
+
+    def marcar(self):
+        self._ir_para("Tarefas do Dia")
+        self.marcada = not self.marcada
+        self._executar("marcar", self.at.checkbox(key=f"tarefa_dia_{self.tarefa_id}").set_value(self.marcada))
+
+    def adicionar_backlog(self):
+        self._ir_para("Backlog")
+        self._contador += 1
+        descricao = f"carga s{self.numero} n{self._contador}"
+        self._entrada(ROTULO_NOVA_BACKLOG).input(descricao)
+        self._executar("adicionar_backlog", self._botao("Adicionar").click())
+        self.backlog[descricao] = self._id_do_backlog(descricao)
+
+    def remover_backlog(self):
+        if not self.backlog:
+            self.adicionar_backlog()
+            return
+        descricao = self.aleatorio.choice(sorted(self.backlog))
+        tarefa_id = self.backlog[descricao] or self._id_do_backlog(descricao)
+        self._ir_para("Backlog")
+        # A busca traz a tarefa para a primeira página
+        self._executar("buscar_backlog", self.at.text_input(key="busca_backlog").input(descricao))
+        botoes = [botao for botao in self.at.button if botao.key == f"rem_back_{tarefa_id}"]
+        if not botoes:
+            raise ErroSessao(f"remover_backlog: {descricao} não aparece na busca")
+        self._executar("remover_backlog", botoes[0].click())
+        del self.backlog[descricao]
+        self.removidas.append(descricao)
+        self._executar("buscar_backlog", self.at.text_input(key="busca_backlog").input(""))
+
+    def trocar_aba(self):
+        self._ir_para(self.aleatorio.choice([aba for aba in ABAS if aba != self.aba]))
+
+    def rodar(self, largada=None):
+        try:
+            self.abrir()
+            # Todas as sessões começam juntas, já com o app aberto
+            if largada is not None:
+                largada.wait()
+            self.inicio = time.time()
+            acoes = list(MISTURA)
+            pesos = [MISTURA[acao] for acao in acoes]
+            for _ in range(self.acoes):
+                getattr(self, self.aleatorio.choices(acoes, pesos)[0])()
+                if self.pausa:
+                    time.sleep(self.pausa)
+        except (ErroSessao, StopIteration, KeyError, threading.BrokenBarrierError) as erro:
+            self.erros.append(f"{type(erro).__name__}: {erro}")
+            # Uma sessão que nem abriu não deixa as outras esperando
+            if largada is not None and self.inicio is None:
+                largada.abort()
+        self.fim = time.time()
+        return self.resultado()
+
+    # O que a sessão fez, para conferir contra os dados gravados
+    def resultado(self):
+        return {
+            "sessao": self.numero,
+            "inicio": self.inicio,
+            "fim": self.fim,
+            "latencias": self.latencias,
+            "erros": self.erros,
+            "tarefa_id": self.tarefa_id,
+            "marcada": self.marcada,
+            "backlog": sorted(self.backlog),
+            "removidas": self.removidas,
+        }
+
+
+# Cada sessão roda no seu processo, como vários servidores sobre a mesma
+# pasta de dados: o AppTest troca a instância global do Runtime do Streamlit
+# a cada execução e não aguenta duas sessões em threads do mesmo processo
+def _rodar_sessao(raiz, tipo, gravacao_modo, numero, acoes, semente, pausa, largada):
+    os.environ["GESTOR_DADOS"] = raiz
+    os.environ["GESTOR_ARMAZENAMENTO"] = tipo
+    os.environ["GESTOR_GRAVACAO"] = gravacao_modo
+    try:
+        return Sessao(numero, acoes, semente, pausa).rodar(largada)
+    finally:
+        # Processos do multiprocessing saem sem rodar o atexit
+        import gravacao
+
+        gravacao.descarregar_todos()
+
+
+def percentil(valores, fracao):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    posicao = (len(ordenados) - 1) * fracao
+    baixo = int(posicao)
+    alto = min(baixo + 1, len(ordenados) - 1)
+    return ordenados[baixo] + (ordenados[alto] - ordenados[baixo]) * (posicao - baixo)
+
+
+def _resumo_latencias(tempos):
+    return {
+        "execucoes": len(tempos),
+        "p50_ms": round(percentil(tempos, 0.50) * 1000, 1),
+        "p95_ms": round(percentil(tempos, 0.95) * 1000, 1),
+        "p99_ms": round(percentil(tempos, 0.99) * 1000, 1),
+        "maximo_ms": round(max(tempos) * 1000, 1) if tempos else 0.0,
+    }
+
+
+# Compara os dados gravados com o que cada sessão fez
+def conferir(raiz, tipo, resultados):
+    gestor = servico.Gestor(armazenamento.criar_armazenamento(tipo, raiz))
+    gestor.carregar(virar_dia=False)
+    descricoes = {tarefa["descricao"] for tarefa in gestor.backlog}
+    perdidas = {"backlog_adicionadas": 0, "backlog_removidas": 0, "marcacoes": 0}
+    for resultado in resultados:
+        perdidas["backlog_adicionadas"] += sum(1 for descricao in resultado["backlog"] if descricao not in descricoes)
+        perdidas["backlog_removidas"] += sum(1 for descricao in resultado["removidas"] if descricao in descricoes)
+        if resultado["tarefa_id"] is not None:
+            try:
+                concluida = gestor.tarefa_do_dia(resultado["tarefa_id"])["concluida"]
+            except KeyError:
+                concluida = None
+            perdidas["marcacoes"] += concluida != resultado["marcada"]
+    return perdidas
+
+
+def medir_nivel(estado, tipo, gravacao_modo, sessoes, acoes, semente, pausa):
+    with tempfile.TemporaryDirectory(prefix="gestor_carga_") as raiz:
+        gravar_espaco(estado, raiz, tipo)
+        contexto = multiprocessing.get_context("spawn")
+        with contexto.Manager() as gerente:
+            largada = gerente.Barrier(sessoes)
+            with concurrent.futures.ProcessPoolExecutor(max_workers=sessoes, mp_context=contexto) as executor:
+                futuros = [
+                    executor.submit(_rodar_sessao, raiz, tipo, gravacao_modo, numero, acoes, semente, pausa, largada)
+                    for numero in range(sessoes)
+                ]
+                resultados = [futuro.result() for futuro in futuros]
+        perdidas = conferir(raiz, tipo, resultados)
+
+    inicios = [resultado["inicio"] for resultado in resultados if resultado["inicio"] is not None]
+    duracao = max(resultado["fim"] for resultado in resultados) - min(inicios) if inicios else 0.0
+    por_acao = {}
+    for resultado in resultados:
+        for acao, tempos in resultado["latencias"].items():
+            por_acao.setdefault(acao, []).extend(tempos)
+    # Reexecuções do uso normal (abrir a sessão e criar a tarefa dela ficam de fora)
+    tempos = [tempo for acao, lista in por_acao.items() if acao not in ("abrir", "adicionar_recorrente") for tempo in lista]
+    return {
+        "sessoes": sessoes,
+        "duracao_s": round(duracao, 2),
+        "reexecucoes_por_s": round(len(tempos) / duracao, 2) if duracao else 0.0,
+        "latencia": _resumo_latencias(tempos),
+        "por_acao": {acao: _resumo_latencias(lista) for acao, lista in sorted(por_acao.items())},
+        "alteracoes_perdidas": perdidas,
+        "erros": [erro for resultado in resultados for erro in resultado["erros"]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do app com várias sessões simultâneas sobre os mesmos dados")
+    parser.add_argument("--sessoes", default="1,2,4,8", help="Níveis de concorrência, separados por vírgula")
+    parser.add_argument("--acoes", type=int, default=30, help="Ações de cada sessão")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Pausa entre as ações de uma sessão, em segundos")
+    parser.add_argument("--recorrentes", type=int, default=20)
+    parser.add_argument("--backlog", type=int, default=500)
+    parser.add_argument("--projetos", type=int, default=10)
+    parser.add_argument("--anos", type=float, default=1)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--armazenamento", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--gravacao", choices=("imediata", "adiada"), default="imediata")
+    parser.add_argument("--saida", default=os.path.join(tempfile.gettempdir(), "resultado_carga.json"),
+                        help="Arquivo JSON com os resultados (padrão: no diretório temporário)")
+    args = parser.parse_args()
+
+    try:
+        niveis = [int(nivel) for nivel in args.sessoes.split(",") if nivel.strip()]
+    except ValueError:
+        parser.error("--sessoes deve ser uma lista de números, ex.: 1,2,4,8")
+
+    # Espaço já migrado: a carga mede o uso normal, não a conversão do formato antigo
+    estado = gerar_espaco(args.recorrentes, args.backlog, args.projetos, args.anos, legado=0.0, semente=args.semente)
+
+    print(f"{'sessões':>7} {'reexec/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'perdidas':>9} {'erros':>6}")
+    niveis_medidos = []
+    for sessoes in niveis:
+        nivel = medir_nivel(estado, args.armazenamento, args.gravacao, sessoes, args.acoes, args.semente, args.pausa)
+        niveis_medidos.append(nivel)
+        latencia = nivel["latencia"]
+        print(f"{sessoes:>7} {nivel['reexecucoes_por_s']:>9.2f} {latencia['p50_ms']:>8.1f} {latencia['p95_ms']:>8.1f} "
+              f"{latencia['p99_ms']:>8.1f} {sum(nivel['alteracoes_perdidas'].values()):>9} {len(nivel['erros']):>6}")
+        for erro in nivel["erros"][:5]:
+            print(f"        {erro}")
+
+    saida = {
+        "versao": versao_do_codigo(),
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "acoes": args.acoes,
+            "pausa": args.pausa,
+            "recorrentes": args.recorrentes,
+            "backlog": args.backlog,
+            "projetos": args.projetos,
+            "anos": args.anos,
+            "semente": args.semente,
+            "armazenamento": args.armazenamento,
+            "gravacao": args.gravacao,
+            "mistura": MISTURA,
+        },
+        "niveis": niveis_medidos,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(saida, f, ensure_ascii=False, indent=2)
+    print(f"Resultados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ_REPOSITORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPOSITORIO)
+
+import agregados
+import armazenamento
+import sequencias
+import servico
+from gerador import gerar_espaco, gravar_espaco
+
+ABAS = ["Tarefas do Dia", "Tarefas Recorrentes", "Backlog", "Projetos", "Estatísticas", "Editar Sequências"]
+
+
+# Tempo de cada repetição de uma função, em segundos; preparar roda antes de cada uma, fora da medição
+def medir(funcao, repeticoes, preparar=None):
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def resumir(tempos):
+    return {
+        "repeticoes": len(tempos),
+        "minimo_ms": round(min(tempos) * 1000, 3),
+        "mediana_ms": round(statistics.median(tempos) * 1000, 3),
+        "media_ms": round(statistics.fmean(tempos) * 1000, 3),
+        "maximo_ms": round(max(tempos) * 1000, 3),
+    }
+
+
+def medir_nucleo(tipo, raiz, repeticoes, gravacao_adiada=False, snapshot_binario=False):
+    resultados = {}
+    hoje = datetime.date.today()
+    ontem = (hoje - datetime.timedelta(days=1)).isoformat()
+
+    # Carga com o cache vazio (lê e migra tudo) e com o cache já preenchido
+    resultados["carregar_frio"] = medir(
+        lambda: armazenamento.criar_armazenamento(tipo, raiz, snapshot_binario=snapshot_binario).carregar(
+            preparar={"historico": sequencias.migrar_historico}
+        ),
+        repeticoes,
+    )
+    loja = armazenamento.criar_armazenamento(tipo, raiz, gravacao_adiada=gravacao_adiada, snapshot_binario=snapshot_binario)
+    gestor = servico.Gestor(loja)
+    gestor.carregar(hoje=ontem)
+    resultados["carregar_quente"] = medir(lambda: gestor.carregar(hoje=ontem), repeticoes)
+
+    # Gravação de uma alteração pequena: marcar e desmarcar uma tarefa do dia
+    tarefa_id = gestor.tarefas_recorrentes[0]["id"]
+    estado_marcacao = {"concluida": gestor.tarefa_do_dia(tarefa_id)["concluida"]}
+
+    def marcar():
+        estado_marcacao["concluida"] = not estado_marcacao["concluida"]
+        gestor.marcar(tarefa_id, estado_marcacao["concluida"])
+
+    resultados["salvar_marcacao"] = medir(marcar, repeticoes)
+
+    # Sequência de todas as recorrentes: a frio, montando os blocos a partir das
+    # datas cruas do histórico; a quente, com os blocos já carregados
+    datas_cruas = [list(gestor.historico.get(tarefa["id"], {}).get("datas", [])) for tarefa in gestor.tarefas_recorrentes]
+
+    def sequencias_frio():
+        for datas in datas_cruas:
+            sequencias.Datas.de_lista(datas).sequencia_atual()
+
+    def sequencias_todas():
+        for tarefa in gestor.tarefas_recorrentes:
+            servico.calcular_sequencia(gestor.historico, tarefa["id"])
+
+    resultados["calcular_sequencia_frio"] = medir(sequencias_frio, repeticoes)
+    resultados["calcular_sequencia_quente"] = medir(sequencias_todas, repeticoes)
+
+    # Recontagem completa dos agregados (a carga só faz isso se os gravados não conferem)
+    resultados["recalcular_agregados"] = medir(lambda: agregados.Agregados.de_historico(gestor.historico), repeticoes)
+
+    # Virada do dia (inclui a gravação); antes de cada uma, volta o dia de ontem
+    tarefas_ontem = armazenamento.copiar_estado(gestor.tarefas_dia)
+
+    def voltar_para_ontem():
+        gestor.tarefas_dia = armazenamento.copiar_estado(tarefas_ontem)
+        gestor.indice.definir_dia(gestor.tarefas_dia)
+        gestor.salvar()
+
+    resultados["virar_dia"] = medir(lambda: gestor.virar_dia(hoje.isoformat()), repeticoes, preparar=voltar_para_ontem)
+    voltar_para_ontem()
+    if loja.escritor is not None:
+        loja.escritor.descarregar()
+    return {nome: resumir(tempos) for nome, tempos in resultados.items()}
+
+
+# Partida do app em um processo novo: importações, carga dos dados e a
+# primeira execução completa, como a primeira visita depois de subir o servidor
+CODIGO_PARTIDA = """
+import json, os, sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(os.path.join(sys.argv[1], "app.py"), default_timeout=300)
+at.run()
+print(json.dumps({"segundos": time.perf_counter() - inicio, "erro": at.exception[0].message if at.exception else None}))
+"""
+
+
+def medir_partida(repeticoes):
+    ambiente = dict(os.environ, STREAMLIT_LOGGER_LEVEL="error")
+    tempos = []
+    for _ in range(repeticoes):
+        processo = subprocess.run(
+            [sys.executable, "-c", CODIGO_PARTIDA, RAIZ_REPOSITORIO],
+            capture_output=True, text=True, check=True, env=ambiente,
+        )
+        medicao = json.loads(processo.stdout.strip().splitlines()[-1])
+        if medicao["erro"]:
+            raise RuntimeError(medicao["erro"])
+        tempos.append(medicao["segundos"])
+    return {"app_partida": resumir(tempos)}
+
+
+# Grava o estado.bin, como a compactação faria (ver armazenamento.ArmazenamentoJSON)
+def preparar_snapshot_binario(tipo, raiz):
+    gestor = servico.Gestor(armazenamento.criar_armazenamento(tipo, raiz, snapshot_binario=True))
+    gestor.carregar()
+    gestor.salvar()
+
+
+# Execução completa do app em cada aba, pelo AppTest do Streamlit
+def medir_abas(repeticoes):
+    # Avisos do Streamlit a cada execução atrapalhariam a leitura do resultado
+    os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(RAIZ_REPOSITORIO, "app.py"), default_timeout=300)
+    inicio = time.perf_counter()
+    at.run()
+    resultados = {"app_primeira_execucao": resumir([time.perf_counter() - inicio])}
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    for aba in ABAS:
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            at.sidebar.radio[0].set_value(aba).run()
+            tempos.append(time.perf_counter() - inicio)
+            if at.exception:
+                raise RuntimeError(f"{aba}: {at.exception[0].message}")
+        resultados[f"aba_{aba}"] = resumir(tempos)
+    return resultados
+
+
+# Commit do código medido (com -dirty se houver alterações), para identificar os resultados
+def versao_do_codigo():
+    try:
+        return subprocess.run(
+            ["git", "-C", RAIZ_REPOSITORIO, "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Mostra a variação da mediana em relação a um resultado anterior
+def comparar(atual, anterior):
+    print(f"{'medição':40} {'antes (ms)':>12} {'agora (ms)':>12} {'variação':>10}")
+    for nome, dados in atual["resultados"].items():
+        antes = anterior.get("resultados", {}).get(nome)
+        if antes is None:
+            print(f"{nome:40} {'-':>12} {dados['mediana_ms']:>12.3f} {'nova':>10}")
+            continue
+        variacao = (dados["mediana_ms"] / antes["mediana_ms"] - 1) * 100 if antes["mediana_ms"] else 0.0
+        print(f"{nome:40} {antes['mediana_ms']:>12.3f} {dados['mediana_ms']:>12.3f} {variacao:>+9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o Gestor de Tarefas sobre um espaço de trabalho sintético")
+    parser.add_argument("--recorrentes", type=int, default=50)
+    parser.add_argument("--backlog", type=int, default=2000)
+    parser.add_argument("--projetos", type=int, default=20)
+    parser.add_argument("--anos", type=float, default=2)
+    parser.add_argument("--legado", type=float, default=0.2, help="Fração do histórico no formato antigo")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--armazenamento", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--gravacao", choices=("imediata", "adiada"), default="imediata")
+    parser.add_argument("--snapshot", choices=("json", "binario"), default="json",
+                        help="Com binario, as cargas usam o estado.bin (só no armazenamento JSON)")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--sem-abas", action="store_true", help="Não medir a partida e a execução do app pelo AppTest")
+    parser.add_argument("--orcamento-partida", type=float, default=None, metavar="MS",
+                        help="Falha (código 1) se a mediana da partida do app passar deste tempo")
+    parser.add_argument("--saida", default=os.path.join(tempfile.gettempdir(), "resultado_benchmark.json"),
+                        help="Arquivo JSON com os resultados (padrão: no diretório temporário)")
+    parser.add_argument("--comparar", help="Resultado anterior (JSON) para comparar")
+    args = parser.parse_args()
+
+    parametros = {
+        "recorrentes": args.recorrentes,
+        "backlog": args.backlog,
+        "projetos": args.projetos,
+        "anos": args.anos,
+        "legado": args.legado,
+        "semente": args.semente,
+        "armazenamento": args.armazenamento,
+        "gravacao": args.gravacao,
+        "snapshot": args.snapshot,
+        "orcamento_partida_ms": args.orcamento_partida,
+    }
+    if args.orcamento_partida is not None and args.sem_abas:
+        parser.error("--orcamento-partida precisa da medição do app (sem --sem-abas)")
+
+    with tempfile.TemporaryDirectory(prefix="gestor_benchmark_") as raiz:
+        inicio = time.perf_counter()
+        estado = gerar_espaco(args.recorrentes, args.backlog, args.projetos, args.anos, args.legado, semente=args.semente)
+        gravar_espaco(estado, raiz, args.armazenamento)
+        print(f"Espaço gerado em {time.perf_counter() - inicio:.1f}s")
+
+        snapshot_binario = args.snapshot == "binario"
+        if snapshot_binario:
+            preparar_snapshot_binario(args.armazenamento, raiz)
+        resultados = medir_nucleo(args.armazenamento, raiz, args.repeticoes, gravacao_adiada=args.gravacao == "adiada",
+                                  snapshot_binario=snapshot_binario)
+        if not args.sem_abas:
+            # O app usa o armazenamento compartilhado, escolhido pelas variáveis de ambiente
+            os.environ["GESTOR_DADOS"] = raiz
+            os.environ["GESTOR_ARMAZENAMENTO"] = args.armazenamento
+            os.environ["GESTOR_GRAVACAO"] = args.gravacao
+            os.environ["GESTOR_SNAPSHOT"] = args.snapshot
+            resultados.update(medir_partida(args.repeticoes))
+            resultados.update(medir_abas(args.repeticoes))
+
+    saida = {
+        "versao": versao_do_codigo(),
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": parametros,
+        "resultados": resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(saida, f, ensure_ascii=False, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            comparar(saida, json.load(f))
+    else:
+        for nome, dados in resultados.items():
+            print(f"{nome:40} mediana {dados['mediana_ms']:10.3f} ms")
+    print(f"Resultados em {args.saida}")
+
+    if args.orcamento_partida is not None:
+        partida = resultados["app_partida"]["mediana_ms"]
+        if partida > args.orcamento_partida:
+            print(f"Partida do app acima do orçamento: {partida:.0f} ms > {args.orcamento_partida:.0f} ms")
+            sys.exit(1)
+        print(f"Partida do app dentro do orçamento: {partida:.0f} ms <= {args.orcamento_partida:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import armazenamento
+
+PALAVRAS = (
+    "relatório revisar enviar planejar reunião ler estudar correr meditar organizar "
+    "orçamento cliente projeto código testes documentação e-mail contas compras treino "
+    "artigo apresentação backup servidor agenda limpeza leitura inglês piano alongamento"
+).split()
+
+
+def _descricao(aleatorio, palavras=3):
+    return " ".join(aleatorio.choice(PALAVRAS) for _ in range(palavras)).capitalize()
+
+
+# Datas de conclusão de uma tarefa ao longo de alguns anos, em sequências de
+# tamanhos variados separadas por falhas, como no uso real
+def _datas(aleatorio, hoje, anos, taxa):
+    datas = []
+    dia = hoje - datetime.timedelta(days=int(365 * anos))
+    feito = aleatorio.random() < taxa
+    while dia <= hoje:
+        if feito:
+            datas.append(dia.isoformat())
+        # Troca entre "fazendo" e "falhando" com probabilidade que mantém a taxa média
+        if aleatorio.random() < (0.15 if feito else 0.15 * taxa / (1 - taxa)):
+            feito = not feito
+        dia += datetime.timedelta(days=1)
+    return datas
+
+
+# Espaço de trabalho sintético: N recorrentes, M itens de backlog, P projetos e
+# Y anos de histórico; uma fração das entradas fica no formato antigo (só a lista de datas)
+def gerar_espaco(recorrentes=50, backlog=2000, projetos=20, anos=2, legado=0.2, taxa=0.7, semente=42, hoje=None):
+    aleatorio = random.Random(semente)
+    hoje = hoje or datetime.date.today()
+    carimbo = "20200101000000"
+
+    lista_projetos = [{"id": f"proj_{i + 1}_{carimbo}", "nome": f"Projeto {i + 1}"} for i in range(projetos)]
+
+    tarefas_recorrentes = [
+        {"id": f"rec_{i + 1}_{carimbo}", "descricao": _descricao(aleatorio, 2)} for i in range(recorrentes)
+    ]
+
+    lista_backlog = []
+    for i in range(backlog):
+        tarefa = {"id": f"back_{i + 1}_{carimbo}", "descricao": _descricao(aleatorio)}
+        if lista_projetos and aleatorio.random() < 0.8:
+            tarefa["projeto"] = aleatorio.choice(lista_projetos)["nome"]
+        lista_backlog.append(tarefa)
+
+    historico = {}
+    for tarefa in tarefas_recorrentes:
+        datas = _datas(aleatorio, hoje - datetime.timedelta(days=1), anos, taxa)
+        if aleatorio.random() < legado:
+            historico[tarefa["id"]] = datas
+            continue
+        historico[tarefa["id"]] = {
+            "datas": datas,
+            "sequencia_atual": 0,
+            "sequencia_editada": aleatorio.random() < 0.05,
+            "recorde_sequencia": 0,
+        }
+
+    # Tarefas do dia de ontem, parte concluída: a próxima carga vira o dia
+    ontem = (hoje - datetime.timedelta(days=1)).isoformat()
+    tarefas_dia = {
+        "data": ontem,
+        "tarefas": [
+            {"id": t["id"], "descricao": t["descricao"], "tipo": "recorrente", "concluida": _lista(historico[t["id"]])[-1:] == [ontem]}
+            for t in tarefas_recorrentes
+        ] + [
+            {"id": t["id"], "descricao": t["descricao"], "tipo": "backlog", "concluida": False}
+            for t in aleatorio.sample(lista_backlog, min(10, len(lista_backlog)))
+        ],
+    }
+    return (tarefas_recorrentes, lista_backlog, historico, tarefas_dia, lista_projetos)
+
+
+def _lista(info):
+    return info if isinstance(info, list) else info["datas"]
+
+
+# Grava o espaço na pasta, nos arquivos JSON e, se pedido, no banco SQLite
+def gravar_espaco(estado, raiz, tipo="json"):
+    os.makedirs(raiz, exist_ok=True)
+    for colecao, valor in zip(armazenamento.COLECOES, estado):
+        armazenamento.gravar_json_atomico(os.path.join(raiz, f"{colecao}.json"), valor)
+    if tipo == "sqlite":
+        caminho = os.path.join(raiz, "gestor.db")
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        armazenamento.importar_json_para_sqlite(raiz, caminho)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um espaço de trabalho sintético para medições")
+    parser.add_argument("destino", help="Pasta onde gravar os dados")
+    parser.add_argument("--recorrentes", type=int, default=50)
+    parser.add_argument("--backlog", type=int, default=2000)
+    parser.add_argument("--projetos", type=int, default=20)
+    parser.add_argument("--anos", type=float, default=2)
+    parser.add_argument("--legado", type=float, default=0.2, help="Fração do histórico no formato antigo")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--armazenamento", choices=("json", "sqlite"), default="json")
+    args = parser.parse_args()
+
+    estado = gerar_espaco(args.recorrentes, args.backlog, args.projetos, args.anos, args.legado, semente=args.semente)
+    gravar_espaco(estado, args.destino, args.armazenamento)
+    datas = sum(len(_lista(info)) for info in estado[2].values())
+    print(f"{len(estado[0])} recorrentes, {len(estado[1])} no backlog, {len(estado[4])} projetos, {datas} conclusões em {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+import weakref
+
+# Pontuação de cada tipo de correspondência de um termo da consulta
+PESO_EXATO = 3
+PESO_PREFIXO = 2
+PESO_APROXIMADO = 1
+
+
+# Minúsculas e sem acentos, para "Relatório" casar com "relatorio"
+def normalizar(texto):
+    decomposto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return re.findall(r"\w+", normalizar(texto))
+
+
+def trigramas(token):
+    marcado = f"  {token} "
+    return {marcado[i:i + 3] for i in range(len(marcado) - 2)}
+
+
+# Distância de edição (troca de letras vizinhas conta como um erro),
+# desistindo assim que passar do limite
+def distancia_limitada(a, b, limite):
+    if abs(len(a) - len(b)) > limite:
+        return limite + 1
+    anteanterior = None
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        atual = [i] + [0] * len(b)
+        for j, cb in enumerate(b, start=1):
+            atual[j] = min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + (ca != cb))
+            if j > 1 and anteanterior is not None and ca == b[j - 2] and a[i - 2] == cb:
+                atual[j] = min(atual[j], anteanterior[j - 2] + 1)
+        if min(atual) > limite:
+            return limite + 1
+        anteanterior, anterior = anterior, atual
+    return anterior[-1]
+
+
+# Índice invertido (token -> ids) com tokens ordenados para busca por prefixo
+# e trigramas para tolerar erros de digitação. Atualizado item a item.
+class IndiceBusca:
+    def __init__(self):
+        self.postagens = {}
+        self.tokens = []
+        self.por_trigrama = {}
+        self.textos = {}
+        self.tokens_de = {}
+        self.ordem = {}
+        self._proxima_ordem = 0
+
+    def __len__(self):
+        return len(self.textos)
+
+    def adicionar(self, item_id, texto):
+        if item_id in self.textos:
+            if self.textos[item_id] == texto:
+                return
+            self.remover(item_id)
+
+        tokens = set(tokenizar(texto))
+        self.textos[item_id] = texto
+        self.tokens_de[item_id] = tokens
+        self.ordem[item_id] = self._proxima_ordem
+        self._proxima_ordem += 1
+
+        for token in tokens:
+            if token not in self.postagens:
+                self.postagens[token] = set()
+                bisect.insort(self.tokens, token)
+                for trigrama in trigramas(token):
+                    self.por_trigrama.setdefault(trigrama, set()).add(token)
+            self.postagens[token].add(item_id)
+
+    def remover(self, item_id):
+        if item_id not in self.textos:
+            return
+        del self.textos[item_id]
+        del self.ordem[item_id]
+
+        for token in self.tokens_de.pop(item_id):
+            ids = self.postagens[token]
+            ids.discard(item_id)
+            if ids:
+                continue
+            # Token sem mais nenhum item: sai do índice
+            del self.postagens[token]
+            del self.tokens[bisect.bisect_left(self.tokens, token)]
+            for trigrama in trigramas(token):
+                tokens = self.por_trigrama[trigrama]
+                tokens.discard(token)
+                if not tokens:
+                    del self.por_trigrama[trigrama]
+
+    # Deixa o índice igual a {id: texto}, mexendo só no que mudou
+    def sincronizar(self, textos):
+        for item_id in self.textos.keys() - textos.keys():
+            self.remover(item_id)
+        for item_id, texto in textos.items():
+            if self.textos.get(item_id) != texto:
+                self.adicionar(item_id, texto)
+
+    def _prefixados(self, termo):
+        inicio = bisect.bisect_left(self.tokens, termo)
+        fim = bisect.bisect_left(self.tokens, termo + "￿")
+        return self.tokens[inicio:fim]
+
+    def _aproximados(self, termo):
+        if len(termo) < 3:
+            return []
+        limite = 1 if len(termo) <= 5 else 2
+        # Cada erro (inclusive uma troca de vizinhas) altera no máximo 4 trigramas
+        minimo_comum = max(1, len(trigramas(termo)) - 4 * limite)
+
+        comuns = {}
+        for trigrama in trigramas(termo):
+            for token in self.por_trigrama.get(trigrama, ()):
+                comuns[token] = comuns.get(token, 0) + 1
+
+        encontrados = []
+        for token, quantidade in comuns.items():
+            if quantidade < minimo_comum:
+                continue
+            # Compara com a palavra inteira ou com o começo dela (digitação incompleta)
+            if (distancia_limitada(termo, token, limite) <= limite
+                    or distancia_limitada(termo, token[:len(termo)], limite) <= limite):
+                encontrados.append(token)
+        return encontrados
+
+    # Ids que casam com todos os termos, do mais relevante ao menos relevante
+    def buscar(self, consulta, limite=None):
+        termos = tokenizar(consulta)
+        if not termos:
+            return []
+
+        # Para cada termo: ids com a palavra exata e ids com palavras que começam
+        # com ele (ou, se não houver nenhuma, palavras parecidas)
+        exatos = []
+        casados = []
+        for termo in termos:
+            exatos.append(self.postagens.get(termo, set()))
+            tokens = self._prefixados(termo)
+            aproximado = not tokens
+            if aproximado:
+                tokens = self._aproximados(termo)
+            ids = set().union(*(self.postagens[token] for token in tokens))
+            if not ids:
+                return []
+            casados.append((ids, aproximado))
+
+        # Interseção começando pelo conjunto menor
+        candidatos = set.intersection(*sorted((ids for ids, _ in casados), key=len))
+
+        def chave(item_id):
+            pontos = 0
+            for exato, (ids, aproximado) in zip(exatos, casados):
+                if item_id in exato:
+                    pontos += PESO_EXATO
+                else:
+                    pontos += PESO_APROXIMADO if aproximado else PESO_PREFIXO
+            return (-pontos, self.ordem[item_id])
+
+        if limite:
+            return heapq.nsmallest(limite, candidatos, key=chave)
+        return sorted(candidatos, key=chave)
+
+
+# Índice do backlog compartilhado entre execuções, um por espaço de trabalho
+# (a chave é o armazenamento dele; None = o único espaço): a cada execução só
+# as tarefas adicionadas, removidas ou editadas são reindexadas.
+_indice_padrao = IndiceBusca()
+_indices = weakref.WeakKeyDictionary()
+_trava = threading.Lock()
+
+
+def _indice(espaco):
+    if espaco is None:
+        return _indice_padrao
+    indice = _indices.get(espaco)
+    if indice is None:
+        indice = _indices[espaco] = IndiceBusca()
+    return indice
+
+
+def indice_backlog(backlog, espaco=None):
+    with _trava:
+        indice = _indice(espaco)
+        indice.sincronizar({tarefa["id"]: tarefa["descricao"] for tarefa in backlog})
+    return indice
+
+
+def buscar_backlog(consulta, limite=None, espaco=None):
+    with _trava:
+        return _indice(espaco).buscar(consulta, limite)
+
+
+def adicionar_backlog(tarefa, espaco=None):
+    with _trava:
+        _indice(espaco).adicionar(tarefa["id"], tarefa["descricao"])
+
+
+def remover_backlog(tarefa_id, espaco=None):
+    with _trava:
+        _indice(espaco).remover(tarefa_id)
@@ -0,0 +1,230 @@
+import contextlib
+import json
+import os
+import threading
+import uuid
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Byte travado no Windows (msvcrt trava trechos do arquivo); nas reservas, bem
+# depois do conteúdo, para quem só lê não esbarrar na trava
+POSICAO_TRAVA_RESERVA = 1 << 30
+
+
+# Trava exclusiva de um arquivo aberto; sem esperar, False se outro a tem
+def _travar(f, esperar=True, posicao=0):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if esperar else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(posicao)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if esperar else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        if esperar:
+            raise
+        return False
+    return True
+
+
+def _destravar(f, posicao=0):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(posicao)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Trava entre processos para o momento da gravação; leituras nunca a usam
+@contextlib.contextmanager
+def trava_processos(caminho):
+    with open(caminho, "a+b") as f:
+        _travar(f)
+        try:
+            yield
+        finally:
+            _destravar(f)
+
+
+# Reserva de nomes em uso por um processo (ex.: segmentos do histórico que as
+# sessões dele ainda podem ler): um arquivo na pasta, travado enquanto o
+# processo estiver vivo. A trava some com o processo, então quem consegue
+# travar uma reserva sabe que ela ficou para trás e pode apagá-la.
+class Reserva:
+    def __init__(self, pasta):
+        os.makedirs(pasta, exist_ok=True)
+        while True:
+            caminho = os.path.join(pasta, f"{os.getpid()}.{uuid.uuid4().hex[:8]}.reserva")
+            arquivo = open(caminho, "a+b")
+            # Outro processo pode ter apagado o arquivo antes da trava (parecia abandonado)
+            if _travar(arquivo, esperar=False, posicao=POSICAO_TRAVA_RESERVA) and _mesmo_arquivo(arquivo, caminho):
+                break
+            arquivo.close()
+        self.caminho = caminho
+        self._arquivo = arquivo
+        self._trava = threading.Lock()
+        self._liberar = weakref.finalize(self, _apagar_reserva, arquivo, caminho)
+
+    def gravar(self, nomes):
+        with self._trava:
+            self._arquivo.seek(0)
+            self._arquivo.truncate()
+            self._arquivo.write(json.dumps(sorted(nomes)).encode("utf-8"))
+            self._arquivo.flush()
+
+    def fechar(self):
+        self._liberar()
+
+
+# Uma reserva por processo e pasta, compartilhada por quem a usa nele (depois
+# de um fork, o processo filho cria a sua)
+_reservas = {}
+_trava_reservas = threading.Lock()
+
+
+def reserva(pasta):
+    chave = (os.getpid(), os.path.abspath(pasta))
+    with _trava_reservas:
+        if chave not in _reservas:
+            _reservas[chave] = Reserva(pasta)
+        return _reservas[chave]
+
+
+def _mesmo_arquivo(arquivo, caminho):
+    try:
+        return os.path.samestat(os.fstat(arquivo.fileno()), os.stat(caminho))
+    except FileNotFoundError:
+        return False
+
+
+def _apagar_reserva(arquivo, caminho):
+    arquivo.close()
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(caminho)
+
+
+# Nomes de todas as reservas vivas da pasta; as abandonadas são apagadas.
+# None se alguma não pôde ser lida (ex.: no meio de uma gravação): na dúvida,
+# quem chama não deve apagar nada.
+def nomes_reservados(pasta):
+    nomes = set()
+    try:
+        entradas = [entrada.path for entrada in os.scandir(pasta) if entrada.name.endswith(".reserva")]
+    except FileNotFoundError:
+        return nomes
+    for caminho in entradas:
+        try:
+            with open(caminho, "rb") as f:
+                if _travar(f, esperar=False, posicao=POSICAO_TRAVA_RESERVA):
+                    # Ninguém mais a trava: o processo dono morreu
+                    _destravar(f, posicao=POSICAO_TRAVA_RESERVA)
+                    abandonada = True
+                else:
+                    f.seek(0)
+                    nomes.update(json.loads(f.read().decode("utf-8")))
+                    abandonada = False
+        except FileNotFoundError:
+            continue
+        except ValueError:
+            return None
+        if abandonada:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(caminho)
+    return nomes
+
+
+# Mescla de três vias: aplica sobre "deles" (o que está em disco agora)
+# as alterações que "meu" fez em relação a "base" (o que a sessão carregou)
+def mesclar(colecao, base, meu, deles):
+    if colecao == "historico":
+        return mesclar_historico(base, meu, deles)
+    if colecao == "tarefas_dia":
+        return mesclar_tarefas_dia(base, meu, deles)
+    return mesclar_lista(base, meu, deles)
+
+
+# Listas de itens com "id": remoções, inclusões e edições por item
+def mesclar_lista(base, meu, deles):
+    base_por_id = {item["id"]: item for item in base}
+    meu_por_id = {item["id"]: item for item in meu}
+
+    resultado = []
+    presentes = set()
+    for item in deles:
+        tarefa_id = item["id"]
+        if tarefa_id in base_por_id and tarefa_id not in meu_por_id:
+            continue  # removido por mim
+        if tarefa_id in meu_por_id and meu_por_id[tarefa_id] != base_por_id.get(tarefa_id):
+            item = meu_por_id[tarefa_id]  # editado por mim
+        resultado.append(item)
+        presentes.add(tarefa_id)
+
+    # Incluídos por mim (itens que eles removeram continuam removidos)
+    for item in meu:
+        if item["id"] not in base_por_id and item["id"] not in presentes:
+            resultado.append(item)
+    return resultado
+
+
+# Histórico por tarefa; as datas são mescladas como conjuntos
+def mesclar_historico(base, meu, deles):
+    resultado = dict(deles)
+    for tarefa_id in base.keys() - meu.keys():
+        resultado.pop(tarefa_id, None)
+
+    for tarefa_id, info in meu.items():
+        info_base = base.get(tarefa_id)
+        if info == info_base:
+            continue
+        info_deles = deles.get(tarefa_id)
+        if info_deles is None or info_deles == info_base or not isinstance(info, dict):
+            resultado[tarefa_id] = info
+            continue
+
+        # Os dois alteraram a mesma tarefa: campo a campo, prevalecendo o que eu mudei
+        info_base = info_base if isinstance(info_base, dict) else {"datas": info_base or []}
+        info_deles = info_deles if isinstance(info_deles, dict) else {"datas": info_deles}
+        mesclado = dict(info_deles)
+        for campo, valor in info.items():
+            if campo != "datas" and valor != info_base.get(campo):
+                mesclado[campo] = valor
+
+        datas_base = set(info_base.get("datas", []))
+        datas_meu = set(info.get("datas", []))
+        removidas = datas_base - datas_meu
+        datas = [data for data in info_deles.get("datas", []) if data not in removidas]
+        ja_tem = set(datas)
+        datas.extend(data for data in info.get("datas", []) if data not in datas_base and data not in ja_tem)
+        mesclado["datas"] = datas
+        resultado[tarefa_id] = mesclado
+    return resultado
+
+
+# Tarefas do dia: a lista do dia mais recente vale; no mesmo dia, mescla por item
+def mesclar_tarefas_dia(base, meu, deles):
+    if meu["data"] != deles["data"]:
+        return meu if meu["data"] > deles["data"] else deles
+
+    if base["data"] == meu["data"]:
+        return {"data": meu["data"], "tarefas": mesclar_lista(base["tarefas"], meu["tarefas"], deles["tarefas"])}
+
+    # As duas sessões viraram o dia: junta as listas e mantém o que qualquer uma concluiu
+    meu_por_id = {item["id"]: item for item in meu["tarefas"]}
+    tarefas = []
+    for item in deles["tarefas"]:
+        if meu_por_id.get(item["id"], {}).get("concluida"):
+            item = dict(item, concluida=True)
+        tarefas.append(item)
+    ids = {item["id"] for item in tarefas}
+    tarefas.extend(item for item in meu["tarefas"] if item["id"] not in ids)
+    return {"data": meu["data"], "tarefas": tarefas}
+
+
+# Caminho da trava de uma pasta de dados
+def caminho_trava(raiz):
+    return os.path.join(raiz, ".gestor.lock")
@@ -0,0 +1,160 @@
+import collections
+import os
+import re
+import threading
+import time
+
+import armazenamento
+
+# Espaços de trabalho: cada usuário ou equipe tem a sua pasta de dados, dentro
+# da pasta GESTOR_ESPACOS, e escolhe o espaço por sessão. Sem GESTOR_ESPACOS,
+# o processo serve um único conjunto de dados (GESTOR_DADOS), como antes.
+
+# Espaço usado quando a sessão não escolhe nenhum
+ESPACO_PADRAO = "principal"
+
+# O nome vira o nome de uma pasta: nada de separadores ou "..".
+NOME_VALIDO = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+# Limites do cache de espaços carregados (GESTOR_LIMITE_ESPACOS e GESTOR_LIMITE_CACHE_MB)
+LIMITE_ESPACOS = 64
+LIMITE_BYTES = 256 * 1024 * 1024
+
+
+def validar_nome(nome):
+    if not isinstance(nome, str) or not NOME_VALIDO.fullmatch(nome) or ".." in nome:
+        raise ValueError(f"Nome de espaço de trabalho inválido: {nome!r}")
+    return nome
+
+
+# Espaço carregado: o armazenamento (com o cache dos arquivos já lidos) e,
+# para quem atende tudo em uma thread só (api.py), um gestor compartilhado
+class Espaco:
+    def __init__(self, nome, loja):
+        self.nome = nome
+        self.loja = loja
+        self.gestor = None
+        self.ultimo_acesso = time.monotonic()
+
+    # O gestor compartilhado guarda uma cópia do estado: conta em dobro
+    def tamanho(self):
+        tamanho = self.loja.tamanho_cache()
+        return tamanho * 2 if self.gestor is not None else tamanho
+
+
+# Cache LRU dos espaços carregados, limitado pela quantidade e pelo tamanho
+# do que eles têm em memória. Quem sai do cache grava o pendente e libera o
+# que tinha carregado; as sessões que ainda o usam passam para um novo na
+# próxima execução (ver app.gestor_da_sessao).
+class CacheEspacos:
+    def __init__(self, raiz, limite=LIMITE_ESPACOS, limite_bytes=LIMITE_BYTES, criar=None):
+        self.raiz = raiz
+        self.limite = limite
+        self.limite_bytes = limite_bytes
+        self.criar = criar or (lambda pasta: armazenamento.criar_armazenamento(raiz=pasta))
+        self._espacos = collections.OrderedDict()
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        # Descartes por quantidade e por tamanho
+        self.despejos = 0
+        self.despejos_por_tamanho = 0
+        self.bytes_despejados = 0
+
+    def caminho(self, nome):
+        return os.path.join(self.raiz, validar_nome(nome))
+
+    def obter(self, nome):
+        caminho = self.caminho(nome)
+        with self._trava:
+            espaco = self._espacos.get(nome)
+            if espaco is not None:
+                self._espacos.move_to_end(nome)
+                self.acertos += 1
+            else:
+                self.falhas += 1
+                os.makedirs(caminho, exist_ok=True)
+                espaco = self._espacos[nome] = Espaco(nome, self.criar(caminho))
+            espaco.ultimo_acesso = time.monotonic()
+            despejados = self._despejar()
+        # Fora da trava: fechar espera a gravação pendente
+        for despejado in despejados:
+            despejado.loja.fechar()
+        return espaco
+
+    # Tira os menos usados até caber nos limites; o mais recente sempre fica.
+    # O tamanho é o da última carga de cada um (o recém-criado ainda não tem)
+    def _despejar(self):
+        despejados = []
+        tamanhos = {nome: espaco.tamanho() for nome, espaco in self._espacos.items()}
+        total = sum(tamanhos.values())
+        while len(self._espacos) > 1:
+            por_tamanho = total > self.limite_bytes
+            if len(self._espacos) <= self.limite and not por_tamanho:
+                break
+            nome, espaco = self._espacos.popitem(last=False)
+            total -= tamanhos[nome]
+            self.despejos += 1
+            self.despejos_por_tamanho += por_tamanho
+            self.bytes_despejados += tamanhos[nome]
+            despejados.append(espaco)
+        return despejados
+
+    # Grava o pendente de todos e esvazia o cache
+    def fechar(self):
+        with self._trava:
+            espacos = list(self._espacos.values())
+            self._espacos.clear()
+        for espaco in espacos:
+            espaco.loja.fechar()
+
+    def metricas(self):
+        agora = time.monotonic()
+        with self._trava:
+            espacos = [
+                {"nome": nome, "bytes": espaco.tamanho(), "ocioso_s": round(agora - espaco.ultimo_acesso, 1),
+                 "gravacao": espaco.loja.metricas_gravacao()}
+                for nome, espaco in reversed(self._espacos.items())
+            ]
+            return {
+                "espacos": len(espacos),
+                "limite": self.limite,
+                "bytes": sum(espaco["bytes"] for espaco in espacos),
+                "limite_bytes": self.limite_bytes,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "despejos": self.despejos,
+                "despejos_por_tamanho": self.despejos_por_tamanho,
+                "bytes_despejados": self.bytes_despejados,
+                "carregados": espacos,
+            }
+
+
+_cache = None
+_trava_cache = threading.Lock()
+
+
+# Cache compartilhado pelo processo; None quando GESTOR_ESPACOS não está definida
+def compartilhado():
+    global _cache
+    raiz = os.environ.get("GESTOR_ESPACOS")
+    if not raiz:
+        return None
+    with _trava_cache:
+        if _cache is None:
+            _cache = CacheEspacos(
+                raiz,
+                limite=int(os.environ.get("GESTOR_LIMITE_ESPACOS", LIMITE_ESPACOS)),
+                limite_bytes=int(float(os.environ.get("GESTOR_LIMITE_CACHE_MB", LIMITE_BYTES / 1024 / 1024)) * 1024 * 1024),
+            )
+        return _cache
+
+
+# Armazenamento do espaço escolhido pela sessão (None = o padrão)
+def obter_loja(nome=None):
+    cache = compartilhado()
+    if cache is None:
+        if nome:
+            raise ValueError("Espaços de trabalho desativados (defina GESTOR_ESPACOS)")
+        return armazenamento.obter()
+    return cache.obter(nome or ESPACO_PADRAO).loja
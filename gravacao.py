@@ -0,0 +1,202 @@
+import atexit
+import contextlib
+import queue
+import signal
+import threading
+import time
+import weakref
+
+# Intervalo padrão, em segundos, entre uma alteração e a sua gravação definitiva
+JANELA_PADRAO = 1.0
+
+# Snapshots aguardando a thread; com a fila cheia, o mais antigo é descartado
+# (quem compacta segura a trava do diário, e a thread precisa dela para gravar)
+LIMITE_FILA = 4
+
+# Espera máxima, em segundos, por uma descarga em andamento ao receber SIGTERM
+# (o sinal pode ter chegado no meio dela, na mesma thread)
+ESPERA_SIGTERM = 5.0
+
+_escritores = weakref.WeakSet()
+_sigterm_instalado = False
+
+
+# Gravação adiada (write-behind) de um armazenamento. Os eventos do diário
+# são escritos na hora (outras sessões e processos já os veem) e só o fsync
+# fica para esta thread; os snapshots da compactação entram numa fila e, dos
+# que se acumularem, só o mais recente é gravado. Uma queda do sistema perde
+# no máximo a janela; ao sair (atexit ou SIGTERM) tudo é gravado antes.
+class Escritor:
+    def __init__(self, loja, janela=JANELA_PADRAO):
+        self.loja = loja
+        self.janela = janela
+        self.fila = queue.Queue(maxsize=LIMITE_FILA)
+        # Uma descarga por vez (thread, atexit ou SIGTERM)
+        self._trava = threading.Lock()
+        self._condicao = threading.Condition()
+        self._eventos_pendentes = 0
+        # Momento da alteração pendente mais antiga; None quando tudo está gravado
+        self._pendente_desde = None
+        self.descargas = 0
+        self.snapshots_gravados = 0
+        self.snapshots_descartados = 0
+        self.ultimo_atraso = 0.0
+        self.erro = None
+        self._parado = False
+
+        _escritores.add(self)
+        instalar_sigterm()
+        self._thread = threading.Thread(target=self._rodar, name="gestor-gravacao", daemon=True)
+        self._thread.start()
+
+    def _pendente(self):
+        with self._condicao:
+            if self._pendente_desde is None:
+                self._pendente_desde = time.monotonic()
+                self._condicao.notify()
+            parado = self._parado
+        # Alteração que chegou depois de parar: sem a thread, o armazenamento
+        # grava assim que quem chamou soltar a trava do diário
+        if parado:
+            self.loja.descarregar_fora_da_trava(self)
+
+    # Evento já escrito no diário, ainda sem fsync
+    def evento_escrito(self):
+        with self._condicao:
+            self._eventos_pendentes += 1
+        self._pendente()
+
+    def snapshot(self, estado, seq, agregados=None):
+        while True:
+            try:
+                self.fila.put_nowait((estado, seq, agregados))
+                break
+            except queue.Full:
+                with contextlib.suppress(queue.Empty):
+                    self.fila.get_nowait()
+                    self.snapshots_descartados += 1
+        self._pendente()
+
+    def _rodar(self):
+        while True:
+            with self._condicao:
+                while self._pendente_desde is None and not self._parado:
+                    self._condicao.wait()
+                # O que chegar durante a janela vai na mesma descarga
+                self._condicao.wait_for(lambda: self._parado, timeout=self.janela)
+                if self._parado:
+                    return
+            try:
+                self.descarregar()
+            except Exception as erro:
+                # Fica pendente e é tentado de novo na próxima janela
+                self.erro = f"{type(erro).__name__}: {erro}"
+
+    # Grava agora tudo o que está pendente. Com espera (em segundos), desiste
+    # se a descarga em andamento não terminar a tempo e retorna False
+    def descarregar(self, espera=None):
+        if not self._trava.acquire(timeout=-1 if espera is None else espera):
+            return False
+        try:
+            with self._condicao:
+                eventos, desde = self._eventos_pendentes, self._pendente_desde
+                self._eventos_pendentes, self._pendente_desde = 0, None
+
+            trabalhos = []
+            while True:
+                try:
+                    trabalhos.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                if trabalhos:
+                    estado, seq, agregados = max(trabalhos, key=lambda trabalho: trabalho[1])
+                    self.loja.gravar_snapshot_adiado(estado, seq, agregados)
+                    self.snapshots_gravados += 1
+                    self.snapshots_descartados += len(trabalhos) - 1
+                if eventos:
+                    self.loja.sincronizar_diario()
+            except BaseException:
+                # Devolve o trabalho para a próxima tentativa
+                with self._condicao:
+                    self._eventos_pendentes += eventos
+                    if desde is not None and (self._pendente_desde is None or desde < self._pendente_desde):
+                        self._pendente_desde = desde
+                # Com a fila cheia, os que chegaram depois já substituem este
+                if trabalhos:
+                    with contextlib.suppress(queue.Full):
+                        self.fila.put_nowait(max(trabalhos, key=lambda trabalho: trabalho[1]))
+                raise
+
+            self.descargas += 1
+            self.erro = None
+            if desde is not None:
+                self.ultimo_atraso = time.monotonic() - desde
+        finally:
+            self._trava.release()
+        return True
+
+    # Encerra a thread gravando o que está pendente (ex.: espaço de trabalho
+    # que saiu do cache); o que chegar depois é gravado por quem o registrou,
+    # ao soltar a trava do diário
+    def parar(self):
+        with self._condicao:
+            self._parado = True
+            self._condicao.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self.loja.descarregar_fora_da_trava(self)
+        _escritores.discard(self)
+
+    # Atraso de durabilidade: há quanto tempo a alteração pendente mais antiga espera
+    def metricas(self):
+        with self._condicao:
+            atraso = time.monotonic() - self._pendente_desde if self._pendente_desde is not None else 0.0
+            eventos = self._eventos_pendentes
+        return {
+            "janela_s": self.janela,
+            "atraso_s": round(atraso, 3),
+            "ultimo_atraso_s": round(self.ultimo_atraso, 3),
+            "eventos_pendentes": eventos,
+            "snapshots_pendentes": self.fila.qsize(),
+            "snapshots_gravados": self.snapshots_gravados,
+            "snapshots_descartados": self.snapshots_descartados,
+            "descargas": self.descargas,
+            "erro": self.erro,
+        }
+
+
+# Quem segura a trava do diário nesta thread (sinal que chegou no meio de
+# um registro) fica para o atexit, que roda depois de ela ser solta
+def descarregar_todos(espera=None):
+    for escritor in list(_escritores):
+        if not escritor.loja.com_trava_diario():
+            escritor.descarregar(espera)
+
+
+atexit.register(descarregar_todos)
+
+
+# SIGTERM (ex.: parada de um serviço) grava o pendente antes de sair. Só a
+# thread principal pode instalar o tratador; no Streamlit, que cria o
+# armazenamento em outra thread, o próprio servidor encerra e o atexit grava.
+def instalar_sigterm():
+    global _sigterm_instalado
+    if _sigterm_instalado or threading.current_thread() is not threading.main_thread():
+        return
+    anterior = signal.getsignal(signal.SIGTERM)
+
+    # Depois de gravar, faz o que o tratador anterior faria: chama o dele, segue
+    # em frente se o sinal era ignorado e só sai no comportamento padrão
+    def ao_receber(numero, quadro):
+        descarregar_todos(ESPERA_SIGTERM)
+        if callable(anterior):
+            anterior(numero, quadro)
+        elif anterior == signal.SIG_IGN:
+            return
+        else:
+            raise SystemExit(128 + numero)
+
+    signal.signal(signal.SIGTERM, ao_receber)
+    _sigterm_instalado = True
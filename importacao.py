@@ -0,0 +1,241 @@
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import sys
+
+import armazenamento
+import sequencias
+import servico
+
+FORMATOS = ("csv", "jsonl")
+
+# Colunas de cada tipo de arquivo
+CAMPOS = {
+    "backlog": ("id", "descricao", "projeto"),
+    "historico": ("tarefa_id", "descricao", "data"),
+}
+
+
+def formato_de(nome_arquivo):
+    formato = os.path.splitext(nome_arquivo)[1].lower().lstrip(".")
+    if formato == "json":
+        formato = "jsonl"
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato não suportado: {nome_arquivo} (use .csv ou .jsonl)")
+    return formato
+
+
+# Lê as linhas de um arquivo de texto uma a uma: (número da linha, dicionário)
+def ler_linhas(arquivo, formato, erros):
+    if formato == "csv":
+        # A linha 1 é o cabeçalho
+        for numero, linha in enumerate(csv.DictReader(arquivo), start=2):
+            yield numero, linha
+        return
+
+    for numero, texto in enumerate(arquivo, start=1):
+        if not texto.strip():
+            continue
+        try:
+            linha = json.loads(texto)
+        except json.JSONDecodeError as erro:
+            erros.append(f"Linha {numero}: JSON inválido ({erro.msg})")
+            continue
+        if not isinstance(linha, dict):
+            erros.append(f"Linha {numero}: esperado um objeto JSON")
+            continue
+        yield numero, linha
+
+
+def _texto(linha, campo):
+    valor = linha.get(campo)
+    return str(valor).strip() if valor is not None else ""
+
+
+def validar_backlog(linhas, erros):
+    for numero, linha in linhas:
+        descricao = _texto(linha, "descricao")
+        if not descricao:
+            erros.append(f"Linha {numero}: descrição vazia")
+            continue
+        yield {"descricao": descricao, "projeto": _texto(linha, "projeto") or None}
+
+
+def validar_historico(linhas, erros):
+    for numero, linha in linhas:
+        tarefa_id = _texto(linha, "tarefa_id")
+        descricao = _texto(linha, "descricao")
+        if not tarefa_id and not descricao:
+            erros.append(f"Linha {numero}: informe tarefa_id ou descricao")
+            continue
+        try:
+            data = datetime.date.fromisoformat(_texto(linha, "data")).isoformat()
+        except ValueError:
+            erros.append(f"Linha {numero}: data inválida {linha.get('data')!r} (use AAAA-MM-DD)")
+            continue
+        yield {"tarefa_id": tarefa_id, "descricao": descricao, "data": data}
+
+
+def _carimbo():
+    return datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+
+
+# Inclui no backlog as tarefas validadas, criando os projetos que faltarem
+def importar_backlog(estado, itens):
+    tarefas_recorrentes, backlog, historico, tarefas_dia, projetos = estado
+    carimbo = _carimbo()
+    nomes_projetos = {p["nome"] for p in projetos}
+
+    total = 0
+    for item in itens:
+        tarefa = {"id": f"back_{len(backlog) + 1}_{carimbo}", "descricao": item["descricao"]}
+        if item["projeto"]:
+            if item["projeto"] not in nomes_projetos:
+                projetos.append({"id": f"proj_{len(projetos) + 1}_{carimbo}", "nome": item["projeto"]})
+                nomes_projetos.add(item["projeto"])
+            tarefa["projeto"] = item["projeto"]
+        backlog.append(tarefa)
+        total += 1
+    return total
+
+
+# Registra as conclusões validadas, criando as tarefas recorrentes que faltarem
+def importar_historico(estado, itens):
+    tarefas_recorrentes, backlog, historico, tarefas_dia, projetos = estado
+    carimbo = _carimbo()
+    ids = {t["id"] for t in tarefas_recorrentes}
+    por_descricao = {t["descricao"]: t["id"] for t in tarefas_recorrentes}
+    datas_existentes = {}
+
+    total = 0
+    for item in itens:
+        tarefa_id = item["tarefa_id"] if item["tarefa_id"] in ids else por_descricao.get(item["descricao"])
+        if tarefa_id is None:
+            descricao = item["descricao"] or item["tarefa_id"]
+            tarefa_id = item["tarefa_id"] or f"rec_{len(tarefas_recorrentes) + 1}_{carimbo}"
+            tarefas_recorrentes.append({"id": tarefa_id, "descricao": descricao})
+            tarefas_dia["tarefas"].append({"id": tarefa_id, "descricao": descricao, "tipo": "recorrente", "concluida": False})
+            ids.add(tarefa_id)
+            por_descricao[descricao] = tarefa_id
+
+        info = historico.setdefault(tarefa_id, servico.historico_vazio())
+        if tarefa_id not in datas_existentes:
+            datas_existentes[tarefa_id] = set(info["datas"])
+        if item["data"] in datas_existentes[tarefa_id]:
+            continue
+        info["datas"].append(item["data"])
+        datas_existentes[tarefa_id].add(item["data"])
+        total += 1
+
+    # Sequências recalculadas uma vez por tarefa, no fim
+    for tarefa_id in datas_existentes:
+        info = historico[tarefa_id]
+        motor = sequencias.motor_para(info["datas"])
+        if not info.get("sequencia_editada", False):
+            info["sequencia_atual"] = motor.sequencia_atual()
+        info["recorde_sequencia"] = max(info.get("recorde_sequencia", 0), motor.maior_sequencia(), info["sequencia_atual"])
+
+        # Conclusão de hoje marca a tarefa do dia
+        if tarefas_dia["data"] in datas_existentes[tarefa_id]:
+            for tarefa in tarefas_dia["tarefas"]:
+                if tarefa["id"] == tarefa_id:
+                    tarefa["concluida"] = True
+    return total
+
+
+# Importa um arquivo inteiro: leitura, validação e inclusão encadeadas linha a linha
+def importar(estado, tipo, arquivo, formato):
+    erros = []
+    linhas = ler_linhas(arquivo, formato, erros)
+    if tipo == "backlog":
+        total = importar_backlog(estado, validar_backlog(linhas, erros))
+    else:
+        total = importar_historico(estado, validar_historico(linhas, erros))
+    return total, erros
+
+
+def linhas_backlog(backlog):
+    for tarefa in backlog:
+        yield {"id": tarefa["id"], "descricao": tarefa["descricao"], "projeto": tarefa.get("projeto", "")}
+
+
+def linhas_historico(historico, tarefas_recorrentes):
+    descricoes = {t["id"]: t["descricao"] for t in tarefas_recorrentes}
+    for tarefa_id, info in historico.items():
+        datas = info.get("datas", []) if isinstance(info, dict) else info
+        descricao = descricoes.get(tarefa_id, "")
+        for data in sorted(datas):
+            yield {"tarefa_id": tarefa_id, "descricao": descricao, "data": data}
+
+
+# Escreve as linhas no destino à medida que são geradas
+def escrever_linhas(linhas, destino, formato, campos):
+    if formato == "csv":
+        escritor = csv.DictWriter(destino, fieldnames=campos)
+        escritor.writeheader()
+        for linha in linhas:
+            escritor.writerow(linha)
+        return
+
+    for linha in linhas:
+        destino.write(json.dumps(linha, ensure_ascii=False))
+        destino.write("\n")
+
+
+def exportar(estado, tipo, destino, formato):
+    tarefas_recorrentes, backlog, historico, tarefas_dia, projetos = estado
+    if tipo == "backlog":
+        linhas = linhas_backlog(backlog)
+    else:
+        linhas = linhas_historico(historico, tarefas_recorrentes)
+    escrever_linhas(linhas, destino, formato, CAMPOS[tipo])
+
+
+# Texto de um arquivo enviado pelo navegador, lido sob demanda
+def texto_do_envio(envio):
+    return io.TextIOWrapper(envio, encoding="utf-8-sig", newline="")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importação e exportação em lote do Gestor de Tarefas")
+    parser.add_argument("--dados", default=None, help="Pasta de dados (padrão: GESTOR_DADOS ou a pasta atual)")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    for comando in ("importar", "exportar"):
+        sub = subparsers.add_parser(comando)
+        sub.add_argument("tipo", choices=sorted(CAMPOS))
+        sub.add_argument("arquivo", help="Arquivo .csv ou .jsonl (use - para a entrada/saída padrão)")
+        sub.add_argument("--formato", choices=FORMATOS, help="Formato, se não der para deduzir pelo nome")
+
+    args = parser.parse_args()
+    formato = args.formato or formato_de(args.arquivo)
+    # O gestor junta o último snapshot e o diário de alterações
+    gestor = servico.Gestor(armazenamento.criar_armazenamento(raiz=args.dados))
+
+    if args.comando == "exportar":
+        gestor.carregar(virar_dia=False)
+        if args.arquivo == "-":
+            exportar(gestor.estado, args.tipo, sys.stdout, formato)
+        else:
+            with open(args.arquivo, "w", newline="", encoding="utf-8") as destino:
+                exportar(gestor.estado, args.tipo, destino, formato)
+        return
+
+    gestor.carregar()
+    # Tudo em uma única gravação
+    with gestor.edicao_direta("importar", dados=args.tipo, arquivo=os.path.basename(args.arquivo)) as estado:
+        if args.arquivo == "-":
+            total, erros = importar(estado, args.tipo, sys.stdin, formato)
+        else:
+            with open(args.arquivo, "r", newline="", encoding="utf-8-sig") as arquivo:
+                total, erros = importar(estado, args.tipo, arquivo, formato)
+    for erro in erros:
+        print(erro, file=sys.stderr)
+    print(f"{total} registros importados, {len(erros)} linhas ignoradas")
+
+
+if __name__ == "__main__":
+    main()
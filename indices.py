@@ -0,0 +1,61 @@
+# Índices em memória sobre o backlog e as tarefas do dia:
+# id -> tarefa, projeto -> ids e quais ids já estão no dia.
+# Montados uma vez por execução e atualizados a cada alteração.
+class IndiceTarefas:
+    def __init__(self, backlog, tarefas_dia):
+        self.por_id = {}
+        self.por_projeto = {}
+        for tarefa in backlog:
+            self.adicionar_backlog(tarefa)
+
+        self.no_dia = set()
+        self.definir_dia(tarefas_dia)
+
+    # Tarefas sem projeto ficam sob a chave None
+    def adicionar_backlog(self, tarefa):
+        self.por_id[tarefa["id"]] = tarefa
+        self.por_projeto.setdefault(tarefa.get("projeto"), {})[tarefa["id"]] = tarefa
+
+    def remover_backlog(self, tarefa_id):
+        tarefa = self.por_id.pop(tarefa_id, None)
+        if tarefa is not None:
+            self.por_projeto.get(tarefa.get("projeto"), {}).pop(tarefa_id, None)
+            self.no_dia.discard(tarefa_id)
+        return tarefa
+
+    def tarefa(self, tarefa_id):
+        return self.por_id.get(tarefa_id)
+
+    # Tarefas de um projeto, na ordem em que foram adicionadas (None = sem projeto)
+    def do_projeto(self, projeto):
+        return list(self.por_projeto.get(projeto, {}).values())
+
+    def contar_projeto(self, projeto):
+        return len(self.por_projeto.get(projeto, {}))
+
+    # Tira o projeto das tarefas dele, que passam a ficar sem projeto
+    def remover_projeto(self, projeto):
+        tarefas = self.por_projeto.pop(projeto, {})
+        sem_projeto = self.por_projeto.setdefault(None, {})
+        for tarefa in tarefas.values():
+            tarefa.pop("projeto", None)
+            sem_projeto[tarefa["id"]] = tarefa
+        return list(tarefas.values())
+
+    # Devolve a tarefa a um projeto, tirando-a do grupo em que estava
+    def definir_projeto(self, tarefa, projeto):
+        self.por_projeto.get(tarefa.get("projeto"), {}).pop(tarefa["id"], None)
+        tarefa["projeto"] = projeto
+        self.por_projeto.setdefault(projeto, {})[tarefa["id"]] = tarefa
+
+    def definir_dia(self, tarefas_dia):
+        self.no_dia = {tarefa["id"] for tarefa in tarefas_dia["tarefas"]}
+
+    def adicionar_ao_dia(self, tarefa_id):
+        self.no_dia.add(tarefa_id)
+
+    def remover_do_dia(self, tarefa_id):
+        self.no_dia.discard(tarefa_id)
+
+    def esta_no_dia(self, tarefa_id):
+        return tarefa_id in self.no_dia
@@ -0,0 +1,216 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import armazenamento
+import concorrencia
+import sequencias
+
+# Caracteres lidos por vez do arquivo
+TAMANHO_BLOCO = 64 * 1024
+
+ESPACOS = " \t\r\n"
+
+# Caracteres que podem continuar um número JSON
+CARACTERES_NUMERO = "0123456789+-.eE"
+
+
+# Leitor incremental de um objeto JSON: entrega os pares (chave, valor) do
+# objeto de nível mais alto um a um, lendo o arquivo em blocos. Só o valor
+# da vez fica em memória (ex.: a lista de datas de uma tarefa), nunca o
+# arquivo inteiro.
+class LeitorIncremental:
+    def __init__(self, arquivo, tamanho_bloco=TAMANHO_BLOCO):
+        self.arquivo = arquivo
+        self.tamanho_bloco = tamanho_bloco
+        self.buffer = ""
+        self.posicao = 0
+        self.fim = False
+        self.lidos = 0
+        self._decodificador = json.JSONDecoder()
+
+    def _ler_mais(self):
+        if self.fim:
+            return False
+        bloco = self.arquivo.read(self.tamanho_bloco)
+        if not bloco:
+            self.fim = True
+            return False
+        self.lidos += len(bloco)
+        # O que já foi consumido sai do buffer
+        self.buffer = self.buffer[self.posicao:] + bloco
+        self.posicao = 0
+        return True
+
+    # Próximo caractere depois dos espaços, sem consumi-lo ("" no fim do arquivo)
+    def _proximo(self):
+        while True:
+            while self.posicao < len(self.buffer) and self.buffer[self.posicao] in ESPACOS:
+                self.posicao += 1
+            if self.posicao < len(self.buffer):
+                return self.buffer[self.posicao]
+            if not self._ler_mais():
+                return ""
+
+    def _esperar(self, aceitos):
+        caractere = self._proximo()
+        if not caractere or caractere not in aceitos:
+            raise ValueError(f"JSON inválido: esperado {aceitos!r} perto do caractere {self.lidos - len(self.buffer) + self.posicao}")
+        self.posicao += 1
+        return caractere
+
+    # Um valor JSON completo; se o buffer acaba no meio dele, lê mais e tenta de novo
+    def _valor(self):
+        self._proximo()
+        while True:
+            try:
+                valor, fim = self._decodificador.raw_decode(self.buffer, self.posicao)
+            except json.JSONDecodeError:
+                if not self._ler_mais():
+                    raise
+                continue
+            # Um número cortado no fim do buffer pode ter um começo que já é
+            # válido ("-0." é lido como -0, "1.5e" como 1.5): se depois dele só
+            # há caracteres de número, ele pode continuar no próximo bloco
+            if type(valor) in (int, float):
+                seguinte = fim
+                while seguinte < len(self.buffer) and self.buffer[seguinte] in CARACTERES_NUMERO:
+                    seguinte += 1
+                if seguinte == len(self.buffer) and self._ler_mais():
+                    continue
+            self.posicao = fim
+            return valor
+
+    def pares(self):
+        self._esperar("{")
+        if self._proximo() == "}":
+            self.posicao += 1
+            return
+        while True:
+            chave = self._valor()
+            if not isinstance(chave, str):
+                raise ValueError("JSON inválido: chave que não é texto")
+            self._esperar(":")
+            yield chave, self._valor()
+            if self._esperar(",}") == "}":
+                return
+
+
+# Migra o historico.json da pasta e grava na geração dada; retorna (tarefas,
+# conclusões). O formato sai da chave "formato", que o armazenamento grava
+# como a primeira do objeto. No formato em segmentos, o índice não tem datas e
+# é lido inteiro (os segmentos só são lidos se alguma entrada precisar); no
+# antigo, as tarefas são lidas, migradas e gravadas uma a uma, sem montar o
+# histórico inteiro em memória.
+def _migrar_historico_json(loja, geracao):
+    caminho = loja.caminho("historico")
+    if not os.path.exists(caminho):
+        loja._gravar_historico({}, geracao)
+        return 0, 0
+
+    historico = None
+    with open(caminho, "r", encoding="utf-8") as f:
+        pares = LeitorIncremental(f).pares()
+        primeiro = next(pares, None)
+        if primeiro == ("formato", armazenamento.FORMATO_HISTORICO):
+            indice = dict([primeiro, *pares])
+            historico = {tarefa_id: sequencias.migrar_entrada(info) for tarefa_id, info in loja._abrir_historico(indice).items()}
+        else:
+            entradas = itertools.chain([primeiro] if primeiro is not None else [], pares)
+            # Os segmentos são gravados enquanto o arquivo é lido; o índice, depois
+            segmentos, tarefas = loja._gravar_segmentos_aos_poucos(
+                ((tarefa_id, sequencias.migrar_entrada(dados)) for tarefa_id, dados in entradas), geracao
+            )
+
+    if historico is not None:
+        loja._gravar_historico(historico, geracao)
+        return len(historico), sum(len(info["datas"]) for info in historico.values())
+    loja._gravar_indice_historico(segmentos, tarefas)
+    return len(tarefas), sum(resumo[0] for info in tarefas.values() for resumo in info["anos"].values())
+
+
+def _migrar_json(loja):
+    caminho_versoes = loja.caminho_versoes()
+    with concorrencia.trava_processos(concorrencia.caminho_trava(loja.raiz)):
+        versoes = armazenamento.ler_versoes(caminho_versoes)
+        # Nova versão do histórico: as sessões abertas relêem o que mudou
+        versoes["historico"] = versoes.get("historico", 0) + 1
+        tarefas, conclusoes = _migrar_historico_json(loja, versoes["historico"])
+        versoes["esquema"] = armazenamento.VERSAO_ESQUEMA
+        armazenamento.gravar_json_atomico(caminho_versoes, versoes)
+    return {"tarefas": tarefas, "conclusoes": conclusoes}
+
+
+def _migrar_sqlite(loja):
+    with loja.conectar() as conexao:
+        conexao.execute("BEGIN IMMEDIATE")
+        # Tarefas só com datas (formato muito antigo) ganham a linha de sequência
+        orfas = [
+            tarefa_id for (tarefa_id,) in conexao.execute(
+                "SELECT DISTINCT tarefa_id FROM conclusoes WHERE tarefa_id NOT IN (SELECT tarefa_id FROM sequencias)"
+            )
+        ]
+        for tarefa_id in orfas:
+            datas = [data for (data,) in conexao.execute("SELECT data FROM conclusoes WHERE tarefa_id = ?", (tarefa_id,))]
+            sequencia = sequencias.calcular_sequencia_antiga(datas)
+            conexao.execute(
+                "INSERT INTO sequencias (tarefa_id, sequencia_atual, sequencia_editada, recorde_sequencia) VALUES (?, ?, 0, ?)",
+                (tarefa_id, sequencia, sequencia),
+            )
+        # Formato antigo sem recorde: o recorde é a sequência atual
+        conexao.execute("UPDATE sequencias SET recorde_sequencia = COALESCE(sequencia_atual, 0) WHERE recorde_sequencia IS NULL")
+        conexao.execute("UPDATE sequencias SET sequencia_atual = 0 WHERE sequencia_atual IS NULL")
+        conexao.execute("UPDATE sequencias SET sequencia_editada = 0 WHERE sequencia_editada IS NULL")
+
+        versao = int(loja._ler_metadado(conexao, "versao.historico", 0)) + 1
+        conexao.execute("INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)", ("versao.historico", str(versao)))
+        conexao.execute(
+            "INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)", ("esquema", str(armazenamento.VERSAO_ESQUEMA))
+        )
+    return len(orfas)
+
+
+# Leva os dados à versão atual do formato, uma única vez. Com a trava do
+# diário, nenhuma sessão grava eventos ou snapshots no meio.
+def migrar(loja):
+    with loja.trava_diario():
+        versao = loja.esquema()
+        if versao >= armazenamento.VERSAO_ESQUEMA:
+            return None
+        if isinstance(loja, armazenamento.ArmazenamentoSQLite):
+            resultado = {"tarefas_convertidas": _migrar_sqlite(loja)}
+        else:
+            resultado = _migrar_json(loja)
+    resultado["de"] = versao
+    resultado["para"] = armazenamento.VERSAO_ESQUEMA
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra os dados do Gestor de Tarefas para a versão atual do formato")
+    parser.add_argument("--dados", default=None, help="Pasta de dados (padrão: GESTOR_DADOS ou a pasta atual)")
+    parser.add_argument("--armazenamento", choices=("json", "sqlite"), default=None,
+                        help="Tipo de armazenamento (padrão: GESTOR_ARMAZENAMENTO ou json)")
+    parser.add_argument("--verificar", action="store_true", help="Só mostra a versão; sai com código 1 se precisar migrar")
+    args = parser.parse_args()
+
+    loja = armazenamento.criar_armazenamento(args.armazenamento, args.dados)
+    versao = loja.esquema()
+    if args.verificar:
+        print(f"Versão do formato: {versao} (atual: {armazenamento.VERSAO_ESQUEMA})")
+        sys.exit(0 if versao >= armazenamento.VERSAO_ESQUEMA else 1)
+
+    inicio = time.perf_counter()
+    resultado = migrar(loja)
+    if resultado is None:
+        print(f"Os dados já estão na versão {versao}")
+        return
+    detalhes = ", ".join(f"{chave}: {valor}" for chave, valor in resultado.items() if chave not in ("de", "para"))
+    print(f"Dados migrados da versão {resultado['de']} para a {resultado['para']} em {time.perf_counter() - inicio:.1f}s ({detalhes})")
+
+
+if __name__ == "__main__":
+    main()
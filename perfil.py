@@ -0,0 +1,111 @@
+import contextlib
+import os
+import threading
+import time
+
+# Medição leve por execução: trechos cronometrados (carga, migração, virada do
+# dia, abas, gravação) e contadores como bytes lidos e gravados. Fora de uma
+# coleta, trecho() e contar() não fazem nada.
+_local = threading.local()
+
+
+class Coleta:
+    def __init__(self, nome=""):
+        self.nome = nome
+        self.inicio = time.perf_counter()
+        self.inicio_relogio = time.time()
+        self.thread = threading.get_ident()
+        self.duracao = None
+        self.trechos = []
+        self.contadores = {}
+        self._abertos = []
+
+    # Trechos em ordem de início
+    def ordenados(self):
+        return sorted(self.trechos, key=lambda trecho: trecho["inicio"])
+
+    def como_dict(self):
+        return {
+            "nome": self.nome,
+            "inicio": self.inicio_relogio,
+            "duracao": self.duracao,
+            "contadores": dict(self.contadores),
+            "trechos": self.ordenados(),
+        }
+
+
+def atual():
+    return getattr(_local, "coleta", None)
+
+
+@contextlib.contextmanager
+def coletar(nome=""):
+    anterior = atual()
+    coleta = Coleta(nome)
+    _local.coleta = coleta
+    try:
+        yield coleta
+    finally:
+        coleta.duracao = time.perf_counter() - coleta.inicio
+        _local.coleta = anterior
+
+
+@contextlib.contextmanager
+def trecho(nome, **dados):
+    coleta = atual()
+    if coleta is None:
+        yield None
+        return
+
+    registro = {"nome": nome, "inicio": time.perf_counter() - coleta.inicio, "nivel": len(coleta._abertos), "dados": dados}
+    coleta._abertos.append(registro)
+    try:
+        yield registro
+    finally:
+        registro["duracao"] = time.perf_counter() - coleta.inicio - registro["inicio"]
+        coleta._abertos.remove(registro)
+        coleta.trechos.append(registro)
+
+
+# Soma ao contador da execução e de todos os trechos abertos (ex.: bytes lidos)
+def contar(nome, valor):
+    coleta = atual()
+    if coleta is None:
+        return
+    coleta.contadores[nome] = coleta.contadores.get(nome, 0) + valor
+    for registro in coleta._abertos:
+        registro["dados"][nome] = registro["dados"].get(nome, 0) + valor
+
+
+# Linhas para exibir em tabela, com os trechos internos recuados
+def tabela(coleta):
+    linhas = []
+    for registro in coleta.ordenados():
+        linha = {"Trecho": "  " * registro["nivel"] + registro["nome"], "ms": round(registro["duracao"] * 1000, 2)}
+        linha.update(registro["dados"])
+        linhas.append(linha)
+    return linhas
+
+
+# Formato de trace do Chrome (chrome://tracing, Perfetto) para várias execuções
+def chrome_trace(coletas):
+    eventos = []
+    pid = os.getpid()
+    for coleta in coletas:
+        base = coleta.inicio_relogio * 1_000_000
+        eventos.append({
+            "name": coleta.nome or "execução", "ph": "X", "pid": pid, "tid": coleta.thread,
+            "ts": base, "dur": (coleta.duracao or 0) * 1_000_000, "args": dict(coleta.contadores),
+        })
+        for registro in coleta.ordenados():
+            eventos.append({
+                "name": registro["nome"], "ph": "X", "pid": pid, "tid": coleta.thread,
+                "ts": base + registro["inicio"] * 1_000_000, "dur": registro["duracao"] * 1_000_000,
+                "args": registro["dados"],
+            })
+        if coleta.contadores:
+            eventos.append({
+                "name": "contadores", "ph": "C", "pid": pid, "tid": coleta.thread,
+                "ts": base + (coleta.duracao or 0) * 1_000_000, "args": dict(coleta.contadores),
+            })
+    return {"traceEvents": eventos, "displayTimeUnit": "ms"}
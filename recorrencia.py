@@ -0,0 +1,226 @@
+import calendar
+import datetime
+import heapq
+
+import sequencias
+
+# Regras de recorrência das tarefas recorrentes (campo "regra" da tarefa;
+# sem ele, a tarefa é diária):
+#   {"tipo": "diaria"}
+#   {"tipo": "semanal", "dias": [0, 2, 4]}                  0 = segunda-feira
+#   {"tipo": "intervalo", "dias": 3, "inicio": "AAAA-MM-DD"}  a cada N dias
+#   {"tipo": "mensal", "dia": 15}   no mês sem esse dia, o último dia do mês
+# Os dias são inteiros (ver sequencias.dia_para_inteiro).
+
+DIARIA = {"tipo": "diaria"}
+
+NOMES_DIAS = ("seg", "ter", "qua", "qui", "sex", "sáb", "dom")
+
+
+def _data(dia):
+    return datetime.date.fromordinal(dia + sequencias.EPOCA)
+
+
+def _inteiro(data):
+    return data.toordinal() - sequencias.EPOCA
+
+
+# Regra da tarefa, já no formato completo
+def regra_de(tarefa):
+    return tarefa.get("regra") or DIARIA
+
+
+def e_diaria(regra):
+    return not regra or regra["tipo"] == "diaria"
+
+
+# Confere e normaliza uma regra vinda de fora (API, interface); None = diária
+def validar(regra):
+    if regra is None:
+        return None
+    if not isinstance(regra, dict):
+        raise ValueError("A regra deve ser um objeto com o campo tipo")
+    tipo = regra.get("tipo")
+    if tipo == "diaria":
+        return None
+    if tipo == "semanal":
+        dias = regra.get("dias")
+        if not isinstance(dias, list) or not dias or not all(isinstance(d, int) and 0 <= d <= 6 for d in dias):
+            raise ValueError("Regra semanal: dias deve ser uma lista de 0 (segunda) a 6 (domingo)")
+        if len(set(dias)) == 7:
+            return None
+        return {"tipo": "semanal", "dias": sorted(set(dias))}
+    if tipo == "intervalo":
+        intervalo = regra.get("dias")
+        if not isinstance(intervalo, int) or intervalo < 1:
+            raise ValueError("Regra a cada N dias: dias deve ser um inteiro positivo")
+        try:
+            inicio = datetime.date.fromisoformat(regra.get("inicio") or "").isoformat()
+        except (TypeError, ValueError):
+            raise ValueError("Regra a cada N dias: inicio deve ser uma data AAAA-MM-DD")
+        if intervalo == 1:
+            return None
+        return {"tipo": "intervalo", "dias": intervalo, "inicio": inicio}
+    if tipo == "mensal":
+        dia = regra.get("dia")
+        if not isinstance(dia, int) or not 1 <= dia <= 31:
+            raise ValueError("Regra mensal: dia deve ser de 1 a 31")
+        return {"tipo": "mensal", "dia": dia}
+    raise ValueError(f"Tipo de regra desconhecido: {tipo!r}")
+
+
+def descrever(regra):
+    if e_diaria(regra):
+        return "Todos os dias"
+    if regra["tipo"] == "semanal":
+        return "Toda " + ", ".join(NOMES_DIAS[dia] for dia in regra["dias"])
+    if regra["tipo"] == "intervalo":
+        return f"A cada {regra['dias']} dias desde {regra['inicio']}"
+    return f"Todo dia {regra['dia']} do mês"
+
+
+def _dia_no_mes(ano, mes, dia):
+    return datetime.date(ano, mes, min(dia, calendar.monthrange(ano, mes)[1]))
+
+
+# Primeira ocorrência no dia ou depois dele
+def proxima(regra, dia):
+    if e_diaria(regra):
+        return dia
+    if regra["tipo"] == "semanal":
+        dia_semana = _data(dia).weekday()
+        return dia + min((alvo - dia_semana) % 7 for alvo in regra["dias"])
+    if regra["tipo"] == "intervalo":
+        inicio = sequencias.dia_para_inteiro(regra["inicio"])
+        if dia <= inicio:
+            return inicio
+        return inicio - (inicio - dia) // regra["dias"] * regra["dias"]
+    data = _data(dia)
+    alvo = _dia_no_mes(data.year, data.month, regra["dia"])
+    if alvo < data:
+        ano, mes = (data.year + 1, 1) if data.month == 12 else (data.year, data.month + 1)
+        alvo = _dia_no_mes(ano, mes, regra["dia"])
+    return _inteiro(alvo)
+
+
+# Última ocorrência no dia ou antes dele; None se não houver
+def anterior(regra, dia):
+    if e_diaria(regra):
+        return dia
+    if regra["tipo"] == "semanal":
+        dia_semana = _data(dia).weekday()
+        return dia - min((dia_semana - alvo) % 7 for alvo in regra["dias"])
+    if regra["tipo"] == "intervalo":
+        inicio = sequencias.dia_para_inteiro(regra["inicio"])
+        if dia < inicio:
+            return None
+        return inicio + (dia - inicio) // regra["dias"] * regra["dias"]
+    data = _data(dia)
+    alvo = _dia_no_mes(data.year, data.month, regra["dia"])
+    if alvo > data:
+        ano, mes = (data.year - 1, 12) if data.month == 1 else (data.year, data.month - 1)
+        alvo = _dia_no_mes(ano, mes, regra["dia"])
+    return _inteiro(alvo)
+
+
+def devida(regra, dia):
+    return proxima(regra, dia) == dia
+
+
+# Quantas ocorrências caem entre inicio e fim (inclusive), sem percorrer os dias
+def contar(regra, inicio, fim):
+    if fim < inicio:
+        return 0
+    if e_diaria(regra):
+        return fim - inicio + 1
+    if regra["tipo"] == "semanal":
+        total = 0
+        for alvo in regra["dias"]:
+            primeira = proxima({"tipo": "semanal", "dias": [alvo]}, inicio)
+            if primeira <= fim:
+                total += (fim - primeira) // 7 + 1
+        return total
+    primeira = proxima(regra, inicio)
+    if primeira > fim:
+        return 0
+    if regra["tipo"] == "intervalo":
+        return (fim - primeira) // regra["dias"] + 1
+    # Mensal: uma por mês
+    total = 0
+    while primeira <= fim:
+        total += 1
+        primeira = proxima(regra, primeira + 1)
+    return total
+
+
+def _dias(datas):
+    if isinstance(datas, sequencias.Datas):
+        return datas
+    return {sequencias.dia_para_inteiro(data) for data in datas}
+
+
+# Sequência atual pela regra: ocorrências seguidas concluídas até a última
+# que já passou. A de hoje, ainda não concluída, não quebra a sequência, e
+# conclusões fora da regra não contam nem quebram. Para as diárias dá o
+# mesmo que o motor de sequencias, que é o usado (ver servico.calcular_sequencia).
+def sequencia_atual(regra, datas, hoje=None):
+    dias = _dias(datas)
+    if hoje is None:
+        hoje = sequencias.hoje_inteiro()
+    ocorrencia = anterior(regra, hoje)
+    if ocorrencia == hoje and hoje not in dias:
+        ocorrencia = anterior(regra, hoje - 1)
+    sequencia = 0
+    while ocorrencia is not None and ocorrencia in dias:
+        sequencia += 1
+        ocorrencia = anterior(regra, ocorrencia - 1)
+    return sequencia
+
+
+# Maior sequência de ocorrências seguidas concluídas
+def maior_sequencia(regra, datas):
+    if isinstance(datas, sequencias.Datas):
+        dias = (dia for inicio, comprimento in datas.intervalos() for dia in range(inicio, inicio + comprimento))
+    else:
+        dias = sorted(_dias(datas))
+    maior = corrente = 0
+    esperada = None
+    for dia in dias:
+        if not devida(regra, dia):
+            continue
+        corrente = corrente + 1 if dia == esperada else 1
+        maior = max(maior, corrente)
+        esperada = proxima(regra, dia + 1)
+    return maior
+
+
+# Agenda das tarefas recorrentes: fila de prioridade com a próxima ocorrência
+# de cada tarefa. Virar o dia só tira da fila as tarefas com ocorrência até o
+# novo dia (as demais nem são olhadas), e um intervalo de vários dias é
+# atravessado de uma vez: cada tarefa sai uma vez só, com as ocorrências
+# perdidas contadas de uma vez (ver contar).
+class Agenda:
+    def __init__(self, tarefas, inicio):
+        # Primeiro dia ainda não entregue por avancar
+        self.inicio = inicio
+        self.tarefas = {tarefa["id"]: tarefa for tarefa in tarefas}
+        self._fila = [
+            (proxima(regra_de(tarefa), inicio), posicao, tarefa["id"])
+            for posicao, tarefa in enumerate(tarefas)
+        ]
+        heapq.heapify(self._fila)
+
+    # Leva a agenda até o dia: devolve as tarefas devidas nele, na ordem da
+    # lista, e quantas ocorrências de cada tarefa ficaram para trás no caminho
+    def avancar(self, dia):
+        devidas, perdidas = [], {}
+        while self._fila and self._fila[0][0] <= dia:
+            ocorrencia, posicao, tarefa_id = heapq.heappop(self._fila)
+            regra = regra_de(self.tarefas[tarefa_id])
+            if ocorrencia < dia:
+                perdidas[tarefa_id] = contar(regra, ocorrencia, dia - 1)
+            if devida(regra, dia):
+                devidas.append((posicao, tarefa_id))
+            heapq.heappush(self._fila, (proxima(regra, dia + 1), posicao, tarefa_id))
+        self.inicio = dia + 1
+        return [self.tarefas[tarefa_id] for _, tarefa_id in sorted(devidas)], perdidas
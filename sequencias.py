@@ -0,0 +1,504 @@
+import array
+import bisect
+import datetime
+import threading
+import weakref
+from collections import Counter
+
+# Dias são guardados como inteiros: número de dias desde 1970-01-01
+EPOCA = datetime.date(1970, 1, 1).toordinal()
+
+
+def dia_para_inteiro(data):
+    return datetime.date.fromisoformat(data).toordinal() - EPOCA
+
+
+def inteiro_para_dia(dia):
+    return datetime.date.fromordinal(dia + EPOCA).isoformat()
+
+
+def hoje_inteiro():
+    return datetime.date.today().toordinal() - EPOCA
+
+
+# Motor de sequências: dias ordenados em um array compacto e os blocos de dias
+# consecutivos (início/fim) mantidos à parte. Adicionar ou remover um dia, mesmo
+# retroativo, acha a posição por busca binária e só mexe no bloco afetado;
+# sequência atual e maior sequência saem dos blocos sem percorrer o histórico.
+# A busca é O(log n), mas inserir ou tirar do array e das listas de blocos
+# desloca o que vem depois: O(n) no pior caso (uma cópia de memória, barata
+# para históricos de alguns anos). Só atende listas no formato antigo (ver
+# motor_para); o histórico em uso fica em Datas, onde cada alteração só
+# remonta os blocos de um ano.
+class MotorSequencia:
+    def __init__(self, dias=()):
+        self.dias = array.array("l", sorted(set(dias)))
+        self.inicios = []
+        self.fins = []
+        # Quantos blocos existem de cada tamanho, para manter a maior sequência
+        self.comprimentos = Counter()
+        self.maior = 0
+
+        for dia in self.dias:
+            if self.fins and self.fins[-1] == dia - 1:
+                self.fins[-1] = dia
+            else:
+                self.inicios.append(dia)
+                self.fins.append(dia)
+        for inicio, fim in zip(self.inicios, self.fins):
+            self._contar(fim - inicio + 1)
+
+    @classmethod
+    def de_datas(cls, datas):
+        return cls(dia_para_inteiro(data) for data in datas)
+
+    def copia(self):
+        motor = MotorSequencia.__new__(MotorSequencia)
+        motor.dias = array.array("l", self.dias)
+        motor.inicios = list(self.inicios)
+        motor.fins = list(self.fins)
+        motor.comprimentos = Counter(self.comprimentos)
+        motor.maior = self.maior
+        return motor
+
+    def __len__(self):
+        return len(self.dias)
+
+    def __contains__(self, dia):
+        i = bisect.bisect_left(self.dias, dia)
+        return i < len(self.dias) and self.dias[i] == dia
+
+    def _contar(self, comprimento):
+        self.comprimentos[comprimento] += 1
+        if comprimento > self.maior:
+            self.maior = comprimento
+
+    def _descontar(self, comprimento):
+        self.comprimentos[comprimento] -= 1
+        if not self.comprimentos[comprimento]:
+            del self.comprimentos[comprimento]
+            # Só há O(√n) tamanhos distintos de bloco
+            if comprimento == self.maior:
+                self.maior = max(self.comprimentos, default=0)
+
+    def adicionar(self, dia):
+        i = bisect.bisect_left(self.dias, dia)
+        if i < len(self.dias) and self.dias[i] == dia:
+            return False
+        self.dias.insert(i, dia)
+
+        # Bloco que começa antes do dia (se houver) e o seguinte
+        j = bisect.bisect_right(self.inicios, dia) - 1
+        junta_anterior = j >= 0 and self.fins[j] == dia - 1
+        junta_seguinte = j + 1 < len(self.inicios) and self.inicios[j + 1] == dia + 1
+
+        if junta_anterior and junta_seguinte:
+            self._descontar(self.fins[j] - self.inicios[j] + 1)
+            self._descontar(self.fins[j + 1] - self.inicios[j + 1] + 1)
+            self.fins[j] = self.fins[j + 1]
+            del self.inicios[j + 1]
+            del self.fins[j + 1]
+            self._contar(self.fins[j] - self.inicios[j] + 1)
+        elif junta_anterior:
+            self._descontar(self.fins[j] - self.inicios[j] + 1)
+            self.fins[j] = dia
+            self._contar(self.fins[j] - self.inicios[j] + 1)
+        elif junta_seguinte:
+            self._descontar(self.fins[j + 1] - self.inicios[j + 1] + 1)
+            self.inicios[j + 1] = dia
+            self._contar(self.fins[j + 1] - self.inicios[j + 1] + 1)
+        else:
+            self.inicios.insert(j + 1, dia)
+            self.fins.insert(j + 1, dia)
+            self._contar(1)
+        return True
+
+    def remover(self, dia):
+        i = bisect.bisect_left(self.dias, dia)
+        if i >= len(self.dias) or self.dias[i] != dia:
+            return False
+        del self.dias[i]
+
+        j = bisect.bisect_right(self.inicios, dia) - 1
+        inicio, fim = self.inicios[j], self.fins[j]
+        self._descontar(fim - inicio + 1)
+
+        if inicio == fim:
+            del self.inicios[j]
+            del self.fins[j]
+        elif dia == inicio:
+            self.inicios[j] = dia + 1
+            self._contar(fim - dia)
+        elif dia == fim:
+            self.fins[j] = dia - 1
+            self._contar(dia - inicio)
+        else:
+            # Dia no meio do bloco: ele se divide em dois
+            self.fins[j] = dia - 1
+            self.inicios.insert(j + 1, dia + 1)
+            self.fins.insert(j + 1, fim)
+            self._contar(dia - inicio)
+            self._contar(fim - dia)
+        return True
+
+    def sequencia_atual(self, hoje=None):
+        if not self.fins:
+            return 0
+        if hoje is None:
+            hoje = hoje_inteiro()
+
+        # Se a última conclusão não foi hoje nem ontem, a sequência foi quebrada
+        if hoje - self.fins[-1] > 1:
+            return 0
+        return self.fins[-1] - self.inicios[-1] + 1
+
+    def maior_sequencia(self):
+        return self.maior
+
+
+def primeiro_dia_do_ano(ano):
+    return datetime.date(ano, 1, 1).toordinal() - EPOCA
+
+
+def ano_do_dia(dia):
+    return datetime.date.fromordinal(dia + EPOCA).year
+
+
+def dias_no_ano(ano):
+    return primeiro_dia_do_ano(ano + 1) - primeiro_dia_do_ano(ano)
+
+
+# Blocos (início, comprimento) de dias consecutivos a partir de dias ordenados
+def agrupar_blocos(dias):
+    blocos = []
+    for dia in dias:
+        if blocos and blocos[-1][0] + blocos[-1][1] == dia:
+            blocos[-1][1] += 1
+        elif not blocos or blocos[-1][0] + blocos[-1][1] < dia:
+            blocos.append([dia, 1])
+    return [tuple(bloco) for bloco in blocos]
+
+
+# Resumo dos blocos de um ano: (total de dias, maior bloco, bloco que começa
+# em 1º de janeiro, bloco que termina em 31 de dezembro). Com ele, totais e
+# sequências que atravessam anos saem sem ler os blocos dos outros anos.
+def resumir_blocos(ano, blocos):
+    if not blocos:
+        return (0, 0, 0, 0)
+    prefixo = blocos[0][1] if blocos[0][0] == primeiro_dia_do_ano(ano) else 0
+    inicio, comprimento = blocos[-1]
+    sufixo = comprimento if inicio + comprimento == primeiro_dia_do_ano(ano + 1) else 0
+    return (sum(c for _, c in blocos), max(c for _, c in blocos), prefixo, sufixo)
+
+
+# Datas vivas que ainda podem ler blocos do disco (com leitor), para o
+# armazenamento não apagar segmentos em uso (ver segmentos_em_uso)
+_com_leitor = weakref.WeakValueDictionary()
+_trava_leitores = threading.Lock()
+
+
+def _acompanhar(datas):
+    if datas._leitor is not None:
+        with _trava_leitores:
+            _com_leitor[id(datas)] = datas
+
+
+# Segmentos de que alguma Datas viva neste processo ainda pode precisar: os
+# de origem dos anos com blocos ainda não lidos
+def segmentos_em_uso():
+    with _trava_leitores:
+        vivas = list(_com_leitor.values())
+    em_uso = set()
+    for datas in vivas:
+        for ano, origem in list(datas.origens.items()):
+            if origem is not None and ano not in datas._blocos:
+                em_uso.add(origem)
+    return em_uso
+
+
+# Datas de conclusão de uma tarefa guardadas como blocos de dias consecutivos,
+# separados por ano. Os blocos de um ano só são lidos quando alguém precisa
+# deles (leitor); total e maior sequência vêm dos resumos por ano. Funciona
+# como a antiga lista de "AAAA-MM-DD": len, in, iteração, append e remove.
+# Adicionar ou remover um dia é uma busca binária nos blocos do ano dele e a
+# remontagem só desses blocos (no máximo 183): o custo não cresce com o
+# histórico. Sequência atual e maior sequência percorrem os resumos, um por ano.
+class Datas:
+    def __init__(self, blocos=None, resumos=None, origens=None, leitor=None):
+        # ano -> tupla de (início, comprimento); ausente = ainda não lido
+        self._blocos = dict(blocos or {})
+        # ano -> resumo (ver resumir_blocos)
+        self.resumos = dict(resumos or {})
+        # ano -> segmento em disco de onde os blocos vieram; None = alterado em memória
+        self.origens = dict(origens or {})
+        # leitor(ano, origem) -> (blocos daquele ano, segmento de onde vieram)
+        self._leitor = leitor
+        for ano, blocos_ano in self._blocos.items():
+            if ano not in self.resumos:
+                self.resumos[ano] = resumir_blocos(ano, blocos_ano)
+        _acompanhar(self)
+
+    @classmethod
+    def de_lista(cls, datas):
+        por_ano = {}
+        for dia in sorted({dia_para_inteiro(data) for data in datas}):
+            por_ano.setdefault(ano_do_dia(dia), []).append(dia)
+        return cls({ano: tuple(agrupar_blocos(dias)) for ano, dias in por_ano.items()})
+
+    def copia(self):
+        datas = Datas.__new__(Datas)
+        datas._blocos = dict(self._blocos)
+        datas.resumos = dict(self.resumos)
+        datas.origens = dict(self.origens)
+        datas._leitor = self._leitor
+        _acompanhar(datas)
+        return datas
+
+    # No snapshot binário o leitor não é gravado: quem lê liga o seu (ver armazenamento)
+    def __getstate__(self):
+        estado = dict(self.__dict__)
+        estado["_leitor"] = None
+        return estado
+
+    def ligar_leitor(self, leitor):
+        self._leitor = leitor
+        _acompanhar(self)
+
+    # Anos com alguma conclusão, em ordem
+    def anos(self):
+        return sorted(ano for ano, resumo in self.resumos.items() if resumo[0])
+
+    def blocos(self, ano):
+        if ano not in self._blocos:
+            if ano not in self.resumos:
+                return ()
+            blocos, origem = self._leitor(ano, self.origens[ano])
+            self._blocos[ano] = tuple(blocos)
+            if origem != self.origens[ano]:
+                # O segmento já tinha sido descartado e o ano veio do snapshot
+                # atual: resumo e origem passam a ser os dele
+                self.origens[ano] = origem
+                self.resumos[ano] = resumir_blocos(ano, self._blocos[ano])
+        return self._blocos[ano]
+
+    # Todos os blocos (com desde, só os dos anos a partir daquele dia),
+    # juntando os que atravessam a virada do ano
+    def intervalos(self, desde=None):
+        intervalos = []
+        ano_desde = ano_do_dia(desde) if desde is not None else None
+        for ano in self.anos():
+            # Anos inteiros antes de desde nem são lidos; no ano dele, os blocos
+            # que terminam antes são pulados por busca binária
+            if ano_desde is not None and ano < ano_desde:
+                continue
+            blocos = self.blocos(ano)
+            if ano == ano_desde:
+                blocos = blocos[bisect.bisect_left(blocos, desde + 1, key=lambda bloco: bloco[0] + bloco[1]):]
+            for inicio, comprimento in blocos:
+                if intervalos and intervalos[-1][0] + intervalos[-1][1] == inicio:
+                    intervalos[-1] = (intervalos[-1][0], intervalos[-1][1] + comprimento)
+                else:
+                    intervalos.append((inicio, comprimento))
+        return intervalos
+
+    def __len__(self):
+        return sum(resumo[0] for resumo in self.resumos.values())
+
+    def __iter__(self):
+        for ano in self.anos():
+            for inicio, comprimento in self.blocos(ano):
+                for dia in range(inicio, inicio + comprimento):
+                    yield inteiro_para_dia(dia)
+
+    def __contains__(self, data):
+        dia = dia_para_inteiro(data) if isinstance(data, str) else data
+        blocos = self.blocos(ano_do_dia(dia))
+        i = bisect.bisect_right(blocos, dia, key=lambda bloco: bloco[0]) - 1
+        return i >= 0 and dia < blocos[i][0] + blocos[i][1]
+
+    def __eq__(self, outro):
+        if isinstance(outro, Datas):
+            if {ano: self.resumos[ano] for ano in self.anos()} != {ano: outro.resumos[ano] for ano in outro.anos()}:
+                return False
+            for ano in self.anos():
+                origem = self.origens.get(ano)
+                # Mesmo segmento em disco: mesmos blocos, sem precisar lê-los
+                if origem is not None and origem == outro.origens.get(ano):
+                    continue
+                if self.blocos(ano) != outro.blocos(ano):
+                    return False
+            return True
+        if isinstance(outro, (list, tuple)):
+            return len(outro) == len(self) and set(outro) == set(self)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Datas({len(self)} dias em {self.anos()})"
+
+    def _alterar(self, ano, blocos):
+        self._blocos[ano] = tuple(blocos)
+        # Um ano que ficou vazio continua listado até ser gravado, para sair do segmento
+        self.resumos[ano] = resumir_blocos(ano, blocos)
+        self.origens[ano] = None
+
+    def adicionar(self, dia):
+        ano = ano_do_dia(dia)
+        blocos = list(self.blocos(ano))
+        i = bisect.bisect_right(blocos, dia, key=lambda bloco: bloco[0]) - 1
+        if i >= 0 and dia < blocos[i][0] + blocos[i][1]:
+            return False
+
+        junta_anterior = i >= 0 and blocos[i][0] + blocos[i][1] == dia
+        junta_seguinte = i + 1 < len(blocos) and blocos[i + 1][0] == dia + 1
+        if junta_anterior and junta_seguinte:
+            blocos[i:i + 2] = [(blocos[i][0], blocos[i][1] + 1 + blocos[i + 1][1])]
+        elif junta_anterior:
+            blocos[i] = (blocos[i][0], blocos[i][1] + 1)
+        elif junta_seguinte:
+            blocos[i + 1] = (dia, blocos[i + 1][1] + 1)
+        else:
+            blocos.insert(i + 1, (dia, 1))
+        self._alterar(ano, blocos)
+        return True
+
+    def remover(self, dia):
+        ano = ano_do_dia(dia)
+        blocos = list(self.blocos(ano))
+        i = bisect.bisect_right(blocos, dia, key=lambda bloco: bloco[0]) - 1
+        if i < 0 or dia >= blocos[i][0] + blocos[i][1]:
+            return False
+
+        inicio, comprimento = blocos[i]
+        pedacos = [(inicio, dia - inicio), (dia + 1, inicio + comprimento - dia - 1)]
+        blocos[i:i + 1] = [pedaco for pedaco in pedacos if pedaco[1] > 0]
+        self._alterar(ano, blocos)
+        return True
+
+    # Mesma interface de lista usada pelo restante do código
+    def append(self, data):
+        self.adicionar(dia_para_inteiro(data))
+
+    def extend(self, datas):
+        for data in datas:
+            self.append(data)
+
+    def remove(self, data):
+        if not self.remover(dia_para_inteiro(data)):
+            raise ValueError(f"{data} não está nas datas")
+
+    def sequencia_atual(self, hoje=None):
+        anos = self.anos()
+        if not anos:
+            return 0
+        if hoje is None:
+            hoje = hoje_inteiro()
+
+        # Se a última conclusão não foi hoje nem ontem, a sequência foi quebrada
+        ano = anos[-1]
+        inicio, comprimento = self.blocos(ano)[-1]
+        if hoje - (inicio + comprimento - 1) > 1:
+            return 0
+
+        # Bloco que começa em 1º de janeiro continua no fim do ano anterior
+        sequencia = comprimento
+        continua = inicio == primeiro_dia_do_ano(ano)
+        while continua and ano - 1 in self.resumos:
+            ano -= 1
+            total, _, _, sufixo = self.resumos[ano]
+            sequencia += sufixo
+            continua = total == dias_no_ano(ano)
+        return sequencia
+
+    def maior_sequencia(self):
+        maior = 0
+        corrente = 0
+        anterior = None
+        for ano in self.anos():
+            total, maior_ano, prefixo, sufixo = self.resumos[ano]
+            inicio_ano = corrente + prefixo if anterior == ano - 1 and prefixo else prefixo
+            maior = max(maior, maior_ano, inicio_ano)
+            # Ano completo: a sequência segue para o próximo
+            corrente = inicio_ano if total == dias_no_ano(ano) else sufixo
+            anterior = ano
+        return maior
+
+    # Cópia para guardar depois de gravada: anos vazios saem e cada ano aponta para o seu segmento
+    def com_origens(self, segmentos):
+        datas = Datas.__new__(Datas)
+        anos = self.anos()
+        datas._blocos = {ano: self._blocos[ano] for ano in anos if ano in self._blocos}
+        datas.resumos = {ano: self.resumos[ano] for ano in anos}
+        datas.origens = {ano: segmentos[ano] for ano in anos}
+        datas._leitor = self._leitor
+        _acompanhar(datas)
+        return datas
+
+
+# Motor das datas de uma tarefa. Datas em blocos já respondem sequência e
+# recorde por conta própria; listas no formato antigo (só antes da migração)
+# ganham um motor montado na hora.
+def motor_para(datas):
+    if isinstance(datas, Datas):
+        return datas
+    return MotorSequencia.de_datas(datas)
+
+
+# Registra uma conclusão nas datas de uma tarefa.
+# Retorna False se a data já estava registrada.
+def adicionar_data(datas, data):
+    if isinstance(datas, Datas):
+        return datas.adicionar(dia_para_inteiro(data))
+    if data in datas:
+        return False
+
+    datas.append(data)
+    return True
+
+
+# Remove uma conclusão das datas de uma tarefa.
+# Retorna False se a data não estava registrada.
+def remover_data(datas, data):
+    if isinstance(datas, Datas):
+        return datas.remover(dia_para_inteiro(data))
+    if data not in datas:
+        return False
+
+    datas.remove(data)
+    return True
+
+
+# Sequência atual de uma lista de datas no formato antigo (sem metadados)
+def calcular_sequencia_antiga(datas):
+    if not datas:
+        return 0
+
+    return MotorSequencia.de_datas(datas).sequencia_atual()
+
+
+# Uma entrada do histórico no formato atual: dicionário com as datas em blocos,
+# a sequência e o recorde
+def migrar_entrada(dados):
+    if isinstance(dados, list):  # Formato muito antigo (só datas)
+        sequencia = calcular_sequencia_antiga(dados)
+        return {
+            "datas": Datas.de_lista(dados),
+            "sequencia_atual": sequencia,
+            "sequencia_editada": False,
+            "recorde_sequencia": sequencia,
+        }
+
+    if "recorde_sequencia" not in dados:  # Formato antigo sem recorde
+        dados["recorde_sequencia"] = dados.get("sequencia_atual", 0)
+    dados.setdefault("sequencia_atual", 0)
+    dados.setdefault("sequencia_editada", False)
+    # Datas ainda em lista passam a ser guardadas em blocos
+    if not isinstance(dados.get("datas"), Datas):
+        dados["datas"] = Datas.de_lista(dados.get("datas", []))
+    return dados
+
+
+# Converter histórico antigo para o novo formato se necessário
+def migrar_historico(historico):
+    return {tarefa_id: migrar_entrada(dados) for tarefa_id, dados in historico.items()}
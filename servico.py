@@ -0,0 +1,844 @@
+import contextlib
+import datetime
+
+import agregados
+import armazenamento
+import busca
+import indices
+import perfil
+import recorrencia
+import sequencias
+
+
+def data_de_hoje():
+    return datetime.datetime.now().strftime("%Y-%m-%d")
+
+
+def _carimbo():
+    return datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+
+
+# Entrada inicial do histórico de uma tarefa recorrente
+def historico_vazio():
+    return {
+        "datas": [],
+        "sequencia_atual": 0,
+        "sequencia_editada": False,
+        "recorde_sequencia": 0
+    }
+
+
+# Função para calcular sequência atual; regra = a da tarefa (None = diária)
+def calcular_sequencia(historico, tarefa_id, regra=None):
+    if tarefa_id not in historico:
+        return 0
+
+    info_tarefa = historico[tarefa_id]
+
+    # Se a sequência foi editada manualmente, usar esse valor
+    if info_tarefa.get("sequencia_editada", False):
+        return info_tarefa.get("sequencia_atual", 0)
+
+    # Caso contrário, calcular com base nas datas
+    datas = info_tarefa.get("datas", [])
+    if not datas:
+        return 0
+
+    # Fora das diárias, conta ocorrências da regra em vez de dias seguidos
+    if not recorrencia.e_diaria(regra):
+        return recorrencia.sequencia_atual(regra, datas)
+    return sequencias.motor_para(datas).sequencia_atual()
+
+
+# Função para calcular o recorde: a maior sequência real do histórico,
+# ou o recorde gravado se for maior (ex.: editado manualmente)
+def calcular_recorde(historico, tarefa_id, regra=None):
+    if tarefa_id not in historico:
+        return 0
+
+    recorde_gravado = historico[tarefa_id].get("recorde_sequencia", 0)
+    return max(recorde_gravado, calcular_maior_sequencia(historico, tarefa_id, regra))
+
+
+# Maior sequência de fato registrada no histórico, sem o recorde gravado
+def calcular_maior_sequencia(historico, tarefa_id, regra=None):
+    datas = historico.get(tarefa_id, {}).get("datas", [])
+    if not datas:
+        return 0
+
+    if not recorrencia.e_diaria(regra):
+        return recorrencia.maior_sequencia(regra, datas)
+    return sequencias.motor_para(datas).maior_sequencia()
+
+
+# Função para atualizar o recorde de sequência
+def atualizar_recorde(historico, tarefa_id, regra=None):
+    if tarefa_id not in historico:
+        return
+
+    sequencia_atual = historico[tarefa_id].get("sequencia_atual", 0)
+    recorde_atual = calcular_recorde(historico, tarefa_id, regra)
+    historico[tarefa_id]["recorde_sequencia"] = max(sequencia_atual, recorde_atual)
+
+
+# Alterações anexadas ao diário entre um snapshot e o próximo
+LIMITE_DIARIO = 200
+
+# Alterações que podem ser desfeitas; as demais (virada do dia, importações)
+# ficam só registradas
+DESFAZIVEIS = {
+    "marcar", "adicionar_ao_dia", "adicionar_recorrente", "remover_recorrente", "adicionar_backlog",
+    "remover_backlog", "adicionar_projeto", "remover_projeto", "editar_sequencia", "sequencia_automatica",
+    "definir_regra", "editar_sequencias",
+}
+
+
+def _campos_sequencia(info):
+    if info is None:
+        return None
+    return {
+        "sequencia_atual": info.get("sequencia_atual", 0),
+        "sequencia_editada": info.get("sequencia_editada", False),
+        "recorde_sequencia": info.get("recorde_sequencia", 0),
+    }
+
+
+# Problema de uma sequência editada à mão; None se ela for válida
+def erro_sequencia(sequencia, recorde):
+    if not all(isinstance(valor, int) and not isinstance(valor, bool) and valor >= 0 for valor in (sequencia, recorde)):
+        return "sequência e recorde devem ser inteiros não negativos"
+    if recorde < sequencia:
+        return f"o recorde ({recorde}) não pode ser menor que a sequência ({sequencia})"
+    return None
+
+
+# Texto de um evento do diário para a interface
+def descrever(evento):
+    tipo = evento["tipo"]
+    if tipo == "marcar":
+        acao = "Concluir" if evento["concluida"] else "Desmarcar"
+        return f'{acao} "{evento["descricao"]}"'
+    if tipo == "adicionar_ao_dia":
+        return f"Adicionar {len(evento['itens'])} tarefa(s) do backlog ao dia"
+    if tipo in ("adicionar_recorrente", "remover_recorrente"):
+        acao = "Adicionar" if tipo.startswith("adicionar") else "Remover"
+        return f'{acao} a tarefa recorrente "{evento["tarefa"]["descricao"]}"'
+    if tipo in ("adicionar_backlog", "remover_backlog"):
+        acao = "Adicionar ao" if tipo.startswith("adicionar") else "Remover do"
+        return f'{acao} backlog "{evento["tarefa"]["descricao"]}"'
+    if tipo in ("adicionar_projeto", "remover_projeto"):
+        acao = "Adicionar" if tipo.startswith("adicionar") else "Remover"
+        return f'{acao} o projeto "{evento["projeto"]["nome"]}"'
+    if tipo == "editar_sequencia":
+        return f'Editar a sequência de "{evento["descricao"]}"'
+    if tipo == "sequencia_automatica":
+        return f'Sequência automática para "{evento["descricao"]}"'
+    if tipo == "editar_sequencias":
+        if len(evento["itens"]) == 1:
+            return descrever(dict(evento["itens"][0], tipo="editar_sequencia"))
+        return f"Editar a sequência de {len(evento['itens'])} tarefas"
+    if tipo == "definir_regra":
+        return f'Repetição de "{evento["descricao"]}": {recorrencia.descrever(evento["regra"]).lower()}'
+    if tipo == "virar_dia":
+        perdidas = sum(evento.get("perdidas", {}).values())
+        if perdidas:
+            return f"Novo dia: {evento['data']} ({perdidas} ocorrência(s) perdida(s) desde {evento['anterior']})"
+        return f"Novo dia: {evento['data']}"
+    if tipo in ("desfazer", "refazer"):
+        return f"{tipo.capitalize()}: {descrever(evento['evento'])}"
+    return tipo.replace("_", " ").capitalize()
+
+
+# Regras do gestor sem nenhuma interface: usado pelo app Streamlit e pela API.
+# Cada alteração vira um evento pequeno anexado ao diário do armazenamento
+# (custo proporcional ao evento, não aos dados); a cada LIMITE_DIARIO eventos
+# o estado inteiro é gravado como snapshot, e a carga lê o snapshot e repete
+# só os eventos posteriores a ele. Os eventos guardam o necessário para serem
+# desfeitos e reaplicá-los sobre um estado que já os contém não muda nada.
+# Tarefas inexistentes levantam KeyError; dados inválidos, ValueError.
+class Gestor:
+    def __init__(self, loja=None):
+        self.loja = loja or armazenamento.obter()
+        self.carregado = False
+
+    @property
+    def estado(self):
+        return (self.tarefas_recorrentes, self.backlog, self.historico, self.tarefas_dia, self.projetos)
+
+    # virar_dia=False para só ler (ex.: exportação), sem gravar a virada do dia
+    def carregar(self, hoje=None, virar_dia=True):
+        with perfil.trecho("carregar"):
+            self._recarregar()
+        self.carregado = True
+        if virar_dia:
+            self.virar_dia(hoje or data_de_hoje())
+
+    def _recarregar(self):
+        # O número do snapshot é lido antes dele: se outra sessão compactar no meio,
+        # eventos já incluídos são repetidos, o que não muda nada
+        self.seq_snapshot = self.loja.seq_snapshot()
+        # Dados na versão atual do formato não passam pela migração; nos antigos,
+        # ela só roda quando o arquivo muda em disco
+        if self.loja.esquema() >= armazenamento.VERSAO_ESQUEMA:
+            preparar = {}
+        else:
+            preparar = {"historico": sequencias.migrar_historico}
+        (self.tarefas_recorrentes, self.backlog, self.historico,
+         self.tarefas_dia, self.projetos) = self.loja.carregar(preparar=preparar)
+        self.indice = indices.IndiceTarefas(self.backlog, self.tarefas_dia)
+        # A busca é sincronizada só aqui; depois, cada evento atualiza o item dele
+        busca.indice_backlog(self.backlog, self.loja)
+        self._base = self.loja.base()
+        # Agenda das recorrentes, montada na próxima virada do dia
+        self._agenda = None
+
+        # Agregados gravados com este snapshot, no formato atual; se não baterem, recontar tudo
+        dados = self.loja.ler_agregados()
+        atuais = dados and dados.get("seq") == self.seq_snapshot and dados.get("versao") == agregados.VERSAO
+        self.agregados = agregados.Agregados(dados) if atuais else None
+        if self.agregados is None or not self.agregados.confere_totais(self.historico):
+            self.agregados = agregados.Agregados.de_historico(self.historico)
+            # A recontagem é do estado do snapshot: vale para as próximas cargas
+            self.loja.gravar_agregados(self.agregados.como_dict(self.seq_snapshot))
+
+        # Eventos recentes: os posteriores ao snapshot são repetidos, os anteriores
+        # servem só para desfazer
+        self.eventos = self.loja.eventos_desde(max(0, self.seq_snapshot - armazenamento.EVENTOS_MANTIDOS))
+        self.seq = self.seq_snapshot
+        self._compactado = self.seq_snapshot
+        with perfil.trecho("repetir diário"):
+            for evento in self.eventos:
+                if evento["seq"] > self.seq_snapshot:
+                    self._aplicar(evento)
+                self.seq = max(self.seq, evento["seq"])
+
+    # Aplica os eventos gravados por outras sessões; se houve um novo snapshot, relê tudo
+    def _sincronizar(self):
+        if self.loja.seq_snapshot() != self.seq_snapshot:
+            self._recarregar()
+            return
+        for evento in self.loja.eventos_desde(self.seq):
+            self._aplicar(evento)
+            self.eventos.append(evento)
+            self.seq = evento["seq"]
+
+    # Para processos de longa duração: traz as alterações das outras sessões
+    def atualizar(self, hoje=None):
+        if not self.carregado:
+            self.carregar(hoje)
+            return
+        self._sincronizar()
+        self.virar_dia(hoje or data_de_hoje())
+
+    # Com a trava do diário: alcança as outras sessões, monta o evento sobre o
+    # estado já atualizado (None = nada a fazer), aplica e anexa
+    def _registrar(self, montar):
+        with self.loja.trava_diario():
+            self._sincronizar()
+            evento = montar()
+            if evento is None:
+                return None
+            evento["seq"] = self.seq + 1
+            evento["quando"] = datetime.datetime.now().isoformat(timespec="seconds")
+            with perfil.trecho(f"evento {evento['tipo']}"):
+                self._aplicar(evento)
+                self.loja.anexar_evento(evento)
+            self.seq = evento["seq"]
+            self.eventos.append(evento)
+            if self.seq - max(self.seq_snapshot, self._compactado) >= LIMITE_DIARIO:
+                self._compactar()
+        return evento
+
+    # Com a gravação adiada, o snapshot só chega ao disco depois; seq_snapshot
+    # continua sendo o que está em disco (a sincronização relê tudo quando ele
+    # muda) e _compactado evita pedir outro snapshot a cada evento até lá
+    def _compactar(self, imediata=False):
+        with perfil.trecho("compactar"):
+            self._base = self.loja.compactar(self.estado, self.seq, self._base, imediata=imediata,
+                                             agregados=self.agregados.como_dict(self.seq))
+        self.seq_snapshot = self.loja.seq_snapshot()
+        self._compactado = self.seq
+        self.eventos = [evento for evento in self.eventos if evento["seq"] > self.seq - armazenamento.EVENTOS_MANTIDOS]
+
+    # Grava o estado em memória inteiro como snapshot (ex.: depois de alterá-lo diretamente)
+    def salvar(self):
+        with perfil.trecho("salvar"), self.loja.trava_diario():
+            self._compactar(imediata=True)
+
+    # Alteração feita direto no estado (ex.: importação em lote): vira um
+    # snapshot, e o diário só registra que ela aconteceu. Se ela falhar no
+    # meio, o estado em memória (e os índices) volta a ser o que está em disco
+    @contextlib.contextmanager
+    def edicao_direta(self, tipo, **dados):
+        with self.loja.trava_diario():
+            self._sincronizar()
+            try:
+                yield self.estado
+                self.indice = indices.IndiceTarefas(self.backlog, self.tarefas_dia)
+                busca.indice_backlog(self.backlog, self.loja)
+                self.agregados = agregados.Agregados.de_historico(self.historico)
+                self._agenda = None
+                evento = dict(dados, tipo=tipo, seq=self.seq + 1, quando=datetime.datetime.now().isoformat(timespec="seconds"))
+                self.loja.anexar_evento(evento)
+                self.seq = evento["seq"]
+                self.eventos.append(evento)
+                self._compactar(imediata=True)
+            except BaseException:
+                self._recarregar()
+                raise
+
+    def _aplicar(self, evento):
+        aplicar = getattr(self, f"_aplicar_{evento['tipo']}", None)
+        if aplicar is not None:
+            aplicar(evento)
+
+    def _reverter(self, evento):
+        getattr(self, f"_reverter_{evento['tipo']}")(evento)
+
+    # Pilhas de desfazer e refazer, montadas a partir dos eventos recentes de todas as sessões
+    def pilhas(self):
+        desfazer, refazer = [], []
+        for evento in self.eventos:
+            if evento["tipo"] == "desfazer":
+                if desfazer and desfazer[-1]["seq"] == evento["alvo"]:
+                    refazer.append(desfazer.pop())
+            elif evento["tipo"] == "refazer":
+                if refazer and refazer[-1]["seq"] == evento["alvo"]:
+                    desfazer.append(refazer.pop())
+            elif evento["tipo"] in DESFAZIVEIS:
+                desfazer.append(evento)
+                refazer.clear()
+        return desfazer, refazer
+
+    # Desfaz a última alteração ainda não desfeita; devolve o evento desfeito
+    def desfazer(self):
+        def montar():
+            desfazer, _ = self.pilhas()
+            if not desfazer:
+                raise ValueError("Nada para desfazer")
+            alvo = desfazer[-1]
+            return {"tipo": "desfazer", "alvo": alvo["seq"], "evento": armazenamento.copiar_estado(alvo)}
+        return self._registrar(montar)["evento"]
+
+    def refazer(self):
+        def montar():
+            _, refazer = self.pilhas()
+            if not refazer:
+                raise ValueError("Nada para refazer")
+            alvo = refazer[-1]
+            return {"tipo": "refazer", "alvo": alvo["seq"], "evento": armazenamento.copiar_estado(alvo)}
+        return self._registrar(montar)["evento"]
+
+    def _aplicar_desfazer(self, evento):
+        self._reverter(armazenamento.copiar_estado(evento["evento"]))
+
+    def _aplicar_refazer(self, evento):
+        self._aplicar(armazenamento.copiar_estado(evento["evento"]))
+
+    # Se for um novo dia, montar as tarefas do dia pelas regras de recorrência.
+    # As ocorrências que ficaram para trás (as não concluídas do último dia e
+    # as dos dias em que ninguém abriu o gestor) são contadas no histórico.
+    def virar_dia(self, hoje):
+        if self.tarefas_dia["data"] == hoje:
+            return False
+        with perfil.trecho("virar dia"):
+            evento = self._registrar(lambda: self._evento_virar_dia(hoje))
+        return evento is not None
+
+    def _evento_virar_dia(self, hoje):
+        anterior = self.tarefas_dia["data"]
+        if anterior == hoje:
+            return None
+        dia = sequencias.dia_para_inteiro(hoje)
+        inicio = sequencias.dia_para_inteiro(anterior) + 1 if anterior else dia
+        # A agenda continua de onde parou; se não (tarefas alteradas, recarga, data para trás), é remontada
+        if self._agenda is None or self._agenda.inicio != inicio or dia < inicio:
+            self._agenda = recorrencia.Agenda(self.tarefas_recorrentes, min(inicio, dia))
+        devidas, perdidas = self._agenda.avancar(dia)
+
+        if anterior and anterior < hoje:
+            for tarefa in self.tarefas_dia["tarefas"]:
+                if tarefa["tipo"] == "recorrente" and not tarefa["concluida"] and tarefa["id"] in self._agenda.tarefas:
+                    perdidas[tarefa["id"]] = perdidas.get(tarefa["id"], 0) + 1
+        evento = {"tipo": "virar_dia", "data": hoje, "anterior": anterior,
+                  "devidas": [{"id": tarefa["id"], "descricao": tarefa["descricao"]} for tarefa in devidas]}
+        if perdidas:
+            evento["perdidas"] = perdidas
+        return evento
+
+    def _aplicar_virar_dia(self, evento):
+        if self.tarefas_dia["data"] == evento["data"]:
+            return
+        # Eventos de antes das regras: todas as recorrentes
+        devidas = evento.get("devidas", self.tarefas_recorrentes)
+        self.tarefas_dia = {
+            "data": evento["data"],
+            "tarefas": [{"id": tarefa["id"], "descricao": tarefa["descricao"], "tipo": "recorrente", "concluida": False}
+                        for tarefa in devidas]
+        }
+        self.indice.definir_dia(self.tarefas_dia)
+        for tarefa_id, quantidade in evento.get("perdidas", {}).items():
+            info = self.historico.setdefault(tarefa_id, historico_vazio())
+            info["perdidas"] = info.get("perdidas", 0) + quantidade
+
+    def tarefa_do_dia(self, tarefa_id):
+        for tarefa in self.tarefas_dia["tarefas"]:
+            if tarefa["id"] == tarefa_id:
+                return tarefa
+        raise KeyError(tarefa_id)
+
+    def recorrente(self, tarefa_id):
+        for tarefa in self.tarefas_recorrentes:
+            if tarefa["id"] == tarefa_id:
+                return tarefa
+        raise KeyError(tarefa_id)
+
+    # Regra de recorrência da tarefa (None = diária, ou tarefa já removida)
+    def regra(self, tarefa_id):
+        for tarefa in self.tarefas_recorrentes:
+            if tarefa["id"] == tarefa_id:
+                return tarefa.get("regra")
+        return None
+
+    def do_backlog(self, tarefa_id):
+        tarefa = self.indice.tarefa(tarefa_id)
+        if tarefa is None:
+            raise KeyError(tarefa_id)
+        return tarefa
+
+    def projeto(self, projeto_id):
+        for projeto in self.projetos:
+            if projeto["id"] == projeto_id:
+                return projeto
+        raise KeyError(projeto_id)
+
+    # Posição de uma tarefa nas tarefas do dia, para devolvê-la ao mesmo lugar
+    def _posicao_no_dia(self, tarefa_id):
+        for posicao, item in enumerate(self.tarefas_dia["tarefas"]):
+            if item["id"] == tarefa_id:
+                return {"item_dia": dict(item), "posicao_dia": posicao}
+        return {}
+
+    def _voltar_ao_dia(self, evento):
+        item = evento.get("item_dia")
+        if item and self.tarefas_dia["data"] == evento["data"] and not self.indice.esta_no_dia(item["id"]):
+            self.tarefas_dia["tarefas"].insert(evento["posicao_dia"], item)
+            self.indice.adicionar_ao_dia(item["id"])
+
+    def _tirar_do_dia(self, tarefa_id):
+        if self.indice.esta_no_dia(tarefa_id):
+            self.tarefas_dia["tarefas"] = [t for t in self.tarefas_dia["tarefas"] if t["id"] != tarefa_id]
+            self.indice.remover_do_dia(tarefa_id)
+
+    # Entrada do histórico criada só pelo evento que está sendo desfeito: sai se ficou sem datas
+    def _restaurar_sequencia(self, tarefa_id, antes):
+        info = self.historico.get(tarefa_id)
+        if info is None:
+            return
+        if antes is not None:
+            info.update(antes)
+        elif not info["datas"]:
+            del self.historico[tarefa_id]
+        else:
+            info.update(_campos_sequencia({}))
+
+    # Marca ou desmarca uma tarefa do dia, atualizando histórico, sequência e recorde
+    def marcar(self, tarefa_id, concluida):
+        def montar():
+            tarefa = self.tarefa_do_dia(tarefa_id)
+            if tarefa["concluida"] == concluida:
+                return None
+            evento = {"tipo": "marcar", "id": tarefa_id, "descricao": tarefa["descricao"],
+                      "concluida": concluida, "data": self.tarefas_dia["data"]}
+            if tarefa["tipo"] == "recorrente":
+                info = self.historico.get(tarefa_id)
+                evento["antes"] = _campos_sequencia(info)
+                evento["ja_registrada"] = info is not None and evento["data"] in info["datas"]
+            return evento
+
+        self._registrar(montar)
+        return self.tarefa_do_dia(tarefa_id)
+
+    def _marcar_no_dia(self, evento, concluida):
+        if self.tarefas_dia["data"] != evento["data"]:
+            return
+        for tarefa in self.tarefas_dia["tarefas"]:
+            if tarefa["id"] == evento["id"]:
+                tarefa["concluida"] = concluida
+
+    def _aplicar_marcar(self, evento):
+        self._marcar_no_dia(evento, evento["concluida"])
+        # Tarefas do backlog não têm histórico
+        if "antes" not in evento:
+            return
+
+        tarefa_id = evento["id"]
+        historico = self.historico
+        if evento["concluida"]:
+            info = historico.setdefault(tarefa_id, historico_vazio())
+            mudou = sequencias.adicionar_data(info["datas"], evento["data"])
+        else:
+            info = historico.get(tarefa_id)
+            mudou = info is not None and sequencias.remover_data(info["datas"], evento["data"])
+        if mudou:
+            self.agregados.contar(tarefa_id, evento["data"], 1 if evento["concluida"] else -1)
+
+        # Repetição: sequência e recorde como ficaram da primeira vez
+        if "depois" in evento:
+            if info is not None and evento["depois"] is not None:
+                info.update(evento["depois"])
+            return
+
+        regra = self.regra(tarefa_id)
+        if mudou and evento["concluida"]:
+            # Recalcular a sequência
+            if not info.get("sequencia_editada", False):
+                info["sequencia_atual"] = calcular_sequencia(historico, tarefa_id, regra)
+            else:
+                # Se editada manualmente, incrementar
+                info["sequencia_atual"] += 1
+
+            # Atualizar recorde se necessário
+            atualizar_recorde(historico, tarefa_id, regra)
+        elif mudou:
+            # Recalcular a sequência
+            if not info.get("sequencia_editada", False):
+                info["sequencia_atual"] = calcular_sequencia(historico, tarefa_id, regra)
+            else:
+                # Se editada manualmente, decrementar (mas não abaixo de 0)
+                info["sequencia_atual"] = max(0, info["sequencia_atual"] - 1)
+        evento["depois"] = _campos_sequencia(info)
+
+    def _reverter_marcar(self, evento):
+        self._marcar_no_dia(evento, not evento["concluida"])
+        if "antes" not in evento:
+            return
+        info = self.historico.get(evento["id"])
+        if info is not None:
+            if evento["ja_registrada"]:
+                if sequencias.adicionar_data(info["datas"], evento["data"]):
+                    self.agregados.contar(evento["id"], evento["data"])
+            elif sequencias.remover_data(info["datas"], evento["data"]):
+                self.agregados.descontar(evento["id"], evento["data"])
+        self._restaurar_sequencia(evento["id"], evento["antes"])
+
+    # Leva tarefas do backlog para o dia; ids inexistentes ou já no dia são ignorados
+    def adicionar_ao_dia(self, tarefa_ids):
+        def montar():
+            itens = {}
+            for tarefa_id in tarefa_ids:
+                tarefa = self.indice.tarefa(tarefa_id)
+                if tarefa and not self.indice.esta_no_dia(tarefa["id"]):
+                    itens[tarefa["id"]] = {"id": tarefa["id"], "descricao": tarefa["descricao"], "tipo": "backlog", "concluida": False}
+            if not itens:
+                return None
+            return {"tipo": "adicionar_ao_dia", "data": self.tarefas_dia["data"], "itens": list(itens.values())}
+
+        evento = self._registrar(montar)
+        return [self.tarefa_do_dia(item["id"]) for item in evento["itens"]] if evento else []
+
+    def _aplicar_adicionar_ao_dia(self, evento):
+        if self.tarefas_dia["data"] != evento["data"]:
+            return
+        for item in evento["itens"]:
+            if not self.indice.esta_no_dia(item["id"]):
+                self.tarefas_dia["tarefas"].append(dict(item))
+                self.indice.adicionar_ao_dia(item["id"])
+
+    def _reverter_adicionar_ao_dia(self, evento):
+        for item in evento["itens"]:
+            self._tirar_do_dia(item["id"])
+
+    # regra: ver recorrencia (None = todos os dias)
+    def adicionar_recorrente(self, descricao, regra=None):
+        if not descricao:
+            raise ValueError("Descrição vazia")
+        regra = recorrencia.validar(regra)
+
+        def montar():
+            tarefa = {"id": f"rec_{len(self.tarefas_recorrentes) + 1}_{_carimbo()}", "descricao": descricao}
+            if regra is not None:
+                tarefa["regra"] = regra
+            return {"tipo": "adicionar_recorrente", "tarefa": tarefa, "data": self.tarefas_dia["data"]}
+
+        evento = self._registrar(montar)
+        return self.recorrente(evento["tarefa"]["id"])
+
+    def _aplicar_adicionar_recorrente(self, evento):
+        tarefa = evento["tarefa"]
+        if any(t["id"] == tarefa["id"] for t in self.tarefas_recorrentes):
+            return
+        self.tarefas_recorrentes.append(dict(tarefa))
+        self._agenda = None
+
+        # Entra já nas tarefas do dia (se a regra pede), com o histórico zerado
+        dia = self.tarefas_dia["data"]
+        devida = dia and recorrencia.devida(recorrencia.regra_de(tarefa), sequencias.dia_para_inteiro(dia))
+        if dia == evento["data"] and devida and not self.indice.esta_no_dia(tarefa["id"]):
+            self.tarefas_dia["tarefas"].append({"id": tarefa["id"], "descricao": tarefa["descricao"], "tipo": "recorrente", "concluida": False})
+            self.indice.adicionar_ao_dia(tarefa["id"])
+        self.historico.setdefault(tarefa["id"], historico_vazio())
+
+    def _reverter_adicionar_recorrente(self, evento):
+        self._aplicar_remover_recorrente(evento)
+        self._restaurar_sequencia(evento["tarefa"]["id"], None)
+
+    # O histórico da tarefa é mantido
+    def remover_recorrente(self, tarefa_id):
+        def montar():
+            tarefa = self.recorrente(tarefa_id)
+            evento = {"tipo": "remover_recorrente", "tarefa": dict(tarefa),
+                      "posicao": self.tarefas_recorrentes.index(tarefa), "data": self.tarefas_dia["data"]}
+            evento.update(self._posicao_no_dia(tarefa_id))
+            return evento
+
+        return self._registrar(montar)["tarefa"]
+
+    def _aplicar_remover_recorrente(self, evento):
+        tarefa_id = evento["tarefa"]["id"]
+        self.tarefas_recorrentes[:] = [t for t in self.tarefas_recorrentes if t["id"] != tarefa_id]
+        self._tirar_do_dia(tarefa_id)
+        self._agenda = None
+
+    def _reverter_remover_recorrente(self, evento):
+        tarefa = evento["tarefa"]
+        if not any(t["id"] == tarefa["id"] for t in self.tarefas_recorrentes):
+            self.tarefas_recorrentes.insert(evento["posicao"], dict(tarefa))
+            self._agenda = None
+        self._voltar_ao_dia(evento)
+
+    # Troca a regra de recorrência (None = todos os dias); vale a partir da
+    # próxima virada do dia, sem mexer nas tarefas de hoje
+    def definir_regra(self, tarefa_id, regra):
+        regra = recorrencia.validar(regra)
+
+        def montar():
+            tarefa = self.recorrente(tarefa_id)
+            if tarefa.get("regra") == regra:
+                return None
+            return {"tipo": "definir_regra", "id": tarefa_id, "descricao": tarefa["descricao"],
+                    "antes": tarefa.get("regra"), "regra": regra}
+
+        self._registrar(montar)
+        return self.recorrente(tarefa_id)
+
+    def _trocar_regra(self, tarefa_id, regra):
+        for tarefa in self.tarefas_recorrentes:
+            if tarefa["id"] == tarefa_id:
+                if regra is None:
+                    tarefa.pop("regra", None)
+                else:
+                    tarefa["regra"] = dict(regra)
+                self._agenda = None
+
+    def _aplicar_definir_regra(self, evento):
+        self._trocar_regra(evento["id"], evento["regra"])
+
+    def _reverter_definir_regra(self, evento):
+        self._trocar_regra(evento["id"], evento["antes"])
+
+    def adicionar_backlog(self, descricao, projeto=None):
+        if not descricao:
+            raise ValueError("Descrição vazia")
+
+        def montar():
+            if projeto and not any(p["nome"] == projeto for p in self.projetos):
+                raise ValueError(f"Projeto inexistente: {projeto}")
+            tarefa = {"id": f"back_{len(self.backlog) + 1}_{_carimbo()}", "descricao": descricao}
+            if projeto:
+                tarefa["projeto"] = projeto
+            return {"tipo": "adicionar_backlog", "tarefa": tarefa}
+
+        evento = self._registrar(montar)
+        return self.do_backlog(evento["tarefa"]["id"])
+
+    def _incluir_no_backlog(self, tarefa, posicao=None):
+        if self.indice.tarefa(tarefa["id"]) is not None:
+            return
+        tarefa = dict(tarefa)
+        if posicao is None:
+            self.backlog.append(tarefa)
+        else:
+            self.backlog.insert(posicao, tarefa)
+        self.indice.adicionar_backlog(tarefa)
+        busca.adicionar_backlog(tarefa, self.loja)
+
+    def _tirar_do_backlog(self, tarefa_id):
+        tarefa = self.indice.tarefa(tarefa_id)
+        if tarefa is None:
+            return
+        self.backlog.remove(tarefa)
+        self._tirar_do_dia(tarefa_id)
+        self.indice.remover_backlog(tarefa_id)
+        busca.remover_backlog(tarefa_id, self.loja)
+
+    def _aplicar_adicionar_backlog(self, evento):
+        self._incluir_no_backlog(evento["tarefa"])
+
+    def _reverter_adicionar_backlog(self, evento):
+        self._tirar_do_backlog(evento["tarefa"]["id"])
+
+    def remover_backlog(self, tarefa_id):
+        def montar():
+            tarefa = self.do_backlog(tarefa_id)
+            evento = {"tipo": "remover_backlog", "tarefa": dict(tarefa),
+                      "posicao": self.backlog.index(tarefa), "data": self.tarefas_dia["data"]}
+            evento.update(self._posicao_no_dia(tarefa_id))
+            return evento
+
+        return self._registrar(montar)["tarefa"]
+
+    def _aplicar_remover_backlog(self, evento):
+        self._tirar_do_backlog(evento["tarefa"]["id"])
+
+    def _reverter_remover_backlog(self, evento):
+        self._incluir_no_backlog(evento["tarefa"], evento["posicao"])
+        self._voltar_ao_dia(evento)
+
+    # Tarefas do backlog (de um projeto, ou None para as sem projeto), filtradas pela busca
+    def buscar_backlog(self, consulta="", projeto=False):
+        tarefas = self.backlog if projeto is False else self.indice.do_projeto(projeto)
+        if not consulta:
+            return tarefas
+        # O índice é compartilhado com as outras sessões do espaço: ids que esta
+        # ainda não tem ficam de fora
+        encontradas = (self.indice.tarefa(i) for i in busca.buscar_backlog(consulta, espaco=self.loja))
+        return [t for t in encontradas if t is not None and (projeto is False or t.get("projeto") == projeto)]
+
+    def adicionar_projeto(self, nome):
+        if not nome:
+            raise ValueError("Nome vazio")
+
+        def montar():
+            if any(p["nome"] == nome for p in self.projetos):
+                raise ValueError("Já existe um projeto com este nome.")
+            return {"tipo": "adicionar_projeto", "projeto": {"id": f"proj_{len(self.projetos) + 1}_{_carimbo()}", "nome": nome}}
+
+        evento = self._registrar(montar)
+        return self.projeto(evento["projeto"]["id"])
+
+    def _aplicar_adicionar_projeto(self, evento):
+        if not any(p["id"] == evento["projeto"]["id"] for p in self.projetos):
+            self.projetos.append(dict(evento["projeto"]))
+
+    def _reverter_adicionar_projeto(self, evento):
+        self._aplicar_remover_projeto(evento)
+
+    # As tarefas do projeto continuam no backlog, sem projeto
+    def remover_projeto(self, projeto_id):
+        def montar():
+            projeto = self.projeto(projeto_id)
+            return {"tipo": "remover_projeto", "projeto": dict(projeto), "posicao": self.projetos.index(projeto),
+                    "tarefas": [tarefa["id"] for tarefa in self.indice.do_projeto(projeto["nome"])]}
+
+        return self._registrar(montar)["projeto"]
+
+    def _aplicar_remover_projeto(self, evento):
+        projeto = evento["projeto"]
+        if any(p["id"] == projeto["id"] for p in self.projetos):
+            self.indice.remover_projeto(projeto["nome"])
+            self.projetos[:] = [p for p in self.projetos if p["id"] != projeto["id"]]
+
+    def _reverter_remover_projeto(self, evento):
+        projeto = evento["projeto"]
+        if any(p["id"] == projeto["id"] for p in self.projetos):
+            return
+        self.projetos.insert(evento["posicao"], dict(projeto))
+        for tarefa_id in evento["tarefas"]:
+            tarefa = self.indice.tarefa(tarefa_id)
+            if tarefa is not None and "projeto" not in tarefa:
+                self.indice.definir_projeto(tarefa, projeto["nome"])
+
+    def _evento_sequencia(self, tipo, tarefa_id, depois=None):
+        info = self.historico.get(tarefa_id)
+        descricao = next((t["descricao"] for t in self.tarefas_recorrentes if t["id"] == tarefa_id), tarefa_id)
+        evento = {"tipo": tipo, "id": tarefa_id, "descricao": descricao, "antes": _campos_sequencia(info)}
+        if depois is not None:
+            evento["depois"] = depois
+        return evento
+
+    def editar_sequencia(self, tarefa_id, sequencia, recorde):
+        def montar():
+            evento = self._evento_sequencia("editar_sequencia", tarefa_id, depois)
+            erro = erro_sequencia(sequencia, recorde)
+            if erro:
+                raise ValueError(f"{evento['descricao']}: {erro}")
+            return evento
+
+        depois = {"sequencia_atual": sequencia, "sequencia_editada": True, "recorde_sequencia": recorde}
+        self._registrar(montar)
+        return self.historico[tarefa_id]
+
+    # Volta ao cálculo automático da sequência
+    def sequencia_automatica(self, tarefa_id):
+        self._registrar(lambda: self._evento_sequencia("sequencia_automatica", tarefa_id))
+        return self.historico[tarefa_id]
+
+    def _aplicar_editar_sequencia(self, evento):
+        info = self.historico.setdefault(evento["id"], historico_vazio())
+        if "depois" not in evento:
+            info["sequencia_editada"] = False
+            info["sequencia_atual"] = calcular_sequencia(self.historico, evento["id"], self.regra(evento["id"]))
+            evento["depois"] = _campos_sequencia(info)
+        info.update(evento["depois"])
+
+    _aplicar_sequencia_automatica = _aplicar_editar_sequencia
+
+    def _reverter_editar_sequencia(self, evento):
+        self._restaurar_sequencia(evento["id"], evento["antes"])
+
+    _reverter_sequencia_automatica = _reverter_editar_sequencia
+
+    # Edição em lote (grade da interface): {tarefa_id: {"sequencia_atual": n,
+    # "recorde_sequencia": n}} ou {tarefa_id: {"automatica": True}}. Tudo é
+    # conferido antes e vira um único evento, só com as tarefas que mudaram;
+    # devolve quantas mudaram.
+    def editar_sequencias(self, alteracoes):
+        def montar():
+            itens, erros = [], []
+            for tarefa_id, alteracao in alteracoes.items():
+                descricao = self.recorrente(tarefa_id)["descricao"]
+                info = self.historico.get(tarefa_id)
+                antes = _campos_sequencia(info)
+                item = {"id": tarefa_id, "descricao": descricao, "antes": antes}
+                if alteracao.get("automatica"):
+                    if antes is None or not antes["sequencia_editada"]:
+                        continue
+                    itens.append(item)
+                    continue
+
+                sequencia, recorde = alteracao.get("sequencia_atual"), alteracao.get("recorde_sequencia")
+                erro = erro_sequencia(sequencia, recorde)
+                if erro:
+                    erros.append(f"{descricao}: {erro}")
+                    continue
+                depois = {"sequencia_atual": sequencia, "sequencia_editada": True, "recorde_sequencia": recorde}
+                if depois != antes:
+                    itens.append(dict(item, depois=depois))
+            if erros:
+                raise ValueError("; ".join(erros))
+            if not itens:
+                return None
+            return {"tipo": "editar_sequencias", "itens": itens}
+
+        evento = self._registrar(montar)
+        return len(evento["itens"]) if evento else 0
+
+    def _aplicar_editar_sequencias(self, evento):
+        for item in evento["itens"]:
+            self._aplicar_editar_sequencia(item)
+
+    def _reverter_editar_sequencias(self, evento):
+        for item in evento["itens"]:
+            self._restaurar_sequencia(item["id"], item["antes"])
+
+    # Sequência, recorde e total de conclusões de uma tarefa recorrente
+    def resumo(self, tarefa_id):
+        regra = self.regra(tarefa_id)
+        return {
+            "sequencia": calcular_sequencia(self.historico, tarefa_id, regra),
+            "recorde": calcular_recorde(self.historico, tarefa_id, regra),
+            "total": len(self.historico.get(tarefa_id, {}).get("datas", [])),
+            "perdidas": self.historico.get(tarefa_id, {}).get("perdidas", 0),
+            "repeticao": recorrencia.descrever(regra),
+        }
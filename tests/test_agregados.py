@@ -0,0 +1,32 @@
+import random
+
+import agregados
+import sequencias
+
+INICIO = sequencias.dia_para_inteiro("2023-12-25")
+
+
+# Contagem incremental (inclusões e remoções) igual à recontagem completa,
+# inclusive nas contagens por dia de cada tarefa
+def test_incremental_igual_a_recontagem():
+    aleatorio = random.Random(1)
+    contagens = agregados.Agregados()
+    historico = {}
+    for _ in range(500):
+        tarefa_id = f"t{aleatorio.randrange(4)}"
+        datas = historico.setdefault(tarefa_id, {"datas": sequencias.Datas()})["datas"]
+        dia = INICIO + aleatorio.randrange(20)
+        if aleatorio.random() < 0.6:
+            if datas.adicionar(dia):
+                contagens.contar(tarefa_id, dia)
+        elif datas.remover(dia):
+            contagens.descontar(tarefa_id, dia)
+
+    recontagem = agregados.Agregados.de_historico(historico)
+    assert contagens.diferencas(recontagem) == []
+    assert contagens.confere_totais(historico)
+    for tarefa_id, info in historico.items():
+        assert contagens.dias_da_tarefa(tarefa_id) == {data: 1 for data in info["datas"]}
+
+    # Gravadas e relidas, continuam iguais
+    assert agregados.Agregados(contagens.como_dict(7)).diferencas(recontagem) == []
@@ -0,0 +1,41 @@
+import datetime
+import math
+import random
+
+import pytest
+
+import analise
+import recorrencia
+import sequencias
+
+HOJE = datetime.date(2024, 3, 10)
+
+REGRAS = [None, {"tipo": "semanal", "dias": [0, 2, 4]}, {"tipo": "intervalo", "dias": 4, "inicio": "2024-02-20"},
+          {"tipo": "mensal", "dia": 31}]
+
+
+# Taxa pela regra contra a contagem dia a dia: conclusões em dias devidos
+# sobre as ocorrências previstas na janela
+@pytest.mark.parametrize("semente", range(3))
+def test_taxa_conclusao_pela_regra(semente):
+    aleatorio = random.Random(semente)
+    hoje = sequencias.dia_para_inteiro(HOJE.isoformat())
+    historico, regras = {}, {}
+    for posicao, regra in enumerate(REGRAS):
+        dias = {hoje - aleatorio.randrange(120) for _ in range(50)}
+        historico[f"t{posicao}"] = {"datas": sequencias.Datas.de_lista([sequencias.inteiro_para_dia(d) for d in dias])}
+        regras[f"t{posicao}"] = regra
+    janelas = [7, 30, 90]
+    taxas = analise.taxa_conclusao(historico, list(historico), janelas, HOJE, regras)
+
+    for tarefa_id, info in historico.items():
+        regra = regras[tarefa_id]
+        for janela in janelas:
+            periodo = range(hoje - janela + 1, hoje + 1)
+            previstas = [dia for dia in periodo if recorrencia.devida(regra, dia)]
+            feitas = sum(sequencias.inteiro_para_dia(dia) in info["datas"] for dia in previstas)
+            valor = taxas.loc[tarefa_id, f"{janela} dias"]
+            if previstas:
+                assert valor == pytest.approx(feitas / len(previstas))
+            else:
+                assert math.isnan(valor)
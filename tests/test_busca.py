@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+import busca
+
+PALAVRAS = ["relatório", "relatorio", "reunião", "mensal", "anual", "comprar", "pão", "café", "revisar", "código"]
+
+
+def estrutura(indice):
+    return {
+        "postagens": indice.postagens,
+        "tokens": indice.tokens,
+        "por_trigrama": indice.por_trigrama,
+        "textos": indice.textos,
+        "tokens_de": indice.tokens_de,
+    }
+
+
+def montado_do_zero(textos):
+    indice = busca.IndiceBusca()
+    for item_id, texto in textos.items():
+        indice.adicionar(item_id, texto)
+    return indice
+
+
+# Inclusões, remoções e renomeações aleatórias: o índice fica igual a um
+# montado do zero com os mesmos textos, sem tokens ou trigramas órfãos
+@pytest.mark.parametrize("semente", range(5))
+def test_adicionar_remover_renomear(semente):
+    aleatorio = random.Random(semente)
+    indice = busca.IndiceBusca()
+    textos = {}
+    for passo in range(300):
+        item_id = f"t{aleatorio.randrange(25)}"
+        sorteio = aleatorio.random()
+        if sorteio < 0.6:
+            # Inclusão ou, se o id já existe, renomeação
+            texto = " ".join(aleatorio.sample(PALAVRAS, aleatorio.randint(1, 3)))
+            indice.adicionar(item_id, texto)
+            textos[item_id] = texto
+        else:
+            indice.remover(item_id)
+            textos.pop(item_id, None)
+
+        assert len(indice) == len(textos)
+        if passo % 20 == 0:
+            assert estrutura(indice) == estrutura(montado_do_zero(textos))
+            assert indice.tokens == sorted(indice.tokens)
+    assert estrutura(indice) == estrutura(montado_do_zero(textos))
+
+    indice.sincronizar({})
+    assert estrutura(indice) == estrutura(busca.IndiceBusca())
+
+
+@pytest.mark.parametrize("semente", range(3))
+def test_buscar_contra_varredura(semente):
+    aleatorio = random.Random(semente)
+    textos = {f"t{i}": " ".join(aleatorio.sample(PALAVRAS, 2)) for i in range(30)}
+    indice = busca.IndiceBusca()
+    indice.sincronizar(textos)
+    for consulta in ["rel", "relatorio mensal", "cafe", "reu", "pao codigo"]:
+        termos = busca.tokenizar(consulta)
+        # Sem erro de digitação: todo termo é o começo de alguma palavra do texto
+        esperados = {item_id for item_id, texto in textos.items()
+                     if all(any(token.startswith(termo) for token in busca.tokenizar(texto)) for termo in termos)}
+        assert set(indice.buscar(consulta)) == esperados
+
+
+def test_renomear_troca_os_resultados():
+    indice = busca.IndiceBusca()
+    indice.adicionar("a", "Relatório mensal")
+    indice.adicionar("b", "Comprar pão")
+    indice.adicionar("a", "Revisar código")
+    assert indice.buscar("mensal") == []
+    assert indice.buscar("revisar") == ["a"]
+    assert "mensal" not in indice.postagens
+
+
+def test_erro_de_digitacao_e_relevancia():
+    indice = busca.IndiceBusca()
+    indice.sincronizar({"a": "Relatório mensal", "b": "relatorios antigos", "c": "Reunião"})
+    # Palavra exata antes da que só começa com o termo
+    assert indice.buscar("relatorio") == ["a", "b"]
+    assert indice.buscar("reuniao") == ["c"]
+    assert indice.buscar("relatroio") == ["a", "b"]
+    assert indice.buscar("relatorio", limite=1) == ["a"]
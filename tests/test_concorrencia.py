@@ -0,0 +1,74 @@
+import concorrencia
+
+
+def item(tarefa_id, descricao):
+    return {"id": tarefa_id, "descricao": descricao}
+
+
+def test_lista_alteracoes_dos_dois_lados():
+    base = [item("a", "A"), item("b", "B"), item("c", "C")]
+    # Eu removi b, editei c e incluí d; eles editaram a, removeram c e incluíram e
+    meu = [item("a", "A"), item("c", "C meu"), item("d", "D")]
+    deles = [item("a", "A deles"), item("b", "B"), item("e", "E")]
+    resultado = concorrencia.mesclar("backlog", base, meu, deles)
+    assert resultado == [item("a", "A deles"), item("e", "E"), item("d", "D")]
+
+
+def test_lista_mesma_edicao_prevalece_a_minha():
+    base = [item("a", "A")]
+    assert concorrencia.mesclar_lista(base, [item("a", "meu")], [item("a", "deles")]) == [item("a", "meu")]
+    # Sem edição minha, a deles fica
+    assert concorrencia.mesclar_lista(base, base, [item("a", "deles")]) == [item("a", "deles")]
+
+
+def test_historico_datas_como_conjuntos():
+    base = {"t": {"datas": ["2024-01-01", "2024-01-02"], "sequencia_atual": 2}}
+    meu = {"t": {"datas": ["2024-01-01", "2024-01-03"], "sequencia_atual": 1}}
+    deles = {"t": {"datas": ["2024-01-01", "2024-01-02", "2024-01-04"], "sequencia_atual": 2, "perdidas": 1}}
+    resultado = concorrencia.mesclar("historico", base, meu, deles)
+    assert resultado["t"]["datas"] == ["2024-01-01", "2024-01-04", "2024-01-03"]
+    # Campo que eu mudei prevalece; o que só eles mudaram continua
+    assert resultado["t"]["sequencia_atual"] == 1
+    assert resultado["t"]["perdidas"] == 1
+
+
+def test_historico_tarefas_incluidas_e_removidas():
+    base = {"a": {"datas": []}, "b": {"datas": ["2024-01-01"]}}
+    meu = {"a": {"datas": []}, "c": {"datas": ["2024-01-05"]}}
+    deles = {"a": {"datas": ["2024-01-02"]}, "b": {"datas": ["2024-01-01"]}, "d": {"datas": []}}
+    resultado = concorrencia.mesclar_historico(base, meu, deles)
+    assert resultado == {"a": {"datas": ["2024-01-02"]}, "c": {"datas": ["2024-01-05"]}, "d": {"datas": []}}
+
+
+def test_historico_formato_antigo_em_lista():
+    base = {"t": ["2024-01-01"]}
+    meu = {"t": {"datas": ["2024-01-01", "2024-01-02"]}}
+    deles = {"t": ["2024-01-01", "2024-01-03"]}
+    resultado = concorrencia.mesclar_historico(base, meu, deles)
+    assert resultado["t"]["datas"] == ["2024-01-01", "2024-01-03", "2024-01-02"]
+
+
+def dia(data, *tarefas):
+    return {"data": data, "tarefas": [dict(id=tarefa_id, concluida=concluida) for tarefa_id, concluida in tarefas]}
+
+
+def test_tarefas_dia_vale_o_dia_mais_recente():
+    base = dia("2024-01-01", ("a", False))
+    novo = dia("2024-01-02", ("a", False))
+    assert concorrencia.mesclar("tarefas_dia", base, novo, base) == novo
+    assert concorrencia.mesclar("tarefas_dia", base, base, novo) == novo
+
+
+def test_tarefas_dia_mesmo_dia_por_item():
+    base = dia("2024-01-01", ("a", False), ("b", False))
+    meu = dia("2024-01-01", ("a", True), ("b", False))
+    deles = dia("2024-01-01", ("a", False), ("b", True), ("c", False))
+    assert concorrencia.mesclar_tarefas_dia(base, meu, deles) == dia("2024-01-01", ("a", True), ("b", True), ("c", False))
+
+
+# As duas sessões viraram o dia: vale o que qualquer uma concluiu
+def test_tarefas_dia_as_duas_viraram_o_dia():
+    base = dia("2024-01-01", ("a", False))
+    meu = dia("2024-01-02", ("a", True), ("m", False))
+    deles = dia("2024-01-02", ("a", False), ("d", True))
+    assert concorrencia.mesclar_tarefas_dia(base, meu, deles) == dia("2024-01-02", ("a", True), ("d", True), ("m", False))
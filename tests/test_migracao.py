@@ -0,0 +1,32 @@
+import io
+import json
+
+import pytest
+
+import migracao
+
+DOCUMENTOS = [
+    '{}',
+    '{"a": -0.5, "b": 1}',
+    '{"x": 1.5e3, "y": -2.25E-2, "z": 10, "w": 0}',
+    '{"formato": "segmentos", "t1": {"datas": ["2024-01-01", "2024-01-02"], "sequencia_atual": 2}}',
+    '{ "texto" : "aspas \\" e \\\\ barra", "lista": [1, [2, {"b": false}], null], "u": "\\u00e7" }',
+    '{"grande": 12345678901234567890, "negativo": -7, "expoente": 6E+2}',
+]
+
+
+# O mesmo documento em todos os tamanhos de bloco: qualquer corte entre dois
+# blocos (no meio de um número, de um texto ou de um escape) dá o mesmo resultado
+@pytest.mark.parametrize("documento", DOCUMENTOS)
+def test_pares_em_todos_os_tamanhos_de_bloco(documento):
+    esperado = list(json.loads(documento).items())
+    for tamanho in range(1, len(documento) + 2):
+        leitor = migracao.LeitorIncremental(io.StringIO(documento), tamanho_bloco=tamanho)
+        assert list(leitor.pares()) == esperado, tamanho
+
+
+@pytest.mark.parametrize("documento", ['{"a": 1', '{"a" 1}', '[1, 2]', '{"a": 1.x}', '{1: 2}'])
+def test_documento_invalido(documento):
+    for tamanho in (1, 2, 3, len(documento)):
+        with pytest.raises(ValueError):
+            list(migracao.LeitorIncremental(io.StringIO(documento), tamanho_bloco=tamanho).pares())
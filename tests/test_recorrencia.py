@@ -0,0 +1,78 @@
+import calendar
+import random
+
+import pytest
+
+import recorrencia
+import sequencias
+
+INICIO = sequencias.dia_para_inteiro("2024-01-25")
+
+REGRAS = [
+    None,
+    {"tipo": "semanal", "dias": [0, 2, 4]},
+    {"tipo": "semanal", "dias": [6]},
+    {"tipo": "intervalo", "dias": 3, "inicio": "2024-02-01"},
+    {"tipo": "intervalo", "dias": 10, "inicio": "2023-12-30"},
+    {"tipo": "mensal", "dia": 31},
+    {"tipo": "mensal", "dia": 1},
+]
+
+
+def devida_ingenua(regra, dia):
+    data = recorrencia._data(dia)
+    if recorrencia.e_diaria(regra):
+        return True
+    if regra["tipo"] == "semanal":
+        return data.weekday() in regra["dias"]
+    if regra["tipo"] == "intervalo":
+        desde = dia - sequencias.dia_para_inteiro(regra["inicio"])
+        return desde >= 0 and desde % regra["dias"] == 0
+    ultimo = calendar.monthrange(data.year, data.month)[1]
+    return data.day == min(regra["dia"], ultimo)
+
+
+@pytest.mark.parametrize("regra", REGRAS)
+def test_regra_contra_dia_a_dia(regra):
+    devidas = [dia for dia in range(INICIO, INICIO + 160) if devida_ingenua(regra, dia)]
+    for dia in range(INICIO, INICIO + 120):
+        assert recorrencia.devida(regra, dia) == (dia in devidas)
+        assert recorrencia.proxima(regra, dia) == min(d for d in devidas if d >= dia)
+    for inicio in range(INICIO, INICIO + 40, 3):
+        for fim in range(inicio - 1, INICIO + 100, 7):
+            assert recorrencia.contar(regra, inicio, fim) == sum(inicio <= d <= fim for d in devidas)
+
+
+# Saltos aleatórios de vários dias: cada avanço entrega as tarefas devidas no
+# dia e conta as ocorrências puladas, como uma varredura dia a dia
+@pytest.mark.parametrize("semente", range(5))
+def test_agenda_recupera_dias_pulados(semente):
+    aleatorio = random.Random(semente)
+    tarefas = [{"id": f"t{i}", "descricao": f"T{i}", **({"regra": regra} if regra else {})}
+               for i, regra in enumerate(REGRAS)]
+    agenda = recorrencia.Agenda(tarefas, INICIO)
+    inicio = INICIO
+    for _ in range(30):
+        dia = inicio + aleatorio.choice([0, 1, 1, 2, 5, 13, 40])
+        devidas, perdidas = agenda.avancar(dia)
+        assert devidas == [t for t in tarefas if devida_ingenua(t.get("regra"), dia)]
+        esperadas = {}
+        for tarefa in tarefas:
+            quantidade = sum(devida_ingenua(tarefa.get("regra"), d) for d in range(inicio, dia))
+            if quantidade:
+                esperadas[tarefa["id"]] = quantidade
+        assert perdidas == esperadas
+        assert agenda.inicio == dia + 1
+        inicio = dia + 1
+
+
+def test_sequencia_pela_regra():
+    regra = {"tipo": "semanal", "dias": [0, 3]}
+    segundas = [sequencias.dia_para_inteiro(d) for d in ("2024-02-05", "2024-02-12", "2024-02-19")]
+    quintas = [sequencias.dia_para_inteiro(d) for d in ("2024-02-08", "2024-02-15")]
+    datas = [sequencias.inteiro_para_dia(d) for d in segundas + quintas]
+    # Segunda 19 ainda conta: a ocorrência de hoje (quinta 22) não quebra
+    assert recorrencia.sequencia_atual(regra, datas, sequencias.dia_para_inteiro("2024-02-22")) == 5
+    assert recorrencia.sequencia_atual(regra, datas, sequencias.dia_para_inteiro("2024-02-23")) == 0
+    assert recorrencia.maior_sequencia(regra, datas) == 5
+    assert recorrencia.maior_sequencia(regra, sequencias.Datas.de_lista(datas)) == 5
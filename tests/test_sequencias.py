@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+import sequencias
+
+# 2023-12-20: as operações atravessam a virada do ano
+INICIO = sequencias.dia_para_inteiro("2023-12-20")
+
+
+def sequencia_ingenua(dias, hoje):
+    if not dias or hoje - max(dias) > 1:
+        return 0
+    dia = max(dias)
+    while dia - 1 in dias:
+        dia -= 1
+    return max(dias) - dia + 1
+
+
+def maior_ingenua(dias):
+    maior = 0
+    for dia in dias:
+        if dia - 1 not in dias:
+            fim = dia
+            while fim + 1 in dias:
+                fim += 1
+            maior = max(maior, fim - dia + 1)
+    return maior
+
+
+def conferir(motor, dias):
+    assert len(motor) == len(dias)
+    assert motor.maior_sequencia() == maior_ingenua(dias)
+    for hoje in (INICIO + 20, INICIO + 41, INICIO + 42, INICIO + 43, INICIO + 100):
+        assert motor.sequencia_atual(hoje) == sequencia_ingenua(dias, hoje)
+
+
+# Inclusões e remoções aleatórias (inclusive repetidas e retroativas),
+# comparadas a cada passo com um conjunto simples
+@pytest.mark.parametrize("semente", range(5))
+@pytest.mark.parametrize("classe", [sequencias.MotorSequencia, sequencias.Datas])
+def test_adicionar_e_remover_contra_conjunto(classe, semente):
+    aleatorio = random.Random(semente)
+    motor = classe()
+    dias = set()
+    for _ in range(400):
+        dia = INICIO + aleatorio.randrange(42)
+        if aleatorio.random() < 0.6:
+            assert motor.adicionar(dia) == (dia not in dias)
+            dias.add(dia)
+        else:
+            assert motor.remover(dia) == (dia in dias)
+            dias.discard(dia)
+        assert (dia in motor) == (dia in dias)
+        conferir(motor, dias)
+
+
+def test_datas_como_lista():
+    datas = sequencias.Datas.de_lista(["2024-01-02", "2023-12-31", "2024-01-01", "2024-01-01"])
+    assert list(datas) == ["2023-12-31", "2024-01-01", "2024-01-02"]
+    assert datas == ["2024-01-02", "2023-12-31", "2024-01-01"]
+    assert datas.maior_sequencia() == 3
+    assert datas.intervalos() == [(sequencias.dia_para_inteiro("2023-12-31"), 3)]
+    datas.remove("2024-01-01")
+    assert "2024-01-01" not in datas
+    with pytest.raises(ValueError):
+        datas.remove("2024-01-01")
+
+
+# Ano completo: a sequência continua pelos resumos dos anos anteriores
+def test_sequencia_atravessa_anos_completos():
+    dias = range(sequencias.primeiro_dia_do_ano(2023) - 3, sequencias.dia_para_inteiro("2025-01-05") + 1)
+    datas = sequencias.Datas()
+    for dia in dias:
+        datas.adicionar(dia)
+    assert datas.maior_sequencia() == len(dias)
+    assert datas.sequencia_atual(dias[-1] + 1) == len(dias)
+    assert datas.sequencia_atual(dias[-1] + 2) == 0
+
+
+# Blocos lidos sob demanda: anos não pedidos nem chegam ao leitor
+def test_leitor_sob_demanda():
+    completo = sequencias.Datas.de_lista(["2022-05-01", "2022-05-02", "2024-02-29"])
+    lidos = []
+
+    def leitor(ano, origem):
+        lidos.append(ano)
+        return completo.blocos(ano), origem
+
+    datas = sequencias.Datas(resumos=completo.resumos, origens={ano: "seg" for ano in completo.anos()}, leitor=leitor)
+    assert len(datas) == 3 and datas.maior_sequencia() == 2
+    assert lidos == []
+    assert "2024-02-29" in datas
+    assert lidos == [2024]
+    assert datas == completo
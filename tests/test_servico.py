@@ -0,0 +1,79 @@
+import pytest
+
+import armazenamento
+import servico
+
+HOJE = "2024-03-10"
+
+
+def abrir(tipo, raiz):
+    gestor = servico.Gestor(armazenamento.criar_armazenamento(tipo, str(raiz), gravacao_adiada=False))
+    gestor.carregar(HOJE)
+    return gestor
+
+
+def descricoes(gestor):
+    return [tarefa["descricao"] for tarefa in gestor.backlog]
+
+
+# Desfazer e refazer atravessando um snapshot (mais de LIMITE_DIARIO eventos)
+# e continuando em outra sessão, que só tem o snapshot e o diário em disco
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_desfazer_e_refazer_atravessam_o_snapshot(tipo, tmp_path):
+    gestor = abrir(tipo, tmp_path)
+    tarefa_id = gestor.adicionar_recorrente("Meditar")["id"]
+    while gestor.seq < servico.LIMITE_DIARIO - 3:
+        gestor.marcar(tarefa_id, not gestor.tarefa_do_dia(tarefa_id)["concluida"])
+    antes = gestor.seq_snapshot
+    concluida = gestor.tarefa_do_dia(tarefa_id)["concluida"]
+    for descricao in "abcdef":
+        gestor.adicionar_backlog(descricao)
+    assert gestor.seq_snapshot > antes
+
+    gestor.desfazer()
+    gestor.desfazer()
+    assert descricoes(gestor) == list("abcd")
+
+    # Outra sessão, carregada do disco
+    outra = abrir(tipo, tmp_path)
+    assert descricoes(outra) == list("abcd")
+    assert [evento["tarefa"]["descricao"] for evento in outra.pilhas()[1]] == ["f", "e"]
+    outra.refazer()
+    assert descricoes(outra) == list("abcde")
+    # Desfazer até antes do snapshot, e mais um (o último marcar)
+    for _ in range(6):
+        outra.desfazer()
+    assert descricoes(outra) == []
+    assert outra.tarefa_do_dia(tarefa_id)["concluida"] == (not concluida)
+
+    gestor.atualizar(HOJE)
+    assert descricoes(gestor) == []
+    gestor.refazer()
+    assert gestor.tarefa_do_dia(tarefa_id)["concluida"] == concluida
+    assert descricoes(abrir(tipo, tmp_path)) == []
+    assert abrir(tipo, tmp_path).tarefa_do_dia(tarefa_id)["concluida"] == concluida
+
+
+@pytest.mark.parametrize("tipo", ["json", "sqlite"])
+def test_nada_para_desfazer(tipo, tmp_path):
+    gestor = abrir(tipo, tmp_path)
+    with pytest.raises(ValueError):
+        gestor.desfazer()
+    gestor.adicionar_backlog("a")
+    gestor.desfazer()
+    with pytest.raises(ValueError):
+        gestor.desfazer()
+    gestor.refazer()
+    assert descricoes(abrir(tipo, tmp_path)) == ["a"]
+
+
+# Edição de uma tarefa e edição em lote conferem a sequência do mesmo jeito
+@pytest.mark.parametrize("sequencia, recorde", [(5, 3), (-1, 2), (2, True), ("3", 4)])
+def test_sequencia_invalida(sequencia, recorde, tmp_path):
+    gestor = abrir("json", tmp_path)
+    tarefa_id = gestor.adicionar_recorrente("Ler")["id"]
+    with pytest.raises(ValueError):
+        gestor.editar_sequencia(tarefa_id, sequencia, recorde)
+    with pytest.raises(ValueError):
+        gestor.editar_sequencias({tarefa_id: {"sequencia_atual": sequencia, "recorde_sequencia": recorde}})
+    assert gestor.historico.get(tarefa_id, {}).get("sequencia_editada", False) is False